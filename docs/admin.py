@@ -1,10 +1,23 @@
 from django.contrib import admin
 from django.contrib.auth.models import User
 from django.contrib.auth.admin import UserAdmin
+from django.http import FileResponse, Http404, HttpResponse
+from django.shortcuts import redirect, render
+from django.urls import reverse
 from django.utils.html import format_html
-from .models import Article, Category, Tag, Comment, Rating, Favorite
+from .models import Article, AuthorStats, Category, Tag, Comment, Rating, Favorite
 from django.utils import timezone
+from django.db import transaction
+from django.db.models import F
 from django import forms
+from .counters import recount_counters
+from .sidebar import invalidate_sidebar
+from .tag_usage import recount_usage
+from .category_counts import recount_categories
+from .author_stats import recount_author_stats
+from .search import matching_articles_sql
+from .instrumentation import instrumentation_enabled, request_log
+from .profiling import list_profiles, profile_path, profile_summary, profiling_enabled
 from mdeditor.fields import MDTextFormField
 
 
@@ -17,10 +30,44 @@ class ArticleAdminForm(forms.ModelForm):
         fields = '__all__'
 
 
+# Таблицы комментариев, оценок и избранного большие: фильтр по статье не
+# загружает список всех статей, а задается ссылкой из колонки «Статья»
+class ArticleIdFilter(admin.SimpleListFilter):
+    title = 'Статья'
+    parameter_name = 'article'
+
+    def lookups(self, request, model_admin):
+        # Показывается только выбранная статья
+        value = self.value()
+        if value and value.isdigit():
+            article = Article.objects.filter(pk=value).only('id', 'title').first()
+            if article is not None:
+                return [(str(article.pk), article.title)]
+        return []
+
+    def queryset(self, request, queryset):
+        value = self.value()
+        if value and value.isdigit():
+            return queryset.filter(article_id=value)
+        return queryset
+
+
+def article_filter_link(obj):
+    return format_html(
+        '<a href="?{}={}" title="Только эта статья">{}</a>',
+        ArticleIdFilter.parameter_name, obj.article_id, obj.article.title
+    )
+
+
+article_filter_link.short_description = 'Статья'
+article_filter_link.admin_order_field = 'article__title'
+
+
 @admin.register(Tag)
 class TagAdmin(admin.ModelAdmin):
     list_display = ['name', 'slug', 'article_count', 'created_at']
     list_filter = ['created_at']
+    list_select_related = ['usage']
     search_fields = ['name', 'description']
     prepopulated_fields = {'slug': ('name',)}
     readonly_fields = ['created_at']
@@ -29,27 +76,24 @@ class TagAdmin(admin.ModelAdmin):
         return obj.article_count()
 
     article_count.short_description = 'Кол-во статей'
+    article_count.admin_order_field = 'usage__article_count'
 
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ['name', 'slug', 'parent', 'article_count', 'created_at']
+    list_display = ['name', 'slug', 'parent', 'article_count', 'total_article_count', 'created_at']
     list_filter = ['created_at', 'parent']
+    list_select_related = ['parent']
     search_fields = ['name', 'description']
     prepopulated_fields = {'slug': ('name',)}
-    readonly_fields = ['created_at', 'updated_at']
-
-    def article_count(self, obj):
-        return obj.articles.count()
-
-    article_count.short_description = 'Кол-во статей'
+    readonly_fields = ['created_at', 'updated_at', 'article_count', 'total_article_count']
 
     fieldsets = (
         ('Основная информация', {
             'fields': ('name', 'slug', 'parent', 'description')
         }),
         ('Метаданные', {
-            'fields': ('created_at', 'updated_at'),
+            'fields': ('article_count', 'total_article_count', 'created_at', 'updated_at'),
             'classes': ('collapse',)
         }),
     )
@@ -59,20 +103,24 @@ class CategoryAdmin(admin.ModelAdmin):
 class ArticleAdmin(admin.ModelAdmin):
     form = ArticleAdminForm  # ← используем нашу форму
 
+    # Счетчики читаются из денормализованных полей статьи, без запросов на строку
     def comment_count(self, obj):
         return obj.get_comment_count()
 
     comment_count.short_description = 'Комментарии'
+    comment_count.admin_order_field = 'comments_count'
 
     def like_count(self, obj):
         return obj.get_like_count()
 
     like_count.short_description = '👍'
+    like_count.admin_order_field = 'likes_count'
 
     def dislike_count(self, obj):
         return obj.get_dislike_count()
 
     dislike_count.short_description = '👎'
+    dislike_count.admin_order_field = 'dislikes_count'
 
     # Добавляем в list_display
     list_display = ['title', 'author', 'category', 'status', 'view_count',
@@ -80,17 +128,22 @@ class ArticleAdmin(admin.ModelAdmin):
                     'created_at', 'published_at', 'preview_link']
 
     list_filter = ['status', 'category', 'tags', 'created_at', 'published_at']
-    search_fields = ['title', 'content', 'excerpt', 'author__username', 'tags__name']
+    list_select_related = ['author', 'category']
+    # Текст и описание статьи хранятся в версиях - ищем их через полнотекстовый индекс
+    search_fields = ['title', 'slug', 'author__username']
+    search_help_text = 'Заголовок, URL, автор, а также текст и описание текущей версии'
+    show_full_result_count = False
     list_editable = ['status']
-    readonly_fields = ['created_at', 'updated_at', 'published_at', 'view_count']
+    readonly_fields = ['created_at', 'updated_at', 'published_at', 'view_count',
+                       'likes_count', 'dislikes_count', 'comments_count', 'favorites_count']
     prepopulated_fields = {'slug': ('title',)}
     date_hierarchy = 'created_at'
-    filter_horizontal = ['tags']  # Удобный выбор тегов
+    autocomplete_fields = ['tags']  # Поиск тегов вместо списка всех тегов
 
     # Поля для отображения в форме
     fieldsets = (
         ('Основная информация', {
-            'fields': ('title', 'slug', 'author', 'category', 'excerpt')
+            'fields': ('title', 'slug', 'author', 'category')
         }),
         ('Теги', {
             'fields': ('tags',)
@@ -101,6 +154,10 @@ class ArticleAdmin(admin.ModelAdmin):
         ('Статус и видимость', {
             'fields': ('status', 'is_pinned', 'view_count')
         }),
+        ('Счетчики', {
+            'fields': ('likes_count', 'dislikes_count', 'comments_count', 'favorites_count'),
+            'classes': ('collapse',)
+        }),
         ('Даты', {
             'fields': ('created_at', 'updated_at', 'published_at'),
             'classes': ('collapse',)
@@ -123,6 +180,13 @@ class ArticleAdmin(admin.ModelAdmin):
             obj.author = request.user
         super().save_model(request, obj, form, change)
 
+    def get_search_results(self, request, queryset, search_term):
+        results, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        matching = matching_articles_sql(search_term) if search_term else None
+        if matching is not None:
+            results |= queryset.filter(pk__in=matching)
+        return results, may_have_duplicates
+
     # Ограничение прав для не-суперпользователей
     def get_queryset(self, request):
         qs = super().get_queryset(request)
@@ -137,20 +201,34 @@ class ArticleAdmin(admin.ModelAdmin):
 
     actions = ['make_published', 'make_draft', 'make_archived']
 
+    def _update_status(self, queryset, **values):
+        """Массовая смена статуса в обход сигналов: счетчики тегов, статистику авторов и сайдбар обновляем явно"""
+        tag_ids = set(Article.tags.through.objects.filter(
+            article__in=queryset
+        ).values_list('tag_id', flat=True))
+        author_ids = set(queryset.values_list('author_id', flat=True))
+        with transaction.atomic():
+            updated = queryset.update(**values)
+            recount_usage(tag_ids)
+            recount_categories()
+            recount_author_stats(author_ids)
+            transaction.on_commit(invalidate_sidebar)
+        return updated
+
     def make_published(self, request, queryset):
-        updated = queryset.update(status='published', published_at=timezone.now())
+        updated = self._update_status(queryset, status='published', published_at=timezone.now())
         self.message_user(request, f'{updated} статей опубликовано')
 
     make_published.short_description = 'Опубликовать выбранные статьи'
 
     def make_draft(self, request, queryset):
-        updated = queryset.update(status='draft')
+        updated = self._update_status(queryset, status='draft')
         self.message_user(request, f'{updated} статей перемещено в черновики')
 
     make_draft.short_description = 'В черновики'
 
     def make_archived(self, request, queryset):
-        updated = queryset.update(status='archived')
+        updated = self._update_status(queryset, status='archived')
         self.message_user(request, f'{updated} статей архивировано')
 
     make_archived.short_description = 'Архивировать'
@@ -161,11 +239,57 @@ class CustomUserAdmin(UserAdmin):
     list_display = ['username', 'email', 'first_name', 'last_name',
                     'is_staff', 'article_count', 'date_joined']
     list_filter = ['is_staff', 'is_superuser', 'is_active', 'date_joined']
+    list_select_related = ['article_stats']
 
     def article_count(self, obj):
-        return obj.articles.count()
+        # Из статистики автора (AuthorStats), без запроса на строку
+        try:
+            return obj.article_stats.total_articles
+        except AuthorStats.DoesNotExist:
+            return 0
 
     article_count.short_description = 'Статей'
+    article_count.admin_order_field = (
+        F('article_stats__published_count') + F('article_stats__private_count')
+        + F('article_stats__draft_count') + F('article_stats__archived_count')
+    )
+
+
+def instrumentation_view(request):
+    """Последние замеренные запросы процесса (docs.instrumentation), POST - очистить"""
+    if request.method == 'POST':
+        request_log.clear()
+        return redirect('admin_instrumentation')
+    return render(request, 'docs/admin/instrumentation.html', {
+        **admin.site.each_context(request),
+        'title': 'Замеры запросов',
+        'enabled': instrumentation_enabled(),
+        'records': request_log.records(),
+    })
+
+
+def profile_list_view(request):
+    """Сохраненные профили запросов (docs.profiling); ?o=duration - сначала самые долгие"""
+    profiles = list_profiles()
+    if request.GET.get('o') == 'duration':
+        profiles.sort(key=lambda profile: profile['duration_ms'], reverse=True)
+    return render(request, 'docs/admin/profiles.html', {
+        **admin.site.each_context(request),
+        'title': 'Профили запросов',
+        'enabled': profiling_enabled(),
+        'profiles': profiles,
+    })
+
+
+def profile_download_view(request, name):
+    """Файл профиля (pstats); ?format=text - сводка по суммарному времени функций"""
+    try:
+        path = profile_path(name, 'prof')
+        if request.GET.get('format') == 'text':
+            return HttpResponse(profile_summary(name), content_type='text/plain; charset=utf-8')
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=f'{name}.prof')
+    except (ValueError, FileNotFoundError):
+        raise Http404('Профиль не найден')
 
 
 # Перерегистрируем User с кастомной админкой
@@ -204,10 +328,14 @@ class PublishedFilter(admin.SimpleListFilter):
 # Админка для комментариев
 @admin.register(Comment)
 class CommentAdmin(admin.ModelAdmin):
-    list_display = ['id', 'author', 'article', 'content_preview', 'parent',
+    list_display = ['id', 'author', article_filter_link, 'content_preview', 'parent_link',
                     'is_approved', 'is_deleted', 'is_edited', 'created_at']
-    list_filter = ['is_approved', 'is_deleted', 'is_edited', 'created_at', 'article']
+    list_filter = ['is_approved', 'is_deleted', 'is_edited', 'created_at', ArticleIdFilter]
+    list_select_related = ['author', 'article']
+    ordering = ['-pk']  # по первичному ключу - без сортировки всей таблицы
+    raw_id_fields = ['article', 'author', 'parent']
     search_fields = ['content', 'author__username', 'article__title']
+    show_full_result_count = False
     list_editable = ['is_approved', 'is_deleted']
     readonly_fields = ['created_at', 'updated_at']
     actions = ['approve_comments', 'reject_comments', 'soft_delete_comments']
@@ -217,6 +345,16 @@ class CommentAdmin(admin.ModelAdmin):
 
     content_preview.short_description = 'Текст'
 
+    def parent_link(self, obj):
+        # Только id: строковое представление родителя потребовало бы запросов на строку
+        if obj.parent_id is None:
+            return '—'
+        return format_html(
+            '<a href="{}">#{}</a>', reverse('admin:docs_comment_change', args=[obj.parent_id]), obj.parent_id
+        )
+
+    parent_link.short_description = 'Ответ на'
+
     fieldsets = (
         ('Основная информация', {
             'fields': ('article', 'author', 'parent', 'content')
@@ -230,20 +368,28 @@ class CommentAdmin(admin.ModelAdmin):
         }),
     )
 
+    def _update_comments(self, queryset, **values):
+        """Массовое обновление в обход сигналов, поэтому счетчики статей пересчитываем явно"""
+        article_ids = set(queryset.values_list('article_id', flat=True))
+        with transaction.atomic():
+            updated = queryset.update(**values)
+            recount_counters(article_ids)
+        return updated
+
     def approve_comments(self, request, queryset):
-        updated = queryset.update(is_approved=True)
+        updated = self._update_comments(queryset, is_approved=True)
         self.message_user(request, f'{updated} комментариев одобрено')
 
     approve_comments.short_description = 'Одобрить выбранные комментарии'
 
     def reject_comments(self, request, queryset):
-        updated = queryset.update(is_approved=False)
+        updated = self._update_comments(queryset, is_approved=False)
         self.message_user(request, f'{updated} комментариев отклонено')
 
     reject_comments.short_description = 'Отклонить выбранные комментарии'
 
     def soft_delete_comments(self, request, queryset):
-        updated = queryset.update(is_deleted=True)
+        updated = self._update_comments(queryset, is_deleted=True)
         self.message_user(request, f'{updated} комментариев помечено как удаленные')
 
     soft_delete_comments.short_description = 'Пометить как удаленные'
@@ -252,9 +398,13 @@ class CommentAdmin(admin.ModelAdmin):
 # Админка для оценок
 @admin.register(Rating)
 class RatingAdmin(admin.ModelAdmin):
-    list_display = ['id', 'user', 'article', 'rating_type', 'created_at']
-    list_filter = ['rating_type', 'created_at', 'article']
+    list_display = ['id', 'user', article_filter_link, 'rating_type', 'created_at']
+    list_filter = ['rating_type', 'created_at', ArticleIdFilter]
+    list_select_related = ['user', 'article']
+    ordering = ['-pk']  # по первичному ключу - без сортировки всей таблицы
+    raw_id_fields = ['article', 'user']
     search_fields = ['user__username', 'article__title']
+    show_full_result_count = False
     readonly_fields = ['created_at']
 
     def has_add_permission(self, request):
@@ -264,7 +414,11 @@ class RatingAdmin(admin.ModelAdmin):
 # Админка для избранного
 @admin.register(Favorite)
 class FavoriteAdmin(admin.ModelAdmin):
-    list_display = ['id', 'user', 'article', 'created_at']
-    list_filter = ['created_at']
+    list_display = ['id', 'user', article_filter_link, 'created_at']
+    list_filter = ['created_at', ArticleIdFilter]
+    list_select_related = ['user', 'article']
+    ordering = ['-pk']  # по первичному ключу - без сортировки всей таблицы
+    raw_id_fields = ['article', 'user']
     search_fields = ['user__username', 'article__title']
+    show_full_result_count = False
     readonly_fields = ['created_at']
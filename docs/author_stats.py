@@ -0,0 +1,145 @@
+from collections import defaultdict
+
+from django.contrib.auth.models import User
+from django.db.models import Count, F, Sum
+
+from .models import Article, AuthorStats
+
+
+# Статистика авторов (AuthorStats) меняется инкрементально: при создании,
+# смене статуса и удалении статей, при изменении счетчиков статей
+# (см. docs/counters.py) и при переносе просмотров (см. docs/view_counter.py).
+# Строка, которой еще нет, создается пересчетом по фактическим данным.
+
+STATUS_FIELDS = {
+    'published': 'published_count',
+    'private': 'private_count',
+    'draft': 'draft_count',
+    'archived': 'archived_count',
+}
+
+# Поле статистики для счетчика статьи
+COUNTER_FIELDS = {
+    'view_count': 'total_views',
+    'comments_count': 'total_comments',
+    'likes_count': 'total_likes',
+    'favorites_count': 'total_favorites',
+}
+
+STATS_FIELDS = list(STATUS_FIELDS.values()) + list(COUNTER_FIELDS.values())
+
+
+def adjust_author_stats(user_id, deltas):
+    """Изменяет статистику автора на deltas {поле: прирост} (в рамках текущей транзакции)"""
+    deltas = {field: delta for field, delta in deltas.items() if field and delta}
+    if not deltas:
+        return
+    updated = AuthorStats.objects.filter(user_id=user_id).update(
+        **{field: F(field) + delta for field, delta in deltas.items()}
+    )
+    if not updated:
+        recount_author_stats([user_id])
+
+
+def adjust_article_author(article_id, counter_field, delta):
+    """Изменение счетчика статьи - в статистике ее автора"""
+    field = COUNTER_FIELDS.get(counter_field)
+    if not field or not delta:
+        return
+    updated = AuthorStats.objects.filter(user__articles=article_id).update(**{field: F(field) + delta})
+    if not updated:
+        recount_author_stats(Article.objects.filter(pk=article_id).values_list('author_id', flat=True))
+
+
+def article_deltas(article, sign):
+    """Вклад статьи в статистику автора (sign=-1 - при удалении)"""
+    deltas = {COUNTER_FIELDS[counter]: sign * getattr(article, counter) for counter in COUNTER_FIELDS}
+    if article.status in STATUS_FIELDS:
+        deltas[STATUS_FIELDS[article.status]] = sign
+    return deltas
+
+
+def adjust_author_views(views):
+    """Перенесенные просмотры {id статьи: прирост} - в статистике авторов"""
+    by_author = defaultdict(int)
+    for article_id, author_id in Article.objects.filter(pk__in=list(views)).values_list('pk', 'author_id'):
+        by_author[author_id] += views[article_id]
+
+    # Один UPDATE на каждое встречающееся значение прироста
+    by_delta = defaultdict(list)
+    for author_id, delta in by_author.items():
+        by_delta[delta].append(author_id)
+    for delta, author_ids in by_delta.items():
+        AuthorStats.objects.filter(user_id__in=author_ids).update(total_views=F('total_views') + delta)
+
+
+def compute_author_stats(user_ids):
+    """Фактическая статистика авторов: {id: {поле: значение}}"""
+    stats = {user_id: dict.fromkeys(STATS_FIELDS, 0) for user_id in user_ids}
+
+    by_status = Article.objects.filter(author_id__in=user_ids).values(
+        'author_id', 'status'
+    ).annotate(total=Count('id'))
+    for row in by_status:
+        field = STATUS_FIELDS.get(row['status'])
+        if field:
+            stats[row['author_id']][field] = row['total']
+
+    totals = Article.objects.filter(author_id__in=user_ids).values('author_id').annotate(
+        **{field: Sum(counter) for counter, field in COUNTER_FIELDS.items()}
+    )
+    for row in totals:
+        for field in COUNTER_FIELDS.values():
+            stats[row['author_id']][field] = row[field] or 0
+
+    return stats
+
+
+def recount_author_stats(user_ids):
+    """Пересчитывает статистику авторов, возвращает количество исправленных записей"""
+    user_ids = list(User.objects.filter(pk__in=list(user_ids)).values_list('pk', flat=True))
+    if not user_ids:
+        return 0
+
+    actual = compute_author_stats(user_ids)
+    current = {row.user_id: row for row in AuthorStats.objects.filter(user_id__in=user_ids)}
+
+    new_rows = [AuthorStats(user_id=user_id, **values)
+                for user_id, values in actual.items() if user_id not in current]
+    changed = []
+    for user_id, row in current.items():
+        values = actual[user_id]
+        if any(getattr(row, field) != values[field] for field in STATS_FIELDS):
+            for field in STATS_FIELDS:
+                setattr(row, field, values[field])
+            changed.append(row)
+
+    AuthorStats.objects.bulk_create(new_rows, batch_size=500, ignore_conflicts=True)
+    if changed:
+        AuthorStats.objects.bulk_update(changed, STATS_FIELDS, batch_size=500)
+    return len(new_rows) + len(changed)
+
+
+def reconcile_author_stats(batch_size=500):
+    """Сверяет статистику всех авторов пакетами, возвращает (проверено, исправлено)"""
+    checked = fixed = 0
+    last_id = 0
+    while True:
+        ids = list(
+            User.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+        fixed += recount_author_stats(ids)
+        checked += len(ids)
+        last_id = ids[-1]
+    return checked, fixed
+
+
+def get_author_stats(user):
+    """Строка статистики автора (при отсутствии создается пересчетом)"""
+    stats = AuthorStats.objects.filter(user=user).first()
+    if stats is None:
+        recount_author_stats([user.pk])
+        stats = AuthorStats.objects.get(user=user)
+    return stats
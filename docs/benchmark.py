@@ -0,0 +1,397 @@
+import datetime
+import os
+import platform
+import random
+import subprocess
+import time
+import tracemalloc
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .author_stats import reconcile_author_stats
+from .counters import reconcile_all
+from .models import Article, ArticleVersion, Category, Comment, Favorite, Rating, Tag
+from .related import wait_for_related_updates
+
+
+# Нагрузочные замеры страниц на синтетическом корпусе. Корпус строится
+# детерминированно по seed, запросы идут через тестовый клиент, результат -
+# JSON с перцентилями времени, количеством запросов к базе и пиком памяти,
+# чтобы сравнивать его между коммитами (команда benchmark).
+
+BENCHMARK_SCALES = {
+    'small': {
+        'articles': 60, 'versions': 3, 'comments': 12, 'reply_depth': 3, 'ratings': 20,
+        'users': 40, 'tags': 30, 'tags_per_article': 3, 'category_depth': 4, 'category_breadth': 2,
+    },
+    'medium': {
+        'articles': 500, 'versions': 6, 'comments': 40, 'reply_depth': 5, 'ratings': 80,
+        'users': 300, 'tags': 150, 'tags_per_article': 4, 'category_depth': 5, 'category_breadth': 3,
+    },
+    'large': {
+        'articles': 3000, 'versions': 10, 'comments': 80, 'reply_depth': 6, 'ratings': 200,
+        'users': 1500, 'tags': 500, 'tags_per_article': 5, 'category_depth': 6, 'category_breadth': 3,
+    },
+}
+
+BENCHMARK_USER_PREFIX = 'bench-'
+
+_WORDS = (
+    'база знаний статья версия документ раздел настройка сервер клиент запрос ответ '
+    'таблица индекс поиск кэш очередь обработка данные модель шаблон страница список '
+    'категория тег комментарий оценка экспорт импорт пользователь доступ права журнал '
+    'ошибка проверка сборка развертывание миграция резервная копия восстановление '
+    'database cache index query worker deploy backup python django markdown template'
+).split()
+
+
+def _sentence(rng, words=12):
+    text = ' '.join(rng.choice(_WORDS) for _ in range(rng.randint(words // 2, words)))
+    return text.capitalize() + '.'
+
+
+def _paragraph(rng):
+    return ' '.join(_sentence(rng) for _ in range(rng.randint(3, 6)))
+
+
+def generate_markdown(rng, sections=4):
+    """Текст статьи: заголовки, абзацы, список, код и таблица"""
+    parts = []
+    for number in range(1, sections + 1):
+        parts.append(f'## Раздел {number}: {rng.choice(_WORDS)}')
+        parts.extend(_paragraph(rng) for _ in range(rng.randint(1, 3)))
+        if number % 2:
+            parts.append('\n'.join(f'- {_sentence(rng, 6)}' for _ in range(rng.randint(2, 5))))
+        else:
+            parts.append('```python\n' + '\n'.join(
+                f'{rng.choice(_WORDS[-10:])}_{line} = {line}' for line in range(rng.randint(2, 6))
+            ) + '\n```')
+    parts.append('| Параметр | Значение |\n|---|---|\n' + '\n'.join(
+        f'| {rng.choice(_WORDS)} | {rng.randint(1, 1000)} |' for _ in range(3)
+    ))
+    return '\n\n'.join(parts)
+
+
+def _revise(rng, content):
+    """Следующая версия: часть абзацев меняется, иногда добавляется новый"""
+    paragraphs = content.split('\n\n')
+    for _ in range(max(1, len(paragraphs) // 5)):
+        index = rng.randrange(len(paragraphs))
+        if not paragraphs[index].startswith(('#', '```', '|', '-')):
+            paragraphs[index] = _paragraph(rng)
+    if rng.random() < 0.5:
+        paragraphs.insert(rng.randrange(len(paragraphs) + 1), _paragraph(rng))
+    return '\n\n'.join(paragraphs)
+
+
+class CorpusGenerator:
+    """
+    Синтетический корпус: дерево категорий, теги, пользователи, статьи
+    с несколькими версиями, деревья комментариев, оценки и избранное.
+    Статьи и версии сохраняются обычным образом (сигналы заполняют хранилище
+    версий, HTML, поисковый индекс и похожие статьи), массовые данные -
+    bulk_create с последующей сверкой счетчиков.
+    """
+
+    def __init__(self, seed=1, **scale):
+        self.rng = random.Random(seed)
+        self.seed = seed
+        self.scale = dict(BENCHMARK_SCALES['small'], **scale)
+
+    def generate(self):
+        started = time.perf_counter()
+        users = self._create_users()
+        categories = self._create_categories()
+        tags = self._create_tags()
+        with transaction.atomic():
+            articles = [self._create_article(number, users, categories, tags)
+                        for number in range(self.scale['articles'])]
+        # Соседи похожих статей пересчитываются в фоне - корпус готов после них
+        wait_for_related_updates()
+        published = [article for article in articles if article.status == 'published']
+        self._create_comments(published, users)
+        self._create_ratings(published, users)
+        self._set_view_counts(articles)
+
+        # Оценки и комментарии созданы в обход сигналов
+        reconcile_all()
+        reconcile_author_stats()
+
+        return self._describe(users[0], published, time.perf_counter() - started)
+
+    def _create_users(self):
+        users = User.objects.bulk_create([
+            User(username=f'{BENCHMARK_USER_PREFIX}{number}') for number in range(self.scale['users'])
+        ])
+        # Основной автор - для личного кабинета с большим количеством статей
+        users[0].set_password('benchmark')
+        users[0].save(update_fields=['password'])
+        return users
+
+    def _create_categories(self):
+        """Дерево глубиной category_depth, у каждого узла category_breadth детей (но не больше 200 узлов)"""
+        nodes = []
+        level = [None]
+        for depth in range(self.scale['category_depth']):
+            next_level = []
+            for parent in level:
+                for number in range(self.scale['category_breadth'] if parent else 1):
+                    if len(nodes) >= 200:
+                        break
+                    slug = f'bench-{depth}-{len(nodes)}'
+                    node = Category.objects.create(name=f'Раздел {slug}', slug=slug, parent=parent)
+                    nodes.append(node)
+                    next_level.append(node)
+            level = next_level
+        return nodes
+
+    def _create_tags(self):
+        return Tag.objects.bulk_create([
+            Tag(name=f'{self.rng.choice(_WORDS)}-{number}', slug=f'bench-tag-{number}')
+            for number in range(self.scale['tags'])
+        ])
+
+    def _create_article(self, number, users, categories, tags):
+        rng = self.rng
+        # Около трети статей у основного автора
+        author = users[0] if rng.random() < 0.35 else rng.choice(users)
+        status = rng.choices(['published', 'draft', 'private', 'archived'], weights=[80, 8, 7, 5])[0]
+        title = f'{_sentence(rng, 6)[:-1]} {number}'
+
+        article = Article.objects.create(
+            title=title, slug=f'bench-article-{number}', author=author,
+            category=rng.choice(categories), status=status,
+        )
+        content = generate_markdown(rng, sections=rng.randint(3, 8))
+        for version_number in range(rng.randint(1, self.scale['versions'])):
+            if version_number:
+                content = _revise(rng, content)
+            version = ArticleVersion(
+                article=article, title=title, content=content, excerpt=_sentence(rng),
+                author=author, change_reason=f'Правка {version_number}',
+            )
+            version.save()
+        article.current_version = version
+        article.save()
+        article.tags.set(rng.sample(tags, min(self.scale['tags_per_article'], len(tags))))
+        return article
+
+    def _create_comments(self, articles, users):
+        """Деревья комментариев: корни и ответы до reply_depth уровней, по уровням через bulk_create"""
+        rng = self.rng
+        by_level = []
+        for article in articles:
+            nodes = []
+            for _ in range(rng.randint(0, self.scale['comments'])):
+                parents = [node for node in nodes if node['level'] < self.scale['reply_depth'] - 1]
+                parent = rng.choice(parents) if parents and rng.random() < 0.6 else None
+                node = {
+                    'article_id': article.id,
+                    'author_id': rng.choice(users).id,
+                    'parent': parent,
+                    'level': parent['level'] + 1 if parent else 0,
+                    'content': _sentence(rng, 20),
+                }
+                nodes.append(node)
+                while len(by_level) <= node['level']:
+                    by_level.append([])
+                by_level[node['level']].append(node)
+
+        for nodes in by_level:
+            comments = Comment.objects.bulk_create([
+                Comment(
+                    article_id=node['article_id'], author_id=node['author_id'], content=node['content'],
+                    parent_id=node['parent']['comment'].id if node['parent'] else None,
+                    lft=0, rght=0, tree_id=0, level=0,
+                ) for node in nodes
+            ], batch_size=500)
+            for node, comment in zip(nodes, comments):
+                node['comment'] = comment
+        # Поля дерева (lft, rght, tree_id, level) - одним перестроением
+        Comment.objects.rebuild()
+
+    def _create_ratings(self, articles, users):
+        rng = self.rng
+        ratings, favorites = [], []
+        for article in articles:
+            voters = rng.sample(users, min(rng.randint(0, self.scale['ratings']), len(users)))
+            for user in voters:
+                ratings.append(Rating(article=article, user=user, rating_type=rng.choices(
+                    ['like', 'dislike'], weights=[4, 1])[0]))
+            for user in voters[:len(voters) // 3]:
+                favorites.append(Favorite(article=article, user=user))
+        Rating.objects.bulk_create(ratings, batch_size=1000)
+        Favorite.objects.bulk_create(favorites, batch_size=1000)
+
+    def _set_view_counts(self, articles):
+        for article in articles:
+            article.view_count = int(self.rng.paretovariate(1.2) * 10)
+        Article.objects.bulk_update(articles, ['view_count'], batch_size=500)
+
+    def _describe(self, author, published, elapsed):
+        """Объекты, на которых выполняются замеры"""
+        article = max(published, key=lambda article: (article.versions.count(), article.comments.count()))
+        versions = list(article.versions.order_by('version_number').values_list('id', flat=True))
+        tag = Tag.objects.filter(usage__article_count__gt=0).order_by('-usage__article_count').first()
+        category = Category.objects.filter(level=0).first()
+        return {
+            'seed': self.seed,
+            'scale': self.scale,
+            'generated_in_s': round(elapsed, 2),
+            'counts': {
+                'articles': Article.objects.count(),
+                'versions': ArticleVersion.objects.count(),
+                'comments': Comment.objects.count(),
+                'ratings': Rating.objects.count(),
+                'favorites': Favorite.objects.count(),
+                'tags': Tag.objects.count(),
+                'categories': Category.objects.count(),
+                'users': User.objects.count(),
+            },
+            'author': author.username,
+            'article': article.slug,
+            'versions': versions,
+            'tag': tag.slug if tag else None,
+            'category': category.slug if category else None,
+            'query': ' '.join(_WORDS[:2]),
+        }
+
+
+# Замеры: имя -> (построение URL по описанию корпуса, нужен ли вход)
+BENCHMARKS = {
+    'article_list': (lambda corpus: reverse('docs:article_list'), False),
+    'article_detail': (lambda corpus: reverse('docs:article_detail', args=[corpus['article']]), False),
+    'search': (lambda corpus: reverse('docs:search') + f'?q={corpus["query"]}', False),
+    'tag_cloud': (lambda corpus: reverse('docs:tag_cloud'), False),
+    'tag_articles': (lambda corpus: reverse('docs:tag_articles', args=[corpus['tag']]), False),
+    'category_articles': (lambda corpus: reverse('docs:category_articles', args=[corpus['category']]), False),
+    'comment_tree': (lambda corpus: reverse('docs:comment_tree', args=[corpus['article']]), False),
+    'version_list': (lambda corpus: reverse('docs:version_list', args=[corpus['article']]), True),
+    'version_detail': (
+        lambda corpus: reverse('docs:version_detail', args=[corpus['article'], corpus['versions'][0]]), False
+    ),
+    'compare_versions': (
+        lambda corpus: reverse('docs:compare_versions', args=[corpus['article']])
+        + f'?v1={corpus["versions"][0]}&v2={corpus["versions"][-1]}', True
+    ),
+    'user_dashboard': (lambda corpus: reverse('docs:user_dashboard'), True),
+    'export_article': (lambda corpus: reverse('docs:export_article', args=[corpus['article'], 'html']), True),
+}
+
+
+def _percentile(values, percent):
+    """Перцентиль с линейной интерполяцией, values отсортированы"""
+    if not values:
+        return None
+    position = (len(values) - 1) * percent / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def _consume(response):
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+    if hasattr(response, 'close'):
+        response.close()
+
+
+def measure(client, url, iterations=20, warmup=2):
+    """Время (мс), количество запросов к базе и пик памяти (КБ) для GET url"""
+    for _ in range(warmup):
+        _consume(client.get(url))
+
+    timings, queries = [], []
+    status = None
+    for _ in range(iterations):
+        connection.queries_log.clear()
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = client.get(url)
+            _consume(response)
+            timings.append((time.perf_counter() - started) * 1000)
+        queries.append(len(captured.captured_queries))
+        status = response.status_code
+
+    # Память - отдельным запросом: трассировка замедляет выполнение
+    tracemalloc.start()
+    try:
+        _consume(client.get(url))
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    timings.sort()
+    return {
+        'url': url,
+        'status': status,
+        'iterations': iterations,
+        'p50_ms': round(_percentile(timings, 50), 2),
+        'p95_ms': round(_percentile(timings, 95), 2),
+        'mean_ms': round(sum(timings) / len(timings), 2),
+        'max_ms': round(timings[-1], 2),
+        'queries': max(queries),
+        'peak_memory_kb': round(peak / 1024, 1),
+    }
+
+
+def run_benchmarks(corpus, names=None, iterations=20, warmup=2):
+    """Замеры по описанию корпуса (результат CorpusGenerator.generate)"""
+    anonymous = Client()
+    member = Client()
+    member.force_login(User.objects.get(username=corpus['author']))
+
+    results = {}
+    for name, (build_url, login) in BENCHMARKS.items():
+        if names and name not in names:
+            continue
+        results[name] = measure(member if login else anonymous, build_url(corpus), iterations, warmup)
+    return results
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, timeout=5, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def build_report(corpus, results):
+    return {
+        'revision': _git_revision(),
+        'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'environment': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'cpu_count': os.cpu_count(),
+        },
+        'corpus': corpus,
+        'results': results,
+    }
+
+
+def compare_reports(baseline, current):
+    """Строки сравнения с прежним отчетом: (имя, p50 было/стало, p95 было/стало, запросы было/стало)"""
+    rows = []
+    for name, result in current['results'].items():
+        before = baseline.get('results', {}).get(name)
+        if before is None:
+            continue
+        rows.append((
+            name,
+            before['p50_ms'], result['p50_ms'],
+            before['p95_ms'], result['p95_ms'],
+            before['queries'], result['queries'],
+        ))
+    return rows
@@ -0,0 +1,59 @@
+from django.db.models import Count, F
+
+from .models import Article, Category
+
+
+# Category.article_count - опубликованные статьи непосредственно в категории,
+# Category.total_article_count - вместе со всеми подкатегориями.
+# Смена категории или статуса статьи меняет счетчики узла и его предков
+# одним UPDATE по интервалу lft/rght.
+
+def adjust_category_count(category_id, delta):
+    if not category_id or not delta:
+        return
+    node = Category.objects.filter(pk=category_id).values('tree_id', 'lft', 'rght').first()
+    if node is None:
+        return
+    Category.objects.filter(pk=category_id).update(article_count=F('article_count') + delta)
+    Category.objects.filter(
+        tree_id=node['tree_id'],
+        lft__lte=node['lft'],
+        rght__gte=node['rght']
+    ).update(total_article_count=F('total_article_count') + delta)
+
+
+def compute_category_counts(nodes, direct):
+    """
+    Счетчики узлов по прямым количествам статей.
+    nodes - категории в порядке (tree_id, lft), direct - {id категории: статей}.
+    Возвращает {id: (article_count, total_article_count)}.
+    """
+    totals = {}
+    # В обратном порядке обхода потомки идут раньше предков
+    for node in reversed(nodes):
+        totals[node.id] = totals.get(node.id, 0) + direct.get(node.id, 0)
+        if node.parent_id is not None:
+            totals[node.parent_id] = totals.get(node.parent_id, 0) + totals[node.id]
+    return {node.id: (direct.get(node.id, 0), totals[node.id]) for node in nodes}
+
+
+def recount_categories():
+    """Пересчитывает счетчики всех категорий, возвращает количество исправленных"""
+    direct = dict(
+        Article.objects.filter(status='published').values('category_id').annotate(
+            total=Count('id')
+        ).values_list('category_id', 'total')
+    )
+    nodes = list(Category.objects.order_by('tree_id', 'lft'))
+
+    changed = []
+    counts = compute_category_counts(nodes, direct)
+    for node in nodes:
+        article_count, total = counts[node.id]
+        if (node.article_count, node.total_article_count) != (article_count, total):
+            node.article_count = article_count
+            node.total_article_count = total
+            changed.append(node)
+
+    Category.objects.bulk_update(changed, ['article_count', 'total_article_count'], batch_size=500)
+    return len(changed)
@@ -0,0 +1,141 @@
+import base64
+import binascii
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from .models import Comment
+
+
+def visible_comments(article):
+    """Одобренные и не удаленные комментарии статьи"""
+    return Comment.objects.filter(
+        article=article,
+        is_approved=True,
+        is_deleted=False
+    ).select_related('author')
+
+
+def build_comment_tree(comments, root_ids=()):
+    """
+    Собирает дерево в памяти из комментариев, упорядоченных по (tree_id, lft).
+    Дочерние узлы кэшируются, поэтому get_children() не делает запросов.
+    Ветки скрытых комментариев отбрасываются вместе с ответами.
+    Корнями считаются комментарии верхнего уровня и узлы из root_ids.
+    """
+    nodes = {}
+    roots = []
+    for comment in comments:
+        comment._cached_children = []
+        if comment.parent_id is None or comment.id in root_ids:
+            roots.append(comment)
+        else:
+            parent = nodes.get(comment.parent_id)
+            if parent is None:
+                continue
+            comment.parent = parent
+            parent._cached_children.append(comment)
+        nodes[comment.id] = comment
+    return roots
+
+
+def load_comment_tree(article):
+    """Все видимые комментарии статьи одним запросом, корневые - сначала новые"""
+    roots = build_comment_tree(visible_comments(article).order_by('tree_id', 'lft'))
+    roots.sort(key=lambda comment: (comment.created_at, comment.id), reverse=True)
+    return roots
+
+
+# Курсор постраничной выдачи корневых комментариев
+
+def encode_cursor(comment):
+    payload = json.dumps([comment.created_at.isoformat(), comment.id])
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Возвращает (created_at, id) или None для некорректного курсора"""
+    try:
+        created_at, comment_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        created_at = parse_datetime(created_at)
+    except (ValueError, TypeError, binascii.Error):
+        return None
+    if created_at is None or not isinstance(comment_id, int):
+        return None
+    return created_at, comment_id
+
+
+def load_thread_page(article, cursor=None, limit=20, depth=3):
+    """
+    Страница корневых комментариев (сначала новые) с ответами до глубины depth.
+    Возвращает (корни, курсор следующей страницы или None).
+    """
+    roots = visible_comments(article).filter(parent__isnull=True).order_by('-created_at', '-id')
+    if cursor:
+        created_at, comment_id = cursor
+        roots = roots.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=comment_id)
+        )
+    roots = list(roots[:limit + 1])
+
+    next_cursor = None
+    if len(roots) > limit:
+        roots = roots[:limit]
+        next_cursor = encode_cursor(roots[-1])
+
+    if roots and depth > 0:
+        # Ответы всех веток страницы - одним диапазонным запросом по деревьям
+        replies = visible_comments(article).filter(
+            tree_id__in=[root.tree_id for root in roots],
+            level__gt=0,
+            level__lte=depth
+        ).order_by('tree_id', 'lft')
+
+        by_tree = {root.tree_id: [root] for root in roots}
+        for reply in replies:
+            by_tree[reply.tree_id].append(reply)
+        for nodes in by_tree.values():
+            build_comment_tree(nodes)
+    else:
+        for root in roots:
+            root._cached_children = []
+
+    return roots, next_cursor
+
+
+def load_subtree(comment, depth=3):
+    """Ответы на комментарий до глубины depth одним запросом по интервалу lft/rght"""
+    replies = visible_comments(comment.article_id).filter(
+        tree_id=comment.tree_id,
+        lft__gt=comment.lft,
+        rght__lt=comment.rght,
+        level__lte=comment.level + depth
+    ).order_by('lft')
+    build_comment_tree([comment, *replies], root_ids={comment.id})
+    return comment
+
+
+def serialize_comment(comment, replies_url, depth):
+    """Комментарий и загруженные ответы в виде словаря для JSON"""
+    data = {
+        'id': comment.id,
+        'parent_id': comment.parent_id,
+        'level': comment.level,
+        'author': comment.author.username,
+        'content': comment.content,
+        'created_at': comment.created_at.isoformat(),
+        'is_edited': comment.is_edited,
+    }
+    if depth > 0:
+        children = getattr(comment, '_cached_children', [])
+        data['has_replies'] = bool(children)
+        data['replies'] = [serialize_comment(child, replies_url, depth - 1) for child in children]
+    else:
+        # Ответы не загружены: по интервалу lft/rght видно, что они есть,
+        # и клиент может подгрузить ветку отдельным запросом
+        data['has_replies'] = comment.rght - comment.lft > 1
+        data['replies'] = []
+        if data['has_replies']:
+            data['replies_url'] = f'{replies_url}?parent={comment.id}'
+    return data
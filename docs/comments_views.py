@@ -1,44 +1,59 @@
-from django.shortcuts import render, get_object_or_404, redirect
+from asgiref.sync import sync_to_async
+from django.shortcuts import render, aget_object_or_404, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_POST
 from django.http import JsonResponse
 from django.contrib import messages
 from django.db import transaction
 from django.utils import timezone
+from django.urls import reverse
 from .models import Article, Comment, Rating, Favorite
 from .comments_forms import CommentForm, CommentEditForm
+from .comments_tree import decode_cursor, load_subtree, load_thread_page, serialize_comment
+
+
+# Оценки, избранное, добавление и редактирование комментариев - асинхронные
+# представления: под ASGI-сервером ожидание базы не занимает поток, и всплеск
+# запросов к новой статье обслуживается одним процессом. Запись с сигналами
+# (счетчики, индексы) выполняется одной синхронной функцией в транзакции.
+
+
+def _save_comment(form, article, user):
+    with transaction.atomic():
+        comment = form.save(commit=False)
+        comment.article = article
+        comment.author = user
+
+        # Обработка родительского комментария (для ответов)
+        parent_id = form.cleaned_data.get('parent')
+        if parent_id:
+            parent_comment = get_object_or_404(Comment, id=parent_id, article=article)
+            comment.parent = parent_comment
+
+        comment.save()
+    return comment
 
 
 @login_required
 @require_POST
-def add_comment(request, slug):
+async def add_comment(request, slug):
     """Добавление комментария к статье"""
-    article = get_object_or_404(Article, slug=slug, status='published')
+    article = await aget_object_or_404(Article, slug=slug, status='published')
+    user = await request.auser()
     form = CommentForm(request.POST)
 
-    if form.is_valid():
+    if await sync_to_async(form.is_valid)():
         try:
-            with transaction.atomic():
-                comment = form.save(commit=False)
-                comment.article = article
-                comment.author = request.user
-
-                # Обработка родительского комментария (для ответов)
-                parent_id = form.cleaned_data.get('parent')
-                if parent_id:
-                    parent_comment = get_object_or_404(Comment, id=parent_id, article=article)
-                    comment.parent = parent_comment
-
-                comment.save()
+            comment = await sync_to_async(_save_comment)(form, article, user)
 
-                messages.success(request, 'Комментарий успешно добавлен!')
+            messages.success(request, 'Комментарий успешно добавлен!')
 
-                if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-                    return JsonResponse({
-                        'success': True,
-                        'message': 'Комментарий добавлен',
-                        'comment_id': comment.id
-                    })
+            if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+                return JsonResponse({
+                    'success': True,
+                    'message': 'Комментарий добавлен',
+                    'comment_id': comment.id
+                })
 
         except Exception as e:
             messages.error(request, 'Ошибка при добавлении комментария')
@@ -60,13 +75,14 @@ def add_comment(request, slug):
 
 @login_required
 @require_POST
-def edit_comment(request, comment_id):
+async def edit_comment(request, comment_id):
     """Редактирование комментария"""
-    comment = get_object_or_404(Comment, id=comment_id, author=request.user)
+    user = await request.auser()
+    comment = await aget_object_or_404(Comment.objects.select_related('article'), id=comment_id, author=user)
     form = CommentEditForm(request.POST, instance=comment)
 
-    if form.is_valid():
-        form.save()
+    if await sync_to_async(form.is_valid)():
+        await sync_to_async(form.save)()
         messages.success(request, 'Комментарий успешно обновлен!')
 
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
@@ -111,11 +127,24 @@ def delete_comment(request, comment_id):
     return redirect('docs:article_detail', slug=comment.article.slug)
 
 
+def _replace_rating(article, user, rating_type):
+    with transaction.atomic():
+        # Удаляем существующую оценку пользователя
+        Rating.objects.filter(article=article, user=user).delete()
+
+        # Создаем новую оценку
+        Rating.objects.create(
+            article=article,
+            user=user,
+            rating_type=rating_type
+        )
+
+
 @login_required
 @require_POST
-def rate_article(request, slug):
+async def rate_article(request, slug):
     """Оценка статьи (лайк/дизлайк)"""
-    article = get_object_or_404(Article, slug=slug, status='published')
+    article = await aget_object_or_404(Article, slug=slug, status='published')
     rating_type = request.POST.get('rating_type')
 
     if rating_type not in ['like', 'dislike']:
@@ -125,26 +154,17 @@ def rate_article(request, slug):
         }, status=400)
 
     try:
-        with transaction.atomic():
-            # Удаляем существующую оценку пользователя
-            Rating.objects.filter(article=article, user=request.user).delete()
+        await sync_to_async(_replace_rating)(article, await request.auser(), rating_type)
 
-            # Создаем новую оценку
-            rating = Rating.objects.create(
-                article=article,
-                user=request.user,
-                rating_type=rating_type
-            )
+        # Счетчики уже обновлены сигналами в той же транзакции
+        await article.arefresh_from_db(fields=['likes_count', 'dislikes_count'])
 
-            like_count = article.get_like_count()
-            dislike_count = article.get_dislike_count()
-
-            return JsonResponse({
-                'success': True,
-                'like_count': like_count,
-                'dislike_count': dislike_count,
-                'user_rating': rating_type
-            })
+        return JsonResponse({
+            'success': True,
+            'like_count': article.get_like_count(),
+            'dislike_count': article.get_dislike_count(),
+            'user_rating': rating_type
+        })
 
     except Exception as e:
         return JsonResponse({
@@ -155,20 +175,20 @@ def rate_article(request, slug):
 
 @login_required
 @require_POST
-def remove_rating(request, slug):
+async def remove_rating(request, slug):
     """Удаление оценки статьи"""
-    article = get_object_or_404(Article, slug=slug, status='published')
+    article = await aget_object_or_404(Article, slug=slug, status='published')
 
     try:
-        Rating.objects.filter(article=article, user=request.user).delete()
+        await Rating.objects.filter(article=article, user=await request.auser()).adelete()
 
-        like_count = article.get_like_count()
-        dislike_count = article.get_dislike_count()
+        # Счетчики уже обновлены сигналами
+        await article.arefresh_from_db(fields=['likes_count', 'dislikes_count'])
 
         return JsonResponse({
             'success': True,
-            'like_count': like_count,
-            'dislike_count': dislike_count,
+            'like_count': article.get_like_count(),
+            'dislike_count': article.get_dislike_count(),
             'user_rating': None
         })
 
@@ -181,19 +201,19 @@ def remove_rating(request, slug):
 
 @login_required
 @require_POST
-def toggle_favorite(request, slug):
+async def toggle_favorite(request, slug):
     """Добавление/удаление статьи из избранного"""
-    article = get_object_or_404(Article, slug=slug, status='published')
+    article = await aget_object_or_404(Article, slug=slug, status='published')
 
     try:
-        favorite, created = Favorite.objects.get_or_create(
-            user=request.user,
+        favorite, created = await Favorite.objects.aget_or_create(
+            user=await request.auser(),
             article=article
         )
 
         if not created:
             # Если уже в избранном - удаляем
-            favorite.delete()
+            await favorite.adelete()
             is_favorite = False
             message = 'Статья удалена из избранного'
         else:
@@ -222,14 +242,49 @@ def toggle_favorite(request, slug):
 
 
 def comment_tree(request, slug):
-    """Получение дерева комментариев для статьи"""
+    """
+    Дерево комментариев статьи в JSON.
+    Корневые комментарии отдаются страницами по курсору (?cursor=, ?limit=),
+    ответы - до глубины ?depth=; ветку глубже можно подгрузить через ?parent=<id>.
+    """
     article = get_object_or_404(Article, slug=slug, status='published')
-    comments = Comment.objects.filter(
-        article=article,
-        is_approved=True,
-        is_deleted=False
-    ).select_related('author').prefetch_related('children')
-
-    # Здесь будет логика для рендеринга дерева комментариев
-    # Вернем JSON или рендерим шаблон
-    pass
\ No newline at end of file
+    replies_url = reverse('docs:comment_tree', kwargs={'slug': slug})
+
+    try:
+        limit = min(max(int(request.GET.get('limit', 20)), 1), 50)
+        depth = min(max(int(request.GET.get('depth', 3)), 0), 10)
+    except ValueError:
+        return JsonResponse({
+            'success': False,
+            'error': 'Некорректные параметры limit или depth'
+        }, status=400)
+
+    parent_id = request.GET.get('parent')
+    if parent_id:
+        parent = get_object_or_404(
+            Comment.objects.select_related('author'),
+            id=parent_id, article=article, is_approved=True, is_deleted=False
+        )
+        load_subtree(parent, depth=depth)
+        return JsonResponse({
+            'success': True,
+            'comment': serialize_comment(parent, replies_url, depth),
+        })
+
+    cursor = None
+    if request.GET.get('cursor'):
+        cursor = decode_cursor(request.GET['cursor'])
+        if cursor is None:
+            return JsonResponse({
+                'success': False,
+                'error': 'Некорректный курсор'
+            }, status=400)
+
+    roots, next_cursor = load_thread_page(article, cursor=cursor, limit=limit, depth=depth)
+
+    return JsonResponse({
+        'success': True,
+        'comments': [serialize_comment(root, replies_url, depth) for root in roots],
+        'next_cursor': next_cursor,
+        'comment_count': article.get_comment_count(),
+    })
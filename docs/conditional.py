@@ -0,0 +1,159 @@
+import datetime
+import hashlib
+import time
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.middleware.csrf import get_token
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from .sidebar import get_generation as get_sidebar_generation
+
+
+# Условные GET-запросы (ETag/Last-Modified) для страниц статей и списков.
+# Валидаторы строятся из данных, которые уже есть после загрузки статьи,
+# и из отметок времени изменений в кэше: отметка статьи меняется при новых
+# версиях, комментариях, оценках, избранном, тегах и похожих статьях, общая
+# отметка - при любом изменении статей. Отметки обновляются после фиксации
+# транзакции (см. signals.py). Отметки в кэше процесса (LocMemCache) другие
+# процессы не видят, поэтому без общего кэша валидаторы не выдаются (stamps_shared).
+#
+# Увеличьте номер при изменении шаблонов страниц, чтобы клиенты не получали 304
+# для разметки, построенной прежними шаблонами.
+PAGE_VALIDATOR_VERSION = 1
+
+_CONTENT_STAMP_KEY = 'pages:stamp:content'
+
+# Кэши, которые не видны другим процессам: отметка, обновленная в одном
+# процессе, не меняется в остальных
+_PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def _article_key(article_id):
+    return f'pages:stamp:article:{article_id}'
+
+
+def _get_stamp(key):
+    # Начальное значение - текущее время: после очистки кэша отметки
+    # не повторяют прежние значения
+    stamp = cache.get(key)
+    if stamp is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        stamp = cache.get(key, 0)
+    return stamp
+
+
+def get_content_stamp():
+    return _get_stamp(_CONTENT_STAMP_KEY)
+
+
+def get_article_stamp(article_id):
+    return _get_stamp(_article_key(article_id))
+
+
+def touch_articles(article_ids):
+    """Отмечает изменение статей и списков статей (вызывать после фиксации транзакции)"""
+    now = time.time_ns()
+    cache.set_many({_article_key(article_id): now for article_id in article_ids}, timeout=None)
+    cache.set(_CONTENT_STAMP_KEY, now, timeout=None)
+
+
+def stamps_shared():
+    """
+    Видны ли отметки изменений всем процессам. CONDITIONAL_LIST_PAGES = True/False
+    задает это явно (например, True для одного процесса с LocMemCache),
+    None - по типу кэша по умолчанию.
+    """
+    configured = getattr(settings, 'CONDITIONAL_LIST_PAGES', None)
+    if configured is not None:
+        return configured
+    return settings.CACHES['default']['BACKEND'] not in _PROCESS_LOCAL_CACHES
+
+
+def _stamp_time(stamp):
+    return datetime.datetime.fromtimestamp(stamp / 1e9, tz=datetime.timezone.utc)
+
+
+def page_validators(request, parts, modified=(), stamps=()):
+    """
+    (ETag, Last-Modified) страницы.
+    parts - данные, от которых зависит страница; modified - даты изменения
+    показываемых объектов; stamps - отметки изменений из кэша.
+    В ETag также входят пользователь и CSRF-cookie, так как разметка от них зависит.
+    """
+    stamps = list(stamps) + [get_sidebar_generation()]
+    # Формы (комментарии, выход) выводятся только вошедшим пользователям: для них
+    # cookie создается заранее, чтобы ETag первого ответа совпал с ETag следующего
+    # запроса с этой cookie. Анонимным ответам cookie не нужна
+    if request.user.is_authenticated:
+        get_token(request)
+    signature = repr([
+        PAGE_VALIDATOR_VERSION,
+        request.user.pk,
+        request.META.get('CSRF_COOKIE'),
+        list(parts),
+        stamps,
+    ])
+    # Слабый ETag: страница с тем же содержимым отличается маскированием CSRF-токена
+    etag = f'W/"{hashlib.md5(signature.encode("utf-8")).hexdigest()}"'
+    last_modified = max(
+        [value for value in modified if value is not None] + [_stamp_time(stamp) for stamp in stamps]
+    )
+    return etag, last_modified
+
+
+def conditional_response(request, etag, last_modified):
+    """
+    Ответ 304, если у клиента актуальная копия, иначе None.
+    Страница с непоказанными сообщениями всегда строится заново.
+    """
+    if request.method not in ('GET', 'HEAD') or len(get_messages(request)):
+        return None
+    response = get_conditional_response(request, etag=etag, last_modified=int(last_modified.timestamp()))
+    if response is not None:
+        set_validators(request, response, etag, last_modified)
+    return response
+
+
+def set_validators(request, response, etag, last_modified):
+    if response.status_code not in (200, 304) or len(get_messages(request)):
+        return response
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified.timestamp())
+    # Копию можно хранить, но перед использованием нужно подтвердить у сервера
+    if request.user.is_authenticated:
+        patch_cache_control(response, no_cache=True, private=True)
+    else:
+        patch_cache_control(response, no_cache=True)
+    return response
+
+
+class ConditionalPageMixin:
+    """
+    Условные GET для ListView: get_page_validators() вычисляется до выборки
+    статей и построения контекста. Списки зависят только от общей отметки
+    изменений, поэтому валидаторы включаются, лишь когда кэш общий для
+    процессов (см. stamps_shared): иначе процесс, не видевший изменения,
+    отвечал бы 304 с устаревшим списком.
+    """
+
+    def get_page_validators(self):
+        return page_validators(
+            self.request,
+            [self.request.get_full_path()],
+            stamps=[get_content_stamp()]
+        )
+
+    def get(self, request, *args, **kwargs):
+        if not stamps_shared():
+            return super().get(request, *args, **kwargs)
+        etag, last_modified = self.get_page_validators()
+        response = conditional_response(request, etag, last_modified)
+        if response is not None:
+            return response
+        return set_validators(request, super().get(request, *args, **kwargs), etag, last_modified)
@@ -0,0 +1,15 @@
+from django.utils.functional import SimpleLazyObject
+
+from .sidebar import get_sidebar_data
+
+
+def sidebar(request):
+    """
+    Категории и популярные теги для боковой панели.
+    Объекты ленивые: кэш читается, только если шаблон их использует.
+    """
+    data = SimpleLazyObject(get_sidebar_data)
+    return {
+        'categories': SimpleLazyObject(lambda: data['categories']),
+        'popular_tags': SimpleLazyObject(lambda: data['popular_tags']),
+    }
@@ -0,0 +1,93 @@
+from django.db.models import Count, F
+
+from .models import Article, Comment, Rating, Favorite
+from .author_stats import adjust_article_author, recount_author_stats
+
+
+# Поле счетчика на Article для каждого типа оценки
+RATING_COUNTER_FIELDS = {
+    'like': 'likes_count',
+    'dislike': 'dislikes_count',
+}
+
+COUNTER_FIELDS = ['likes_count', 'dislikes_count', 'comments_count', 'favorites_count']
+
+
+def adjust_counter(article_id, field, delta):
+    """Атомарно изменяет счетчик статьи (в рамках текущей транзакции)"""
+    if delta:
+        Article.objects.filter(pk=article_id).update(**{field: F(field) + delta})
+        adjust_article_author(article_id, field, delta)
+
+
+def compute_counters(article_ids):
+    """Фактические значения счетчиков: {id: {поле: значение}}"""
+    counters = {
+        article_id: dict.fromkeys(COUNTER_FIELDS, 0) for article_id in article_ids
+    }
+
+    ratings = Rating.objects.filter(article_id__in=article_ids).values(
+        'article_id', 'rating_type'
+    ).annotate(total=Count('id'))
+    for row in ratings:
+        field = RATING_COUNTER_FIELDS.get(row['rating_type'])
+        if field:
+            counters[row['article_id']][field] = row['total']
+
+    comments = Comment.objects.filter(
+        article_id__in=article_ids, is_approved=True, is_deleted=False
+    ).values('article_id').annotate(total=Count('id'))
+    for row in comments:
+        counters[row['article_id']]['comments_count'] = row['total']
+
+    favorites = Favorite.objects.filter(article_id__in=article_ids).values(
+        'article_id'
+    ).annotate(total=Count('id'))
+    for row in favorites:
+        counters[row['article_id']]['favorites_count'] = row['total']
+
+    return counters
+
+
+def recount_counters(article_ids):
+    """Пересчитывает счетчики статей, возвращает количество исправленных статей"""
+    article_ids = list(article_ids)
+    if not article_ids:
+        return 0
+
+    actual = compute_counters(article_ids)
+    changed = []
+    for article in Article.objects.filter(pk__in=article_ids).only('id', 'author_id', *COUNTER_FIELDS):
+        values = actual[article.id]
+        if any(getattr(article, field) != values[field] for field in COUNTER_FIELDS):
+            for field in COUNTER_FIELDS:
+                setattr(article, field, values[field])
+            changed.append(article)
+
+    if changed:
+        Article.objects.bulk_update(changed, COUNTER_FIELDS)
+        recount_author_stats({article.author_id for article in changed})
+    return len(changed)
+
+
+def reconcile_all(batch_size=500):
+    """Сверяет счетчики всех статей пакетами, возвращает (проверено, исправлено)"""
+    checked = fixed = 0
+    last_id = 0
+    while True:
+        ids = list(
+            Article.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+        fixed += recount_counters(ids)
+        checked += len(ids)
+        last_id = ids[-1]
+    return checked, fixed
+
+
+def deleted_with_article(origin):
+    """Удаление вызвано удалением самой статьи - счетчики обновлять незачем"""
+    if isinstance(origin, Article):
+        return True
+    return getattr(origin, 'model', None) is Article
@@ -0,0 +1,331 @@
+import bisect
+import re
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.html import escape
+
+
+# Версии неизменяемы, поэтому посчитанное сравнение действительно всегда.
+# Номер движка входит в ключ кэша: при изменении алгоритма или разметки
+# увеличьте его, и старые записи перестанут использоваться.
+DIFF_ENGINE_VERSION = 1
+DIFF_CACHE = getattr(settings, 'DIFF_CACHE', 'default')
+DIFF_CONTEXT_LINES = 3
+
+# Предел стоимости поиска в одном фрагменте: при почти полностью
+# переписанном тексте фрагмент показывается целиком как замена
+DIFF_MAX_EDIT_COST = 1000
+
+_TOKEN_RE = re.compile(r'\w+|\s+|[^\w\s]', re.UNICODE)
+
+
+def _intern(old, new):
+    """Заменяет элементы обеих последовательностей целыми числами (быстрое сравнение)"""
+    ids = {}
+    old_ids = [ids.setdefault(item, len(ids)) for item in old]
+    new_ids = [ids.setdefault(item, len(ids)) for item in new]
+    return old_ids, new_ids
+
+
+def _middle_snake(a, b, alo, ahi, blo, bhi):
+    """
+    Точка разбиения кратчайшего пути редактирования (алгоритм Майерса,
+    встречный поиск с двух концов). Память - O(N + M).
+    Возвращает (x, y) относительно (alo, blo) или None, если общих элементов нет.
+    """
+    n = ahi - alo
+    m = bhi - blo
+    max_d = (n + m + 1) // 2
+    offset = max_d
+    size = 2 * max_d + 2
+    steps = min(max_d, DIFF_MAX_EDIT_COST)
+    v1 = [-1] * size
+    v2 = [-1] * size
+    v1[offset + 1] = 0
+    v2[offset + 1] = 0
+    delta = n - m
+    front = delta % 2 != 0
+    k1start = k1end = k2start = k2end = 0
+
+    for d in range(steps):
+        # Прямой проход
+        for k1 in range(-d + k1start, d + 1 - k1end, 2):
+            k1_offset = offset + k1
+            if k1 == -d or (k1 != d and v1[k1_offset - 1] < v1[k1_offset + 1]):
+                x1 = v1[k1_offset + 1]
+            else:
+                x1 = v1[k1_offset - 1] + 1
+            y1 = x1 - k1
+            while x1 < n and y1 < m and a[alo + x1] == b[blo + y1]:
+                x1 += 1
+                y1 += 1
+            v1[k1_offset] = x1
+            if x1 > n:
+                k1end += 2
+            elif y1 > m:
+                k1start += 2
+            elif front:
+                k2_offset = offset + delta - k1
+                if 0 <= k2_offset < size and v2[k2_offset] != -1:
+                    if x1 >= n - v2[k2_offset]:
+                        return x1, y1
+
+        # Обратный проход
+        for k2 in range(-d + k2start, d + 1 - k2end, 2):
+            k2_offset = offset + k2
+            if k2 == -d or (k2 != d and v2[k2_offset - 1] < v2[k2_offset + 1]):
+                x2 = v2[k2_offset + 1]
+            else:
+                x2 = v2[k2_offset - 1] + 1
+            y2 = x2 - k2
+            while x2 < n and y2 < m and a[ahi - x2 - 1] == b[bhi - y2 - 1]:
+                x2 += 1
+                y2 += 1
+            v2[k2_offset] = x2
+            if x2 > n:
+                k2end += 2
+            elif y2 > m:
+                k2start += 2
+            elif not front:
+                k1_offset = offset + delta - k2
+                if 0 <= k1_offset < size and v1[k1_offset] != -1:
+                    x1 = v1[k1_offset]
+                    y1 = offset + x1 - k1_offset
+                    if x1 >= n - x2:
+                        return x1, y1
+
+    return None
+
+
+def _unique_anchors(a, b):
+    """
+    Опорные пары patience diff: элементы, встречающиеся ровно один раз
+    в обеих последовательностях, в наибольшей общей возрастающей цепочке.
+    """
+    counts_a = {}
+    for item in a:
+        counts_a[item] = counts_a.get(item, 0) + 1
+    counts_b = {}
+    for item in b:
+        counts_b[item] = counts_b.get(item, 0) + 1
+    positions = {
+        item: j for j, item in enumerate(b)
+        if counts_b[item] == 1 and counts_a.get(item) == 1
+    }
+    candidates = [(i, positions[item]) for i, item in enumerate(a) if item in positions]
+
+    # Наибольшая возрастающая по j подпоследовательность (сортировка стопками)
+    tops = []
+    top_values = []
+    links = []
+    for index, (i, j) in enumerate(candidates):
+        pile = bisect.bisect_left(top_values, j)
+        links.append(tops[pile - 1] if pile else None)
+        if pile == len(tops):
+            tops.append(index)
+            top_values.append(j)
+        else:
+            tops[pile] = index
+            top_values[pile] = j
+
+    anchors = []
+    index = tops[-1] if tops else None
+    while index is not None:
+        anchors.append(candidates[index])
+        index = links[index]
+    anchors.reverse()
+    return anchors
+
+
+def _myers_pairs(a, b, alo, ahi, blo, bhi, pairs):
+    """Дописывает в pairs совпадающие пары фрагмента a[alo:ahi] / b[blo:bhi]"""
+    # Явный стек вместо рекурсии: (alo, ahi, blo, bhi, отложенный хвост)
+    stack = [(alo, ahi, blo, bhi, None)]
+    while stack:
+        alo, ahi, blo, bhi, tail = stack.pop()
+        if tail is not None:
+            pairs.extend(tail)
+            continue
+
+        # Общие начало и конец не участвуют в поиске
+        while alo < ahi and blo < bhi and a[alo] == b[blo]:
+            pairs.append((alo, blo))
+            alo += 1
+            blo += 1
+        suffix = []
+        while alo < ahi and blo < bhi and a[ahi - 1] == b[bhi - 1]:
+            ahi -= 1
+            bhi -= 1
+            suffix.append((ahi, bhi))
+        suffix.reverse()
+
+        split = None
+        if alo < ahi and blo < bhi and not set(a[alo:ahi]).isdisjoint(b[blo:bhi]):
+            split = _middle_snake(a, b, alo, ahi, blo, bhi)
+            if split in ((0, 0), (ahi - alo, bhi - blo)):
+                split = None
+
+        if split is None:
+            pairs.extend(suffix)
+            continue
+
+        x, y = split
+        # Порядок обработки: левая часть, правая часть, затем общий хвост
+        stack.append((0, 0, 0, 0, suffix))
+        stack.append((alo + x, ahi, blo + y, bhi, None))
+        stack.append((alo, alo + x, blo, blo + y, None))
+
+
+def _matching_pairs(a, b):
+    """Пары индексов совпадающих элементов (i, j) в порядке возрастания"""
+    pairs = []
+    i = j = 0
+    for anchor_i, anchor_j in _unique_anchors(a, b) + [(len(a), len(b))]:
+        _myers_pairs(a, b, i, anchor_i, j, anchor_j, pairs)
+        if anchor_i < len(a):
+            pairs.append((anchor_i, anchor_j))
+        i, j = anchor_i + 1, anchor_j + 1
+    return pairs
+
+
+def diff_opcodes(old, new):
+    """
+    Операции преобразования old в new в формате SequenceMatcher.get_opcodes():
+    (тег, i1, i2, j1, j2), тег - 'equal', 'replace', 'delete' или 'insert'.
+    """
+    a, b = _intern(old, new)
+    opcodes = []
+    i = j = 0
+    for mi, mj in _matching_pairs(a, b) + [(len(a), len(b))]:
+        if i < mi or j < mj:
+            if i < mi and j < mj:
+                tag = 'replace'
+            elif i < mi:
+                tag = 'delete'
+            else:
+                tag = 'insert'
+            opcodes.append((tag, i, mi, j, mj))
+        if mi < len(a):
+            if opcodes and opcodes[-1][0] == 'equal':
+                opcodes[-1] = ('equal', opcodes[-1][1], mi + 1, opcodes[-1][3], mj + 1)
+            else:
+                opcodes.append(('equal', mi, mi + 1, mj, mj + 1))
+        i, j = mi + 1, mj + 1
+    return opcodes
+
+
+def highlight_words(old_line, new_line):
+    """Экранированные строки с выделением измененных слов"""
+    old_tokens = _TOKEN_RE.findall(old_line)
+    new_tokens = _TOKEN_RE.findall(new_line)
+    old_parts = []
+    new_parts = []
+    for tag, i1, i2, j1, j2 in diff_opcodes(old_tokens, new_tokens):
+        old_text = escape(''.join(old_tokens[i1:i2]))
+        new_text = escape(''.join(new_tokens[j1:j2]))
+        if tag == 'equal':
+            old_parts.append(old_text)
+            new_parts.append(new_text)
+            continue
+        if old_text:
+            old_parts.append(f'<del class="diff-word">{old_text}</del>')
+        if new_text:
+            new_parts.append(f'<ins class="diff-word">{new_text}</ins>')
+    return ''.join(old_parts), ''.join(new_parts)
+
+
+def _row(css_class, old_number, old_html, new_number, new_html):
+    return (
+        f'<tr class="{css_class}">'
+        f'<td class="diff-num">{old_number}</td><td class="diff-old">{old_html}</td>'
+        f'<td class="diff-num">{new_number}</td><td class="diff-new">{new_html}</td>'
+        '</tr>'
+    )
+
+
+def _group_opcodes(opcodes, context):
+    """Группы изменений с context строками окружения (как в unified diff)"""
+    if not opcodes:
+        return []
+    opcodes = list(opcodes)
+    tag, i1, i2, j1, j2 = opcodes[0]
+    if tag == 'equal':
+        opcodes[0] = (tag, max(i1, i2 - context), i2, max(j1, j2 - context), j2)
+    tag, i1, i2, j1, j2 = opcodes[-1]
+    if tag == 'equal':
+        opcodes[-1] = (tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context))
+
+    groups = []
+    group = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == 'equal' and i2 - i1 > context * 2:
+            group.append((tag, i1, i1 + context, j1, j1 + context))
+            groups.append(group)
+            group = []
+            i1, j1 = i2 - context, j2 - context
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == 'equal'):
+        groups.append(group)
+    return groups
+
+
+def render_diff_table(old_lines, new_lines, context=DIFF_CONTEXT_LINES,
+                      fromdesc='', todesc=''):
+    """
+    HTML-таблица сравнения в две колонки с подсветкой измененных слов.
+    Возвращает пустую строку, если различий нет.
+    """
+    opcodes = diff_opcodes(old_lines, new_lines)
+    if all(tag == 'equal' for tag, *_ in opcodes):
+        return ''
+
+    rows = []
+    for index, group in enumerate(_group_opcodes(opcodes, context)):
+        if index or group[0][1] > 0:
+            rows.append('<tr class="diff-skip"><td colspan="4">⋯</td></tr>')
+        for tag, i1, i2, j1, j2 in group:
+            if tag == 'equal':
+                for i, j in zip(range(i1, i2), range(j1, j2)):
+                    line = escape(old_lines[i])
+                    rows.append(_row('diff-equal', i + 1, line, j + 1, line))
+                continue
+
+            # Замененные строки сопоставляем попарно и подсвечиваем слова,
+            # остаток показываем как удаление или добавление
+            paired = min(i2 - i1, j2 - j1) if tag == 'replace' else 0
+            for offset in range(paired):
+                old_html, new_html = highlight_words(old_lines[i1 + offset], new_lines[j1 + offset])
+                rows.append(_row('diff-change', i1 + offset + 1, old_html, j1 + offset + 1, new_html))
+            for i in range(i1 + paired, i2):
+                rows.append(_row('diff-delete', i + 1, escape(old_lines[i]), '', ''))
+            for j in range(j1 + paired, j2):
+                rows.append(_row('diff-insert', '', '', j + 1, escape(new_lines[j])))
+
+    header = (
+        '<thead><tr>'
+        f'<th colspan="2">{escape(fromdesc)}</th><th colspan="2">{escape(todesc)}</th>'
+        '</tr></thead>'
+    )
+    return f'<table class="diff">{header}<tbody>{"".join(rows)}</tbody></table>'
+
+
+def _cache_key(version1_id, version2_id, context):
+    return f'diff:v{DIFF_ENGINE_VERSION}:{version1_id}:{version2_id}:{context}'
+
+
+def get_versions_diff(version1, version2, context=DIFF_CONTEXT_LINES):
+    """Сравнение двух версий из кэша; при промахе считается и сохраняется бессрочно"""
+    cache = caches[DIFF_CACHE]
+    key = _cache_key(version1.pk, version2.pk, context)
+    diff_html = cache.get(key)
+    if diff_html is None:
+        diff_html = render_diff_table(
+            version1.content.splitlines(),
+            version2.content.splitlines(),
+            context=context,
+            fromdesc=f'Версия v{version1.version_number}',
+            todesc=f'Версия v{version2.version_number}',
+        )
+        cache.set(key, diff_html, timeout=None)
+    return diff_html
@@ -0,0 +1,132 @@
+import tempfile
+import zipfile
+from datetime import datetime
+
+from django.db.models import Prefetch
+from django.utils import timezone
+from django.utils.html import escape
+
+from .export_utils import ArticleExporter
+from .models import Article, Category, RenderedVersion
+from .rendering import get_renderer_key
+
+
+# Архив базы знаний собирается потоком: статьи читаются из базы порциями
+# по EXPORT_CHUNK_SIZE, каждая запись ZIP отдается клиенту сразу после сжатия.
+# В памяти одновременно находятся одна порция статей и одна сжатая запись.
+EXPORT_CHUNK_SIZE = 200
+
+ARCHIVE_FORMATS = {
+    'html': ('html', ArticleExporter.render_html),
+    'txt': ('txt', ArticleExporter.render_text),
+}
+
+# Оглавление копится во временном файле, в памяти - не больше этого размера
+_INDEX_SPOOL_SIZE = 1024 * 1024
+
+
+class _ZipStream:
+    """Файловый объект без seek: ZipFile пишет в него, генератор забирает байты"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def archive_queryset(category=None, statuses=('published',)):
+    """Статьи с текущей версией для архива (категория - вместе с подкатегориями)"""
+    articles = Article.objects.filter(current_version__isnull=False)
+    if statuses:
+        articles = articles.filter(status__in=statuses)
+    if category is not None:
+        articles = articles.filter(
+            category__tree_id=category.tree_id,
+            category__lft__gte=category.lft,
+            category__rght__lte=category.rght
+        )
+    return articles.select_related('author', 'category', 'current_version').prefetch_related(
+        'tags',
+        Prefetch(
+            'current_version__rendered',
+            queryset=RenderedVersion.objects.filter(renderer_key=get_renderer_key()),
+            to_attr='current_html'
+        )
+    ).order_by('id')
+
+
+def _category_paths():
+    """{id категории: 'родитель/дочерняя'} из slug, одним запросом"""
+    nodes = {pk: (parent_id, slug) for pk, parent_id, slug in Category.objects.values_list('id', 'parent_id', 'slug')}
+    paths = {}
+
+    def path(pk):
+        if pk not in paths:
+            parent_id, slug = nodes[pk]
+            paths[pk] = f'{path(parent_id)}/{slug}' if parent_id else slug
+        return paths[pk]
+
+    for pk in nodes:
+        path(pk)
+    return paths
+
+
+def _zip_info(name, moment):
+    moment = timezone.localtime(moment) if timezone.is_aware(moment) else moment
+    info = zipfile.ZipInfo(name, date_time=moment.timetuple()[:6])
+    info.compress_type = zipfile.ZIP_DEFLATED
+    return info
+
+
+def iter_archive(articles, format_type='html', request=None, root='knowledge-base', chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Генератор байтов ZIP-архива: файл статьи в каталоге ее категории
+    и оглавление index.html со ссылками на все файлы.
+    """
+    extension, render = ARCHIVE_FORMATS[format_type]
+    paths = _category_paths()
+    stream = _ZipStream()
+    index = tempfile.SpooledTemporaryFile(max_size=_INDEX_SPOOL_SIZE, mode='w+', encoding='utf-8')
+    total = 0
+
+    with index, zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_DEFLATED, allowZip64=True) as archive:
+        for article in articles.iterator(chunk_size=chunk_size):
+            version = article.current_version
+            rendered = getattr(version, 'current_html', None)
+            exporter = ArticleExporter(article, request, html_content=rendered[0].html if rendered else None)
+
+            name = f'{paths[article.category_id]}/{article.slug}.{extension}'
+            archive.writestr(_zip_info(f'{root}/{name}', article.updated_at), render(exporter).encode('utf-8'))
+            index.write(
+                f'<tr><td><a href="{escape(name)}">{escape(article.title)}</a></td>'
+                f'<td>{escape(article.category.name)}</td><td>{escape(article.author.username)}</td>'
+                f'<td>v{version.version_number}</td><td>{timezone.localtime(article.updated_at):%d.%m.%Y}</td></tr>\n'
+            )
+            total += 1
+            yield stream.pop()
+
+        with archive.open(_zip_info(f'{root}/index.html', datetime.now()), 'w') as entry:
+            entry.write(
+                '<!DOCTYPE html>\n<html lang="ru">\n<head><meta charset="utf-8">'
+                '<title>База знаний - оглавление</title></head>\n<body>\n'
+                f'<h1>База знаний</h1>\n<p>Статей: {total}. Экспортировано {datetime.now():%d.%m.%Y %H:%M}</p>\n'
+                '<table>\n<tr><th>Статья</th><th>Категория</th><th>Автор</th><th>Версия</th><th>Обновлена</th></tr>\n'
+                .encode('utf-8')
+            )
+            index.seek(0)
+            for number, line in enumerate(index, 1):
+                entry.write(line.encode('utf-8'))
+                if number % chunk_size == 0:
+                    yield stream.pop()
+            entry.write(b'</table>\n</body>\n</html>\n')
+    yield stream.pop()
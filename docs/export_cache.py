@@ -0,0 +1,165 @@
+import hashlib
+import os
+import tempfile
+import time
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponseNotModified
+from django.template.loader import get_template
+from django.utils.http import http_date, parse_etags
+
+from .export_utils import ArticleExporter
+from .rendering import get_renderer_key
+
+
+# Готовые файлы экспорта на диске. Имя файла - хэш всего, от чего зависит
+# результат: версии, формата, исходника шаблона, конфигурации Markdown
+# и показываемых метаданных статьи. Время последнего скачивания
+# хранится в atime файла: при превышении EXPORT_CACHE_MAX_SIZE первыми
+# удаляются давно не скачивавшиеся файлы.
+EXPORT_CACHE_FORMATS = {
+    'html': ('docs/export/article_html.html', ArticleExporter.render_html, 'text/html; charset=utf-8'),
+    'txt': ('docs/export/article_text.txt', ArticleExporter.render_text, 'text/plain; charset=utf-8'),
+}
+
+_template_hashes = {}
+
+
+def get_cache_dir():
+    return getattr(settings, 'EXPORT_CACHE_DIR', os.path.join(settings.BASE_DIR, 'export_cache'))
+
+
+def get_max_size():
+    return getattr(settings, 'EXPORT_CACHE_MAX_SIZE', 256 * 1024 * 1024)
+
+
+def get_template_hash(template_name):
+    """Хэш исходника шаблона и конфигурации Markdown (вычисляется один раз за процесс)"""
+    if template_name not in _template_hashes:
+        source = get_template(template_name).template.source + get_renderer_key()
+        _template_hashes[template_name] = hashlib.sha1(source.encode('utf-8')).hexdigest()
+    return _template_hashes[template_name]
+
+
+def export_key(article, format_type, request=None, template_name=None):
+    """
+    Ключ файла экспорта. Счетчик просмотров в ключ не входит:
+    файл показывает его на момент создания. template_name - шаблон
+    формата, которого нет в EXPORT_CACHE_FORMATS (PDF).
+    """
+    parts = [
+        article.current_version_id,
+        format_type,
+        get_template_hash(template_name or EXPORT_CACHE_FORMATS[format_type][0]),
+        article.title,
+        article.slug,
+        article.author.username,
+        article.category.name,
+        article.updated_at.isoformat(),
+        sorted(article.tags.values_list('name', flat=True)),
+        request.get_host() if request is not None else '',
+    ]
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+
+class ExportFile:
+    """Файл экспорта в кэше: путь, размер и валидаторы для условных запросов"""
+
+    def __init__(self, path, content_type):
+        self.path = path
+        self.content_type = content_type
+        stat = os.stat(path)
+        self.size = stat.st_size
+        self.modified = stat.st_mtime
+        # Файл с тем же ключом может быть создан заново (после вытеснения),
+        # поэтому в ETag входит и время его создания
+        name = os.path.splitext(os.path.basename(path))[0]
+        self.etag = f'"{name[:32]}-{stat.st_mtime_ns:x}"'
+
+    def is_not_modified(self, request):
+        etags = parse_etags(request.headers.get('If-None-Match', ''))
+        return '*' in etags or self.etag in etags
+
+    def response(self, request, filename):
+        """FileResponse с Content-Length и ETag или 304, если у клиента актуальная копия"""
+        if self.is_not_modified(request):
+            response = HttpResponseNotModified()
+        else:
+            response = FileResponse(
+                open(self.path, 'rb'),
+                content_type=self.content_type,
+                as_attachment=True,
+                filename=filename
+            )
+        response['ETag'] = self.etag
+        response['Last-Modified'] = http_date(self.modified)
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+
+def touch_file(path):
+    """Отмечает скачивание: atime - время последнего использования, mtime не меняется"""
+    try:
+        os.utime(path, ns=(time.time_ns(), os.stat(path).st_mtime_ns))
+    except OSError:
+        pass
+
+
+def get_export_file(article, format_type, request=None):
+    """Файл экспорта текущей версии статьи; при отсутствии рендерит и сохраняет его"""
+    template_name, render, content_type = EXPORT_CACHE_FORMATS[format_type]
+    directory = get_cache_dir()
+    path = os.path.join(directory, f'{export_key(article, format_type, request)}.{format_type}')
+
+    if os.path.exists(path):
+        touch_file(path)
+        return ExportFile(path, content_type)
+
+    content = render(ArticleExporter(article, request)).encode('utf-8')
+    os.makedirs(directory, exist_ok=True)
+    # Запись через временный файл: параллельный запрос не увидит недописанный файл
+    descriptor, temporary = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(descriptor, 'wb') as stream:
+        stream.write(content)
+    os.replace(temporary, path)
+
+    prune_export_cache()
+    return ExportFile(path, content_type)
+
+
+def prune_export_cache(max_size=None):
+    """Удаляет давно не скачивавшиеся файлы, пока кэш больше max_size. Возвращает число удаленных"""
+    max_size = get_max_size() if max_size is None else max_size
+    directory = get_cache_dir()
+    try:
+        # Недописанные файлы (*.tmp) пишутся прямо сейчас - их не трогаем
+        entries = [
+            entry for entry in os.scandir(directory)
+            if entry.is_file() and not entry.name.endswith('.tmp')
+        ]
+    except FileNotFoundError:
+        return 0
+
+    files = []
+    total = 0
+    for entry in entries:
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        files.append((stat.st_atime_ns, stat.st_size, entry.path))
+        total += stat.st_size
+    if total <= max_size:
+        return 0
+
+    removed = 0
+    for _, size, path in sorted(files):
+        if total <= max_size:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+    return removed
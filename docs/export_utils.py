@@ -2,32 +2,25 @@ import os
 from datetime import datetime
 from django.template.loader import render_to_string
 from django.http import HttpResponse
-import markdown
-from markdown.extensions.fenced_code import FencedCodeExtension
-from markdown.extensions.codehilite import CodeHiliteExtension
+from .rendering import get_version_html
 
 
 class ArticleExporter:
     """Класс для экспорта статей в HTML и текстовые форматы"""
 
-    def __init__(self, article, request=None):
+    def __init__(self, article, request=None, html_content=None):
         self.article = article
         self.request = request
         self.version = article.current_version
+        # Готовый HTML версии, если он уже загружен (пакетный экспорт)
+        self.html_content = html_content
 
     def _prepare_context(self):
         """Подготавливает контекст для шаблонов"""
-        # Конвертируем Markdown в HTML
-        extensions = [
-            FencedCodeExtension(),
-            CodeHiliteExtension(css_class='codehilite', linenums=False)
-        ]
-
-        html_content = markdown.markdown(
-            self.version.content,
-            extensions=extensions,
-            output_format='html5'
-        )
+        # Готовый HTML версии из хранилища
+        html_content = self.html_content
+        if html_content is None:
+            html_content = get_version_html(self.version)
 
         return {
             'article': self.article,
@@ -37,10 +30,17 @@ class ArticleExporter:
             'request': self.request,
         }
 
+    def render_html(self):
+        """HTML-документ статьи"""
+        return render_to_string('docs/export/article_html.html', self._prepare_context())
+
+    def render_text(self):
+        """Статья в виде простого текста"""
+        return render_to_string('docs/export/article_text.txt', self._prepare_context())
+
     def export_html(self):
         """Экспорт в HTML"""
-        context = self._prepare_context()
-        html_content = render_to_string('docs/export/article_html.html', context)
+        html_content = self.render_html()
 
         response = HttpResponse(html_content, content_type='text/html; charset=utf-8')
         filename = f'{self.article.slug}_{datetime.now().strftime("%Y%m%d_%H%M")}.html'
@@ -50,8 +50,7 @@ class ArticleExporter:
 
     def export_text(self):
         """Экспорт в простой текст"""
-        context = self._prepare_context()
-        text_content = render_to_string('docs/export/article_text.txt', context)
+        text_content = self.render_text()
 
         response = HttpResponse(text_content, content_type='text/plain; charset=utf-8')
         filename = f'{self.article.slug}_{datetime.now().strftime("%Y%m%d_%H%M")}.txt'
@@ -1,15 +1,26 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import HttpResponse
-from .models import Article
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from datetime import datetime
+from .models import Article, ArticleVersion, Category
 from .export_utils import ArticleExporter, create_export_record
+from .export_archive import ARCHIVE_FORMATS, archive_queryset, iter_archive
+from .export_cache import EXPORT_CACHE_FORMATS, get_export_file
+from .pdf_export import (
+    PDF_MISSING, get_pdf_error, get_pdf_file, get_pdf_status, pdf_export_available, request_pdf
+)
 
 
 @login_required
 def export_article(request, slug, format_type):
     """Экспорт статьи в указанном формате"""
-    article = get_object_or_404(Article, slug=slug)
+    article = get_object_or_404(
+        Article.objects.select_related('author', 'category', 'current_version'), slug=slug
+    )
+    if not article.is_accessible_by(request.user):
+        raise Http404('Статья не найдена')
 
     # Проверяем, что у статьи есть текущая версия
     if not article.current_version:
@@ -21,17 +32,29 @@ def export_article(request, slug, format_type):
 
     try:
         # Выбираем формат экспорта
-        if format_type == 'html':
-            response = exporter.export_html()
-            file_size = len(response.content)
+        if format_type in EXPORT_CACHE_FORMATS:
+            # HTML и TXT отдаются из файлового кэша, повторная загрузка - 304
+            export = get_export_file(article, format_type, request)
+            filename = f'{article.slug}_{datetime.now().strftime("%Y%m%d_%H%M")}.{format_type}'
+            response = export.response(request, filename)
+            if response.status_code == 304:
+                return response
+            file_size = export.size
 
         elif format_type == 'pdf':
-            response = exporter.export_pdf()
-            file_size = len(response.content)
-
-        elif format_type == 'txt':
-            response = exporter.export_text()
-            file_size = len(response.content)
+            # PDF рендерится в пуле процессов, запрос только ставит задание
+            if not pdf_export_available():
+                messages.error(request, 'PDF-экспорт недоступен: не установлен пакет weasyprint.')
+                return redirect('docs:export_options', slug=slug)
+            export = get_pdf_file(article, request)
+            if export is None:
+                request_pdf(article, request)
+                return redirect('docs:export_pdf_status', slug=slug, version_id=article.current_version_id)
+            filename = f'{article.slug}_v{article.current_version.version_number}.pdf'
+            response = export.response(request, filename)
+            if response.status_code == 304:
+                return response
+            file_size = export.size
 
         else:
             messages.error(request, 'Неподдерживаемый формат экспорта.')
@@ -52,6 +75,8 @@ def export_article(request, slug, format_type):
 def export_article_options(request, slug):
     """Страница выбора опций экспорта"""
     article = get_object_or_404(Article, slug=slug)
+    if not article.is_accessible_by(request.user):
+        raise Http404('Статья не найдена')
 
     if not article.current_version:
         messages.error(request, 'Нельзя экспортировать статью без содержимого.')
@@ -63,4 +88,62 @@ def export_article_options(request, slug):
     return render(request, 'docs/export/export_options.html', {
         'article': article,
         'export_history': export_history,
-    })
\ No newline at end of file
+        'pdf_available': pdf_export_available(),
+    })
+
+
+@login_required
+def export_pdf_status(request, slug, version_id):
+    """Страница ожидания PDF; ?format=json - состояние задания для опроса"""
+    article = get_object_or_404(
+        Article.objects.select_related('author', 'category', 'current_version'), slug=slug
+    )
+    if not article.is_accessible_by(request.user):
+        raise Http404('Статья не найдена')
+    version = get_object_or_404(ArticleVersion, pk=version_id, article=article)
+    # Статья уже обновлена - экспортируем текущую версию
+    if version.pk != article.current_version_id:
+        return redirect('docs:export_article', slug=slug, format_type='pdf')
+
+    status = get_pdf_status(article, request)
+    if status == PDF_MISSING:
+        # Файл вытеснен из кэша или изменились метаданные статьи
+        status = request_pdf(article, request)
+
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'status': status,
+            'download_url': reverse('docs:export_article', args=[slug, 'pdf']),
+        })
+
+    return render(request, 'docs/export/pdf_status.html', {
+        'article': article,
+        'version': version,
+        'status': status,
+        'error': get_pdf_error(article, request),
+    })
+
+
+@login_required
+def export_archive(request):
+    """
+    ZIP-архив опубликованных статей (?category= - раздел с подкатегориями,
+    ?format=html|txt). Архив отдается потоком по мере сборки.
+    """
+    format_type = request.GET.get('format', 'html')
+    if format_type not in ARCHIVE_FORMATS:
+        messages.error(request, 'Неподдерживаемый формат экспорта.')
+        return redirect('docs:article_list')
+
+    category = None
+    if request.GET.get('category'):
+        category = get_object_or_404(Category, slug=request.GET['category'])
+
+    name = category.slug if category else 'knowledge-base'
+    response = StreamingHttpResponse(
+        iter_archive(archive_queryset(category), format_type, request=request),
+        content_type='application/zip'
+    )
+    filename = f'{name}_{datetime.now().strftime("%Y%m%d_%H%M")}.zip'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,254 @@
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.utils import timezone
+from django.utils.functional import empty
+
+
+# Замеры запроса: количество и время SQL, рендеринг Markdown (отдельно -
+# подсветка кода Pygments), рендеринг шаблонов и общее время. Результат
+# отдается в заголовке Server-Timing, пишется строкой в лог docs.instrumentation
+# и сохраняется в кольцевом буфере процесса (страница в админке).
+#
+# При INSTRUMENTATION_ENABLED = False промежуточный слой исключается из цепочки,
+# обертки не устанавливаются, а timed() сводится к чтению ContextVar.
+# Интервалы вложены: время шаблонов включает ленивые SQL-запросы из шаблона,
+# время Markdown - подсветку кода.
+
+logger = logging.getLogger('docs.instrumentation')
+
+TIMINGS = ('sql', 'markdown', 'highlight', 'template')
+
+_current = ContextVar('docs_instrumentation', default=None)
+
+
+def instrumentation_enabled():
+    return getattr(settings, 'INSTRUMENTATION_ENABLED', False)
+
+
+class RequestMetrics:
+    """Замеры одного запроса (время - в секундах)"""
+
+    __slots__ = ('started', 'durations', 'counts', 'depth')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.durations = dict.fromkeys(TIMINGS, 0.0)
+        self.counts = dict.fromkeys(TIMINGS, 0)
+        # Глубина вложенных интервалов: учитывается только внешний
+        self.depth = dict.fromkeys(TIMINGS, 0)
+
+    def add(self, name, duration):
+        self.durations[name] += duration
+        self.counts[name] += 1
+
+
+def current_metrics():
+    """Замеры текущего запроса или None, если запрос не замеряется"""
+    return _current.get()
+
+
+@contextmanager
+def timed(name):
+    """Добавляет время блока к интервалу name текущего запроса"""
+    metrics = _current.get()
+    if metrics is None or metrics.depth[name]:
+        yield
+        return
+    metrics.depth[name] += 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.depth[name] -= 1
+        metrics.add(name, time.perf_counter() - started)
+
+
+def _timed_call(name, function):
+    def wrapper(*args, **kwargs):
+        with timed(name):
+            return function(*args, **kwargs)
+    wrapper.__wrapped__ = function
+    return wrapper
+
+
+_hooks_installed = False
+_hooks_lock = threading.Lock()
+
+
+def _install_hooks():
+    """
+    Обертки рендеринга шаблонов и подсветки кода. Устанавливаются один раз
+    при включенных замерах; вне замеряемого запроса они только читают ContextVar.
+    """
+    global _hooks_installed
+    with _hooks_lock:
+        if _hooks_installed:
+            return
+        from django.template.base import Template
+        from markdown.extensions import codehilite
+
+        Template.render = _timed_call('template', Template.render)
+        codehilite.highlight = _timed_call('highlight', codehilite.highlight)
+        # SQL замеряется во всех соединениях: асинхронные представления
+        # выполняют запросы в потоке sync_to_async, куда копируется ContextVar
+        connection_created.connect(_add_sql_wrapper)
+        for connection in connections.all(initialized_only=True):
+            _add_sql_wrapper(connection=connection)
+        _hooks_installed = True
+
+
+def _sql_wrapper(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.add('sql', time.perf_counter() - started)
+
+
+def _add_sql_wrapper(sender=None, connection=None, **kwargs):
+    # Обертка остается в соединении после переподключения - не добавляем повторно
+    if _sql_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_sql_wrapper)
+
+
+class RequestLog:
+    """Последние замеренные запросы процесса (кольцевой буфер)"""
+
+    def __init__(self, size):
+        self._records = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def append(self, record):
+        with self._lock:
+            self._records.append(record)
+
+    def records(self):
+        """Записи от новых к старым"""
+        with self._lock:
+            return list(reversed(self._records))
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+
+request_log = RequestLog(getattr(settings, 'INSTRUMENTATION_BUFFER_SIZE', 200))
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2)
+
+
+def _loaded_user_id(request):
+    """
+    Id пользователя, если представление его уже загрузило. Загрузка ради
+    записи добавила бы запросы сессии и пользователя, не попавшие в замер.
+    """
+    user = getattr(request, 'user', None)
+    user = getattr(user, '_wrapped', user)
+    if user is None or user is empty:
+        # Асинхронные представления загружают пользователя через request.auser()
+        user = getattr(request, '_acached_user', None)
+    if user is None or not user.is_authenticated:
+        return None
+    return user.pk
+
+
+def build_record(request, response, metrics, total):
+    match = getattr(request, 'resolver_match', None)
+    record = {
+        'time': timezone.now(),
+        'method': request.method,
+        'path': request.get_full_path(),
+        'view': match.view_name if match else '',
+        'status': response.status_code,
+        'user': _loaded_user_id(request),
+        'total_ms': _ms(total),
+        'sql_count': metrics.counts['sql'],
+    }
+    for name in TIMINGS:
+        record[f'{name}_ms'] = _ms(metrics.durations[name])
+    return record
+
+
+def server_timing(record):
+    """Значение заголовка Server-Timing"""
+    return ', '.join([
+        f'sql;dur={record["sql_ms"]};desc="SQL ({record["sql_count"]})"',
+        f'markdown;dur={record["markdown_ms"]};desc="Markdown"',
+        f'highlight;dur={record["highlight_ms"]};desc="Pygments"',
+        f'template;dur={record["template_ms"]};desc="Templates"',
+        f'total;dur={record["total_ms"]};desc="Total"',
+    ])
+
+
+def log_line(record):
+    """Строка лога: поля key=value в постоянном порядке"""
+    return ' '.join(
+        f'{key}={value}' for key, value in record.items() if key != 'time'
+    )
+
+
+class InstrumentationMiddleware:
+    """
+    Замеры запросов (включаются INSTRUMENTATION_ENABLED). Ставится первым
+    в MIDDLEWARE, чтобы общее время включало остальные промежуточные слои.
+    Работает и в синхронной, и в асинхронной цепочке (ASGI).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not instrumentation_enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        self.server_timing = getattr(settings, 'INSTRUMENTATION_SERVER_TIMING', True)
+        self.buffer = getattr(settings, 'INSTRUMENTATION_BUFFER_SIZE', 200) > 0
+        _install_hooks()
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    def finish(self, request, response, metrics):
+        # Потоковые ответы замеряются до начала передачи содержимого
+        record = build_record(request, response, metrics, time.perf_counter() - metrics.started)
+        if self.server_timing:
+            response['Server-Timing'] = server_timing(record)
+        logger.info(log_line(record), extra={'instrumentation': record})
+        if self.buffer:
+            request_log.append(record)
+        return response
@@ -0,0 +1,83 @@
+import json
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings, setup_databases, setup_test_environment, \
+    teardown_databases, teardown_test_environment
+
+from docs.benchmark import (
+    BENCHMARK_SCALES, BENCHMARKS, CorpusGenerator, build_report, compare_reports, run_benchmarks
+)
+from docs.view_counter import flush_view_counts
+
+
+class Command(BaseCommand):
+    help = ('Замеры страниц на синтетическом корпусе во временной тестовой базе: '
+            'p50/p95 времени, запросы к базе и пик памяти в JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', default='small', choices=sorted(BENCHMARK_SCALES),
+                            help='Размер корпуса')
+        parser.add_argument('--articles', type=int, help='Количество статей (вместо значения из --scale)')
+        parser.add_argument('--seed', type=int, default=1, help='Начальное значение генератора корпуса')
+        parser.add_argument('--iterations', type=int, default=20, help='Количество замеров каждой страницы')
+        parser.add_argument('--warmup', type=int, default=2, help='Запросы до начала замеров')
+        parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), help='Только указанные страницы')
+        parser.add_argument('--output', help='Файл для JSON-отчета (по умолчанию - вывод в консоль)')
+        parser.add_argument('--compare', help='Прежний JSON-отчет для сравнения')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare'], encoding='utf-8') as stream:
+                    baseline = json.load(stream)
+            except (OSError, ValueError) as e:
+                raise CommandError(f'Не удалось прочитать {options["compare"]}: {e}')
+
+        scale = dict(BENCHMARK_SCALES[options['scale']])
+        if options['articles']:
+            scale['articles'] = options['articles']
+
+        # Корпус создается в тестовой базе, рабочая база и кэш экспорта не затрагиваются
+        setup_test_environment()
+        databases = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+        try:
+            with tempfile.TemporaryDirectory() as export_dir, override_settings(EXPORT_CACHE_DIR=export_dir):
+                self.stderr.write(f'Создание корпуса ({options["scale"]}, seed={options["seed"]})...')
+                corpus = CorpusGenerator(seed=options['seed'], **scale).generate()
+                self.stderr.write(f'Корпус создан за {corpus["generated_in_s"]} с: {corpus["counts"]}')
+
+                results = run_benchmarks(
+                    corpus, names=options['only'], iterations=options['iterations'], warmup=options['warmup']
+                )
+                # Просмотры из буфера переносим, пока тестовая база существует
+                flush_view_counts()
+        finally:
+            teardown_databases(databases, verbosity=0)
+            teardown_test_environment()
+
+        report = build_report(corpus, results)
+        output = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as stream:
+                stream.write(output)
+            self.stderr.write(f'Отчет записан в {options["output"]}')
+        else:
+            self.stdout.write(output)
+
+        self.stderr.write(f'{"Страница":<20} {"p50, мс":>9} {"p95, мс":>9} {"запросов":>9} {"память, КБ":>11}')
+        for name, result in results.items():
+            self.stderr.write(
+                f'{name:<20} {result["p50_ms"]:>9} {result["p95_ms"]:>9} '
+                f'{result["queries"]:>9} {result["peak_memory_kb"]:>11}'
+            )
+
+        if baseline is not None:
+            self.stderr.write(f'\nСравнение с {options["compare"]} (ревизия {baseline.get("revision")}):')
+            for name, p50_before, p50, p95_before, p95, queries_before, queries in compare_reports(baseline, report):
+                change = (p50 - p50_before) / p50_before * 100 if p50_before else 0
+                self.stderr.write(
+                    f'{name:<20} p50 {p50_before} → {p50} ({change:+.0f}%), '
+                    f'p95 {p95_before} → {p95}, запросов {queries_before} → {queries}'
+                )
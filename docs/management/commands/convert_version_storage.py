@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from docs.models import Article, ArticleVersion
+from docs.version_storage import (
+    STORAGE_DELTA, STORAGE_FULL, content_cache, convert_article_versions,
+    get_snapshot_interval, get_storage_mode
+)
+
+
+class Command(BaseCommand):
+    help = 'Перекодирует содержимое версий статей в формат хранения из настроек (полный текст или дельты)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mode', choices=[STORAGE_FULL, STORAGE_DELTA],
+                            help='Формат хранения (по умолчанию ARTICLE_VERSION_STORAGE)')
+        parser.add_argument('--batch-size', type=int, default=200,
+                            help='Количество статей в одной транзакции')
+
+    def handle(self, *args, **options):
+        mode = options['mode'] or get_storage_mode()
+        interval = get_snapshot_interval()
+        batch_size = options['batch_size']
+
+        self.stdout.write(f'Формат хранения: {mode}, снимок каждые {interval} версий')
+
+        articles = changed = 0
+        last_id = 0
+        while True:
+            ids = list(
+                Article.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            with transaction.atomic():
+                for article_id in ids:
+                    changed += convert_article_versions(ArticleVersion, article_id, mode, interval)
+            articles += len(ids)
+            last_id = ids[-1]
+
+        content_cache.clear()
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано статей: {articles}, перекодировано версий: {changed}'
+        ))
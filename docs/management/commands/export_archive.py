@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from docs.export_archive import ARCHIVE_FORMATS, EXPORT_CHUNK_SIZE, archive_queryset, iter_archive
+from docs.models import Category
+
+
+class Command(BaseCommand):
+    help = 'Сохраняет статьи в ZIP-архив (HTML или TXT) с оглавлением, не загружая базу в память'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Путь к создаваемому ZIP-файлу')
+        parser.add_argument('--format', default='html', choices=sorted(ARCHIVE_FORMATS),
+                            help='Формат файлов статей')
+        parser.add_argument('--category', help='slug категории: экспорт раздела с подкатегориями')
+        parser.add_argument('--all-statuses', action='store_true',
+                            help='Включить черновики, приватные и архивные статьи (резервная копия)')
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE,
+                            help='Количество статей, загружаемых из базы за один запрос')
+
+    def handle(self, *args, **options):
+        category = None
+        if options['category']:
+            try:
+                category = Category.objects.get(slug=options['category'])
+            except Category.DoesNotExist:
+                raise CommandError(f'Категория {options["category"]} не найдена')
+
+        statuses = None if options['all_statuses'] else ('published',)
+        articles = archive_queryset(category, statuses)
+        total = articles.count()
+
+        size = 0
+        with open(options['output'], 'wb') as output:
+            for chunk in iter_archive(articles, options['format'], chunk_size=options['chunk_size']):
+                output.write(chunk)
+                size += len(chunk)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Экспортировано статей: {total} в {options["output"]} ({size // 1024} КБ)'
+        ))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+from docs.view_counter import buffer_is_process_local, flush_view_counts
+
+
+class Command(BaseCommand):
+    help = 'Переносит накопленные в буфере просмотры статей в базу данных'
+
+    def handle(self, *args, **options):
+        # Буфер в памяти процесса: команда увидела бы только свой пустой буфер
+        if buffer_is_process_local():
+            raise CommandError(
+                'Буфер просмотров (VIEW_COUNT_CACHE) хранится в памяти процессов сервера, '
+                'команде он не виден. Процессы сами переносят просмотры раз в VIEW_COUNT_FLUSH_INTERVAL '
+                'секунд и при остановке; для переноса командой настройте общий кэш (Redis, Memcached).'
+            )
+        total = flush_view_counts()
+        self.stdout.write(self.style.SUCCESS(f'Перенесено просмотров: {total}'))
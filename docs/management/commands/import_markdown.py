@@ -0,0 +1,50 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from docs.markdown_import import CheckpointMismatch, MarkdownImporter
+from docs.models import Article
+
+
+class Command(BaseCommand):
+    help = 'Импортирует Markdown-файлы из каталога, zip- или tar-архива (YAML-шапка: title, category, tags, status)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help='Каталог или архив с файлами .md')
+        parser.add_argument('--author', required=True, help='Имя пользователя - автора статей')
+        parser.add_argument('--status', default='draft',
+                            choices=[value for value, _ in Article.STATUS_CHOICES],
+                            help='Статус статей без status в шапке')
+        parser.add_argument('--category', default='Импорт',
+                            help='Путь категории ("Раздел/Подраздел") для файлов в корне источника')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Количество документов, записываемых за один пакет')
+        parser.add_argument('--checkpoint',
+                            help='Файл контрольной точки: при повторном запуске импорт продолжится с него')
+
+    def handle(self, *args, **options):
+        try:
+            author = User.objects.get(username=options['author'])
+        except User.DoesNotExist:
+            raise CommandError(f'Пользователь {options["author"]} не найден')
+
+        importer = MarkdownImporter(
+            author,
+            default_status=options['status'],
+            default_category=[name.strip() for name in options['category'].split('/') if name.strip()],
+            batch_size=options['batch_size']
+        )
+        try:
+            stats = importer.run(
+                options['source'],
+                checkpoint=options['checkpoint'],
+                progress=lambda processed: self.stdout.write(f'Обработано документов: {processed}')
+            )
+        except (CheckpointMismatch, ValueError) as e:
+            raise CommandError(str(e))
+
+        for error in importer.errors:
+            self.stdout.write(self.style.WARNING(f'Пропущен {error}'))
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано статей: {stats["articles"]}, категорий: {stats["categories"]}, '
+            f'тегов: {stats["tags"]}; пропущено ранее импортированных: {stats["skipped"]}, '
+            f'с ошибками: {len(importer.errors)}'
+        ))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from docs.related import rebuild_related
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает индекс похожих статей (веса терминов TF-IDF и списки соседей)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Количество статей, обрабатываемых за один проход'
+        )
+
+    def handle(self, *args, **options):
+        total = rebuild_related(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Обработано статей: {total}'))
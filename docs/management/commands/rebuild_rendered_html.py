@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from docs.models import ArticleVersion, RenderedVersion
+from docs.rendering import get_renderer_key, store_version_html
+
+
+class Command(BaseCommand):
+    help = 'Заполняет хранилище готового HTML версий для текущей конфигурации Markdown'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200,
+                            help='Размер пакета версий, загружаемых из базы')
+        parser.add_argument('--all', action='store_true',
+                            help='Перерендерить все версии, а не только отсутствующие')
+
+    def handle(self, *args, **options):
+        key = get_renderer_key()
+
+        # HTML, построенный прежними конфигурациями расширений
+        stale, _ = RenderedVersion.objects.exclude(renderer_key=key).delete()
+        self.stdout.write(f'Удалено устаревших записей: {stale}')
+
+        versions = ArticleVersion.objects.all()
+        if not options['all']:
+            versions = versions.exclude(rendered__renderer_key=key)
+
+        rendered = 0
+        for version in versions.order_by('pk').iterator(chunk_size=options['batch_size']):
+            store_version_html(version)
+            rendered += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Отрендерено версий: {rendered}'))
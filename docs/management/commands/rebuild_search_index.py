@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from docs.search import rebuild_index, search_index_available
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает полнотекстовый поисковый индекс статей'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Количество статей, индексируемых за один проход')
+
+    def handle(self, *args, **options):
+        if not search_index_available():
+            self.stdout.write(self.style.ERROR('Полнотекстовый индекс недоступен для этой базы данных'))
+            return
+
+        total = rebuild_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Проиндексировано статей: {total}'))
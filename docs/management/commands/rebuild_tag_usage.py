@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from docs.tag_usage import recount_usage
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает количество опубликованных статей по тегам (таблица TagUsage)'
+
+    def handle(self, *args, **options):
+        fixed = recount_usage()
+        self.stdout.write(self.style.SUCCESS(f'Исправлено записей: {fixed}'))
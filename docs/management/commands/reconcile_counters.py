@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from docs.author_stats import reconcile_author_stats
+from docs.counters import reconcile_all
+
+
+class Command(BaseCommand):
+    help = ('Сверяет денормализованные счетчики статей (оценки, комментарии, избранное) '
+            'и статистику авторов с фактическими данными')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Количество статей (авторов), проверяемых за один проход')
+
+    def handle(self, *args, **options):
+        checked, fixed = reconcile_all(batch_size=options['batch_size'])
+        self.stdout.write(f'Проверено статей: {checked}')
+        self.stdout.write(self.style.SUCCESS(f'Исправлено статей: {fixed}'))
+
+        # После счетчиков статей: статистика авторов складывается из них
+        checked, fixed = reconcile_author_stats(batch_size=options['batch_size'])
+        self.stdout.write(f'Проверено авторов: {checked}')
+        self.stdout.write(self.style.SUCCESS(f'Исправлено записей статистики: {fixed}'))
@@ -0,0 +1,419 @@
+import json
+import os
+import re
+import tarfile
+import uuid
+import zipfile
+from collections import Counter
+from itertools import islice
+
+import yaml
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from .models import Article, ArticleVersion, Category, RenderedVersion, Tag
+from .rendering import get_renderer_key, render_markdown
+from . import search
+
+
+# Импорт дерева Markdown-файлов: документы читаются генератором (каталог,
+# zip или tar), метаданные берутся из YAML-шапки, статьи, версии и связи
+# с тегами пишутся пакетами через bulk_create. После каждого пакета
+# в файл контрольной точки записывается номер последнего документа,
+# поэтому прерванный импорт продолжается с того же места.
+
+MARKDOWN_EXTENSIONS = ('.md', '.markdown')
+
+_FRONT_MATTER_RE = re.compile(r'\A---[ \t]*\r?\n(.*?)\r?\n(?:---|\.\.\.)[ \t]*(?:\r?\n|\Z)', re.S)
+_HEADING_RE = re.compile(r'^#[ \t]+(.+?)[ \t#]*$', re.M)
+
+_STATUSES = {value for value, _ in Article.STATUS_CHOICES}
+_TITLE_LENGTH = Article._meta.get_field('title').max_length
+_TAG_LENGTH = Tag._meta.get_field('name').max_length
+_CATEGORY_LENGTH = Category._meta.get_field('name').max_length
+
+
+class ImportDocumentError(Exception):
+    """Документ не может быть импортирован (ошибка шапки или кодировки)"""
+
+
+class CheckpointMismatch(Exception):
+    """Контрольная точка записана для другого источника или источник изменился"""
+
+
+class SourceDocument:
+    """Документ источника: путь внутри источника и ленивое чтение содержимого"""
+
+    def __init__(self, path, read):
+        self.path = path
+        self._read = read
+
+    def read(self):
+        data = self._read()
+        try:
+            return data.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            raise ImportDocumentError(f'{self.path}: файл не в кодировке UTF-8')
+
+
+def _is_markdown(name):
+    return name.lower().endswith(MARKDOWN_EXTENSIONS)
+
+
+def _read_file(path):
+    with open(path, 'rb') as stream:
+        return stream.read()
+
+
+def iter_source(source):
+    """
+    Документы каталога, zip- или tar-архива в детерминированном порядке.
+    Содержимое читается только при обращении, в памяти держится один файл.
+    """
+    if os.path.isdir(source):
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for name in sorted(files):
+                if _is_markdown(name):
+                    path = os.path.join(root, name)
+                    relative = os.path.relpath(path, source).replace(os.sep, '/')
+                    yield SourceDocument(relative, lambda path=path: _read_file(path))
+    elif zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as archive:
+            for info in sorted(archive.infolist(), key=lambda info: info.filename):
+                if not info.is_dir() and _is_markdown(info.filename):
+                    yield SourceDocument(info.filename, lambda info=info: archive.read(info))
+    elif tarfile.is_tarfile(source):
+        # Заголовки tar читаются по мере обхода - порядок совпадает с порядком в архиве
+        with tarfile.open(source, 'r:*') as archive:
+            for member in archive:
+                if member.isfile() and _is_markdown(member.name):
+                    yield SourceDocument(
+                        member.name.removeprefix('./'),
+                        lambda member=member: archive.extractfile(member).read()
+                    )
+    else:
+        raise ValueError(f'{source}: ожидается каталог, zip- или tar-архив')
+
+
+def parse_front_matter(text):
+    """Разделяет YAML-шапку (между строками ---) и текст. Возвращает (метаданные, текст)"""
+    match = _FRONT_MATTER_RE.match(text)
+    if not match:
+        return {}, text
+    try:
+        meta = yaml.safe_load(match.group(1)) or {}
+    except yaml.YAMLError as e:
+        raise ImportDocumentError(f'ошибка в YAML-шапке: {e}')
+    if not isinstance(meta, dict):
+        raise ImportDocumentError('YAML-шапка должна быть словарем')
+    return meta, text[match.end():]
+
+
+def _as_list(value, separator):
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = value.split(separator)
+    return [str(item).strip() for item in value if str(item).strip()]
+
+
+def parse_document(document, default_status, default_category):
+    """
+    Метаданные документа:
+    title - заголовок (по умолчанию первый заголовок # или имя файла),
+    category - путь "Раздел/Подраздел" или список (по умолчанию каталог файла),
+    tags - список или строка через запятую, status, excerpt (или description), slug.
+    """
+    meta, body = parse_front_matter(document.read())
+
+    title = str(meta.get('title') or '').strip()
+    if not title:
+        heading = _HEADING_RE.search(body)
+        title = heading.group(1).strip() if heading else os.path.splitext(os.path.basename(document.path))[0]
+
+    status = str(meta.get('status') or default_status)
+    if status not in _STATUSES:
+        raise ImportDocumentError(f'неизвестный статус "{status}"')
+
+    category = _as_list(meta.get('category'), '/') or document.path.split('/')[:-1] or default_category
+    return {
+        'title': title[:_TITLE_LENGTH],
+        'slug': str(meta.get('slug') or '').strip(),
+        'excerpt': str(meta.get('excerpt') or meta.get('description') or '').strip(),
+        'status': status,
+        'category': tuple(name[:_CATEGORY_LENGTH] for name in category),
+        'tags': list(dict.fromkeys(name[:_TAG_LENGTH] for name in _as_list(meta.get('tags'), ','))),
+        'content': body.strip('\n') + '\n',
+        'path': document.path,
+    }
+
+
+def _base_slug(text, fallback):
+    """slug из текста, для кириллицы - из fallback (обычно имени файла)"""
+    return slugify(text)[:40] or slugify(fallback)[:40] or uuid.uuid4().hex[:8]
+
+
+def _unique_slug(slug, taken):
+    """Добавляет к slug случайный суффикс, если он уже занят (как Article.save)"""
+    if slug in taken:
+        slug = f'{slug}-{uuid.uuid4().hex[:8]}'
+    taken.add(slug)
+    return slug
+
+
+class MarkdownImporter:
+    """
+    Пакетный импорт документов источника. Для каждого пакета выполняется
+    фиксированное число запросов: категории и теги создаются только новые,
+    статьи, версии, связи с тегами и готовый HTML - через bulk_create.
+    """
+
+    def __init__(self, author, default_status='draft', default_category=('Импорт',), batch_size=500):
+        self.author = author
+        self.default_status = default_status
+        self.default_category = list(default_category)
+        self.batch_size = batch_size
+        self.renderer_key = get_renderer_key()
+        self.errors = []
+        self.stats = Counter()
+        self.touched_tags = set()
+
+        # Дерево категорий невелико - держим соответствие (родитель, имя) -> id в памяти
+        self.categories = {
+            (parent_id, name): pk
+            for pk, parent_id, name in Category.objects.values_list('id', 'parent_id', 'name')
+        }
+        self.category_slugs = set(Category.objects.values_list('slug', flat=True))
+
+    # Категории и теги
+
+    def _resolve_categories(self, paths):
+        """Возвращает {путь: id категории}, недостающие узлы создаются с отложенным MPTT"""
+        missing = set()
+        for path in paths:
+            parent_id = None
+            for name in path:
+                parent_id = self.categories.get((parent_id, name))
+                if parent_id is None:
+                    missing.add(path)
+                    break
+
+        if missing:
+            # Дерево перестраивается один раз при выходе из контекста
+            with Category.objects.delay_mptt_updates():
+                for path in sorted(missing, key=len):
+                    parent_id = None
+                    for name in path:
+                        key = (parent_id, name)
+                        if key not in self.categories:
+                            category = Category(
+                                name=name,
+                                slug=_unique_slug(_base_slug(name, 'category'), self.category_slugs),
+                                parent_id=parent_id
+                            )
+                            category.save()
+                            self.categories[key] = category.id
+                            self.stats['categories'] += 1
+                        parent_id = self.categories[key]
+
+        resolved = {}
+        for path in paths:
+            parent_id = None
+            for name in path:
+                parent_id = self.categories[(parent_id, name)]
+            resolved[path] = parent_id
+        return resolved
+
+    def _resolve_tags(self, names):
+        """Возвращает {имя: id тега}, недостающие теги создаются одним bulk_create"""
+        names = set(names)
+        tags = dict(Tag.objects.filter(name__in=names).values_list('name', 'id'))
+        new_names = sorted(names - set(tags))
+        if new_names:
+            slugs = {name: _base_slug(name, 'tag') for name in new_names}
+            taken = set(Tag.objects.filter(slug__in=slugs.values()).values_list('slug', flat=True))
+            Tag.objects.bulk_create([
+                Tag(name=name, slug=_unique_slug(slugs[name], taken))
+                for name in new_names
+            ], ignore_conflicts=True)
+            tags.update(Tag.objects.filter(name__in=new_names).values_list('name', 'id'))
+            self.stats['tags'] += len(new_names)
+        return tags
+
+    # Пакет документов
+
+    def import_batch(self, documents):
+        """Записывает пакет разобранных документов, возвращает id созданных статей"""
+        if not documents:
+            return []
+
+        now = timezone.now()
+        for doc in documents:
+            doc['base_slug'] = _base_slug(
+                doc['slug'] or doc['title'], os.path.splitext(os.path.basename(doc['path']))[0]
+            )
+        taken = set(Article.objects.filter(
+            slug__in=[doc['base_slug'] for doc in documents]
+        ).values_list('slug', flat=True))
+
+        # Документ с явным slug, который уже есть в базе, импортирован ранее - не создаем дубликат
+        imported = [doc for doc in documents if doc['slug'] and doc['base_slug'] in taken]
+        self.stats['skipped'] += len(imported)
+        documents = [doc for doc in documents if not (doc['slug'] and doc['base_slug'] in taken)]
+        if not documents:
+            return []
+
+        with transaction.atomic():
+            categories = self._resolve_categories({doc['category'] for doc in documents})
+            tags = self._resolve_tags(name for doc in documents for name in doc['tags'])
+
+            articles = Article.objects.bulk_create([
+                Article(
+                    title=doc['title'],
+                    slug=_unique_slug(doc['base_slug'], taken),
+                    author=self.author,
+                    category_id=categories[doc['category']],
+                    status=doc['status'],
+                    published_at=now if doc['status'] == 'published' else None,
+                ) for doc in documents
+            ], batch_size=self.batch_size)
+
+            versions = ArticleVersion.objects.bulk_create([
+                ArticleVersion(
+                    article=article,
+                    title=doc['title'],
+                    content=doc['content'],
+                    excerpt=doc['excerpt'],
+                    author=self.author,
+                    version_number=1,
+                    content_size=len(doc['content']),
+                    word_count=len(doc['content'].split()),
+                    change_reason=f'Импорт из {doc["path"]}'[:500],
+                ) for article, doc in zip(articles, documents)
+            ], batch_size=self.batch_size)
+
+            for article, version in zip(articles, versions):
+                article.current_version = version
+            Article.objects.bulk_update(articles, ['current_version'], batch_size=self.batch_size)
+
+            Article.tags.through.objects.bulk_create([
+                Article.tags.through(article_id=article.id, tag_id=tags[name])
+                for article, doc in zip(articles, documents)
+                for name in doc['tags']
+            ], batch_size=self.batch_size)
+            self.touched_tags.update(tags.values())
+
+            # Версии неизменяемы: HTML рендерится сразу, как это делает сигнал создания версии
+            RenderedVersion.objects.bulk_create([
+                RenderedVersion(version=version, renderer_key=self.renderer_key, html=render_markdown(doc['content']))
+                for version, doc in zip(versions, documents)
+            ], batch_size=self.batch_size)
+
+        article_ids = [article.id for article in articles]
+        search.index_articles(article_ids)
+        self.stats['articles'] += len(articles)
+        self.stats['published'] += sum(1 for doc in documents if doc['status'] == 'published')
+        return article_ids
+
+    def run(self, source, checkpoint=None, progress=None):
+        """
+        Импортирует источник пакетами. checkpoint - путь к файлу контрольной точки:
+        если он есть, уже обработанные документы пропускаются без чтения.
+        progress(обработано документов) вызывается после каждого пакета.
+        """
+        state = load_checkpoint(checkpoint, source)
+        position = state['processed']
+        # Пересчет в finish() охватывает и пакеты, записанные до прерывания
+        self.touched_tags.update(state['touched_tags'])
+        self.stats['published'] += state['published']
+        documents = iter_source(source)
+
+        if position:
+            # Последний обработанный документ должен совпасть с записанным
+            last = None
+            for last in islice(documents, position):
+                pass
+            if last is None or last.path != state['last_path']:
+                raise CheckpointMismatch(f'{source}: содержимое источника изменилось после контрольной точки')
+
+        # Документ разбирается сразу при получении: архив открыт, пока идет обход
+        batch, last_path = [], None
+        for document in documents:
+            try:
+                batch.append(parse_document(document, self.default_status, self.default_category))
+            except ImportDocumentError as e:
+                self.errors.append(f'{document.path}: {e}')
+            position += 1
+            last_path = document.path
+            if position % self.batch_size == 0:
+                self._commit_batch(batch, checkpoint, source, position, last_path, progress)
+                batch = []
+        if last_path is not None and position % self.batch_size:
+            self._commit_batch(batch, checkpoint, source, position, last_path, progress)
+
+        self.finish()
+        if checkpoint and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        return self.stats
+
+    def _commit_batch(self, batch, checkpoint, source, position, last_path, progress):
+        self.import_batch(batch)
+        save_checkpoint(
+            checkpoint, source, position, last_path,
+            touched_tags=self.touched_tags, published=self.stats['published']
+        )
+        if progress:
+            progress(position)
+
+    def finish(self):
+        """Пересчитывает производные данные, которые дешевле обновить один раз в конце"""
+        from .author_stats import recount_author_stats
+        from .category_counts import recount_categories
+        from .related import rebuild_related
+        from .sidebar import invalidate_sidebar
+        from .tag_usage import recount_usage
+
+        recount_usage(self.touched_tags)
+        recount_categories()
+        recount_author_stats([self.author.pk])
+        if self.stats['published']:
+            rebuild_related(batch_size=self.batch_size)
+        invalidate_sidebar()
+
+
+def load_checkpoint(path, source):
+    state = {
+        'source': os.path.abspath(source), 'processed': 0, 'last_path': None,
+        'touched_tags': [], 'published': 0,
+    }
+    if not path or not os.path.exists(path):
+        return state
+    with open(path, encoding='utf-8') as stream:
+        saved = json.load(stream)
+    if saved.get('source') != state['source']:
+        raise CheckpointMismatch(f'{path}: контрольная точка записана для {saved.get("source")}')
+    state.update(saved)
+    return state
+
+
+def save_checkpoint(path, source, processed, last_path, touched_tags=(), published=0):
+    """
+    Кроме позиции в источнике сохраняются теги и число опубликованных статей
+    уже записанных пакетов: счетчики тегов и похожие статьи пересчитываются
+    в конце импорта, в том числе после возобновления.
+    """
+    if not path:
+        return
+    # Запись через временный файл: прерывание не оставит поврежденную точку
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w', encoding='utf-8') as stream:
+        json.dump({
+            'source': os.path.abspath(source),
+            'processed': processed,
+            'last_path': last_path,
+            'touched_tags': sorted(touched_tags),
+            'published': published,
+        }, stream)
+    os.replace(temporary, path)
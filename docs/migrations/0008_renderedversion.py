@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('docs', '0007_remove_article_visibility_alter_article_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RenderedVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('renderer_key', models.CharField(max_length=40, verbose_name='Ключ рендерера')),
+                ('html', models.TextField(verbose_name='HTML')),
+                ('rendered_at', models.DateTimeField(auto_now=True, verbose_name='Дата рендеринга')),
+                ('version', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rendered', to='docs.articleversion', verbose_name='Версия')),
+            ],
+            options={
+                'verbose_name': 'HTML версии',
+                'verbose_name_plural': 'HTML версий',
+                'unique_together': {('version', 'renderer_key')},
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+from django.db import migrations
+
+
+SEARCH_TABLE = 'docs_article_fts'
+
+
+def create_search_index(apps, schema_editor):
+    """Полнотекстовый индекс FTS5 доступен только в SQLite"""
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5('
+            f'title, excerpt, content, '
+            f'tokenize = "unicode61 remove_diacritics 2", prefix = "2 3")'
+        )
+
+        Article = apps.get_model('docs', 'Article')
+        articles = Article.objects.using(connection.alias).filter(
+            current_version__isnull=False
+        ).select_related('current_version').order_by('id')
+
+        for article in articles.iterator(chunk_size=500):
+            version = article.current_version
+            cursor.execute(
+                f'INSERT INTO {SEARCH_TABLE} (rowid, title, excerpt, content) VALUES (%s, %s, %s, %s)',
+                [article.id, version.title, version.excerpt, version.content]
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('docs', '0008_renderedversion'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:16
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def _count(model, **filters):
+    return Coalesce(Subquery(
+        model.objects.filter(article=OuterRef('pk'), **filters).order_by().values(
+            'article'
+        ).annotate(total=Count('id')).values('total')
+    ), Value(0))
+
+
+def fill_counters(apps, schema_editor):
+    """Заполняет счетчики существующих статей пакетами"""
+    Article = apps.get_model('docs', 'Article')
+    Rating = apps.get_model('docs', 'Rating')
+    Comment = apps.get_model('docs', 'Comment')
+    Favorite = apps.get_model('docs', 'Favorite')
+
+    last_id = 0
+    while True:
+        batch = list(Article.objects.filter(pk__gt=last_id).order_by('pk').annotate(
+            actual_likes=_count(Rating, rating_type='like'),
+            actual_dislikes=_count(Rating, rating_type='dislike'),
+            actual_comments=_count(Comment, is_approved=True, is_deleted=False),
+            actual_favorites=_count(Favorite),
+        ).only('id')[:500])
+        if not batch:
+            break
+        for article in batch:
+            article.likes_count = article.actual_likes
+            article.dislikes_count = article.actual_dislikes
+            article.comments_count = article.actual_comments
+            article.favorites_count = article.actual_favorites
+        Article.objects.bulk_update(
+            batch, ['likes_count', 'dislikes_count', 'comments_count', 'favorites_count']
+        )
+        last_id = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('docs', '0009_article_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Комментарии'),
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='dislikes_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Дизлайки'),
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Лайки'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,93 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:18
+
+import json
+import zlib
+from difflib import SequenceMatcher
+
+import docs.version_storage
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Копии функций docs.version_storage на момент миграции: миграция не должна
+# зависеть от последующих изменений кода приложения
+STORAGE_FULL = 'full'
+STORAGE_DELTA = 'delta'
+DELTA_MAX_RATIO = 0.8
+
+
+def encode_delta(base, text):
+    base_lines = base.splitlines(keepends=True)
+    lines = text.splitlines(keepends=True)
+
+    ops = []
+    matcher = SequenceMatcher(None, base_lines, lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            ops.append([i1, i2])
+        elif j2 > j1:
+            ops.append(''.join(lines[j1:j2]))
+
+    return zlib.compress(json.dumps(ops, ensure_ascii=False).encode('utf-8'), 9)
+
+
+def convert_article_versions(ArticleVersion, article_id, interval):
+    """Перекодирует версии статьи: снимок каждые interval версий, между ними - дельты"""
+    rows = list(
+        ArticleVersion.objects.filter(article_id=article_id).order_by(
+            'version_number'
+        ).values_list('pk', 'version_number', 'content')
+    )
+
+    previous_text = None
+    for pk, number, text in rows:
+        if previous_text is not None and (number - 1) % interval != 0:
+            encoded = encode_delta(previous_text, text)
+            if len(encoded) < len(text.encode('utf-8')) * DELTA_MAX_RATIO:
+                ArticleVersion.objects.filter(pk=pk).update(storage=STORAGE_DELTA, content='', delta=encoded)
+        previous_text = text
+
+
+def convert_existing_versions(apps, schema_editor):
+    """В режиме 'delta' перекодирует существующие версии пакетами по статьям"""
+    if getattr(settings, 'ARTICLE_VERSION_STORAGE', STORAGE_FULL) != STORAGE_DELTA:
+        return
+
+    Article = apps.get_model('docs', 'Article')
+    ArticleVersion = apps.get_model('docs', 'ArticleVersion')
+    interval = max(getattr(settings, 'ARTICLE_VERSION_SNAPSHOT_INTERVAL', 10), 1)
+
+    last_id = 0
+    while True:
+        ids = list(Article.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:200])
+        if not ids:
+            break
+        for article_id in ids:
+            convert_article_versions(ArticleVersion, article_id, interval)
+        last_id = ids[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('docs', '0010_article_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='articleversion',
+            name='delta',
+            field=models.BinaryField(blank=True, null=True, verbose_name='Изменения'),
+        ),
+        migrations.AddField(
+            model_name='articleversion',
+            name='storage',
+            field=models.CharField(choices=[('full', 'Полный текст'), ('delta', 'Изменения')], default='full', editable=False, max_length=5, verbose_name='Формат хранения'),
+        ),
+        migrations.AlterField(
+            model_name='articleversion',
+            name='content',
+            field=docs.version_storage.VersionContentField(verbose_name='Содержание'),
+        ),
+        migrations.RunPython(convert_existing_versions, migrations.RunPython.noop),
+    ]
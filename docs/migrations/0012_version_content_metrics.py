@@ -0,0 +1,69 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:22
+
+import json
+import zlib
+
+from django.db import migrations, models
+
+
+STORAGE_FULL = 'full'
+
+
+def apply_delta(base, delta):
+    """Копия docs.version_storage.apply_delta на момент миграции"""
+    base_lines = base.splitlines(keepends=True)
+    parts = []
+    for op in json.loads(zlib.decompress(bytes(delta)).decode('utf-8')):
+        if isinstance(op, str):
+            parts.append(op)
+        else:
+            parts.extend(base_lines[op[0]:op[1]])
+    return ''.join(parts)
+
+
+def fill_content_metrics(apps, schema_editor):
+    """Размер и число слов существующих версий, пакетами по статьям"""
+    Article = apps.get_model('docs', 'Article')
+    ArticleVersion = apps.get_model('docs', 'ArticleVersion')
+
+    last_id = 0
+    while True:
+        ids = list(Article.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:200])
+        if not ids:
+            break
+
+        changed = []
+        text = ''
+        article_id = None
+        rows = ArticleVersion.objects.filter(article_id__in=ids).order_by(
+            'article_id', 'version_number'
+        ).values_list('pk', 'article_id', 'storage', 'content', 'delta')
+        for pk, version_article_id, storage, content, delta in rows.iterator(chunk_size=500):
+            if version_article_id != article_id:
+                article_id, text = version_article_id, ''
+            text = content if storage == STORAGE_FULL else apply_delta(text, delta)
+            changed.append(ArticleVersion(pk=pk, content_size=len(text), word_count=len(text.split())))
+
+        ArticleVersion.objects.bulk_update(changed, ['content_size', 'word_count'], batch_size=500)
+        last_id = ids[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('docs', '0011_version_delta_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='articleversion',
+            name='content_size',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Размер (символов)'),
+        ),
+        migrations.AddField(
+            model_name='articleversion',
+            name='word_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество слов'),
+        ),
+        migrations.RunPython(fill_content_metrics, migrations.RunPython.noop),
+    ]
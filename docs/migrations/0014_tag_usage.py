@@ -0,0 +1,41 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def fill_tag_usage(apps, schema_editor):
+    """Количество опубликованных статей для существующих тегов"""
+    Tag = apps.get_model('docs', 'Tag')
+    TagUsage = apps.get_model('docs', 'TagUsage')
+
+    rows = Tag.objects.annotate(
+        published=Count('articles', filter=Q(articles__status='published'))
+    ).values_list('id', 'published')
+    TagUsage.objects.bulk_create(
+        [TagUsage(tag_id=tag_id, article_count=count) for tag_id, count in rows.iterator()],
+        batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('docs', '0013_article_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TagUsage',
+            fields=[
+                ('tag', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='usage', serialize=False, to='docs.tag', verbose_name='Тег')),
+                ('article_count', models.PositiveIntegerField(db_index=True, default=0, verbose_name='Опубликованных статей')),
+            ],
+            options={
+                'verbose_name': 'Использование тега',
+                'verbose_name_plural': 'Использование тегов',
+            },
+        ),
+        migrations.RunPython(fill_tag_usage, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:30
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def compute_category_counts(nodes, direct):
+    """Копия docs.category_counts.compute_category_counts на момент миграции"""
+    totals = {}
+    # В обратном порядке обхода потомки идут раньше предков
+    for node in reversed(nodes):
+        totals[node.id] = totals.get(node.id, 0) + direct.get(node.id, 0)
+        if node.parent_id is not None:
+            totals[node.parent_id] = totals.get(node.parent_id, 0) + totals[node.id]
+    return {node.id: (direct.get(node.id, 0), totals[node.id]) for node in nodes}
+
+
+def fill_category_counts(apps, schema_editor):
+    Article = apps.get_model('docs', 'Article')
+    Category = apps.get_model('docs', 'Category')
+
+    direct = dict(
+        Article.objects.filter(status='published').values('category_id').annotate(
+            total=Count('id')
+        ).values_list('category_id', 'total')
+    )
+    nodes = list(Category.objects.order_by('tree_id', 'lft'))
+    counts = compute_category_counts(nodes, direct)
+    for node in nodes:
+        node.article_count, node.total_article_count = counts[node.id]
+    Category.objects.bulk_update(nodes, ['article_count', 'total_article_count'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('docs', '0014_tag_usage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='article_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Статей в категории'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='total_article_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Статей с подкатегориями'),
+        ),
+        migrations.RunPython(fill_category_counts, migrations.RunPython.noop),
+    ]
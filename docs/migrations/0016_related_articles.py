@@ -0,0 +1,45 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('docs', '0015_category_article_counts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArticleTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64, verbose_name='Термин')),
+                ('weight', models.FloatField(verbose_name='Вес')),
+                ('article', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='terms', to='docs.article', verbose_name='Статья')),
+            ],
+            options={
+                'verbose_name': 'Термин статьи',
+                'verbose_name_plural': 'Термины статей',
+                'indexes': [models.Index(fields=['term'], name='docs_articl_term_d0fc0d_idx')],
+                'unique_together': {('article', 'term')},
+            },
+        ),
+        migrations.CreateModel(
+            name='RelatedArticle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='Сходство')),
+                ('article', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_links', to='docs.article', verbose_name='Статья')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='docs.article', verbose_name='Похожая статья')),
+            ],
+            options={
+                'verbose_name': 'Похожая статья',
+                'verbose_name_plural': 'Похожие статьи',
+                'ordering': ['-score'],
+                'indexes': [models.Index(fields=['article', '-score'], name='docs_relate_article_23bceb_idx')],
+                'unique_together': {('article', 'related')},
+            },
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:49
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+STATUS_FIELDS = {
+    'published': 'published_count',
+    'private': 'private_count',
+    'draft': 'draft_count',
+    'archived': 'archived_count',
+}
+
+
+def fill_author_stats(apps, schema_editor):
+    """Статистика существующих авторов по статьям и их счетчикам"""
+    Article = apps.get_model('docs', 'Article')
+    AuthorStats = apps.get_model('docs', 'AuthorStats')
+
+    stats = {}
+    totals = Article.objects.values('author_id').annotate(
+        total_views=Sum('view_count'),
+        total_comments=Sum('comments_count'),
+        total_likes=Sum('likes_count'),
+        total_favorites=Sum('favorites_count'),
+    )
+    for row in totals.iterator():
+        author_id = row.pop('author_id')
+        stats[author_id] = AuthorStats(user_id=author_id, **{field: value or 0 for field, value in row.items()})
+
+    by_status = Article.objects.values('author_id', 'status').annotate(total=Count('id'))
+    for row in by_status.iterator():
+        field = STATUS_FIELDS.get(row['status'])
+        if field:
+            setattr(stats[row['author_id']], field, row['total'])
+
+    AuthorStats.objects.bulk_create(stats.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('docs', '0016_related_articles'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='article_stats', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('published_count', models.PositiveIntegerField(default=0, verbose_name='Опубликовано')),
+                ('private_count', models.PositiveIntegerField(default=0, verbose_name='Приватных')),
+                ('draft_count', models.PositiveIntegerField(default=0, verbose_name='Черновиков')),
+                ('archived_count', models.PositiveIntegerField(default=0, verbose_name='В архиве')),
+                ('total_views', models.PositiveBigIntegerField(default=0, verbose_name='Просмотров')),
+                ('total_comments', models.PositiveIntegerField(default=0, verbose_name='Комментариев')),
+                ('total_likes', models.PositiveIntegerField(default=0, verbose_name='Лайков')),
+                ('total_favorites', models.PositiveIntegerField(default=0, verbose_name='В избранном')),
+            ],
+            options={
+                'verbose_name': 'Статистика автора',
+                'verbose_name_plural': 'Статистика авторов',
+            },
+        ),
+        migrations.RunPython(fill_author_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.6 on 2026-10-17 05:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('docs', '0017_author_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArticleTermSet',
+            fields=[
+                ('article', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='term_set', serialize=False, to='docs.article', verbose_name='Статья')),
+                ('terms', models.TextField(verbose_name='Термины')),
+            ],
+            options={
+                'verbose_name': 'Термины статьи',
+                'verbose_name_plural': 'Термины статей',
+            },
+        ),
+        migrations.CreateModel(
+            name='TermFrequency',
+            fields=[
+                ('term', models.CharField(max_length=64, primary_key=True, serialize=False, verbose_name='Термин')),
+                ('document_count', models.PositiveIntegerField(default=0, verbose_name='Статей')),
+            ],
+            options={
+                'verbose_name': 'Частота термина',
+                'verbose_name_plural': 'Частоты терминов',
+            },
+        ),
+    ]
@@ -3,9 +3,11 @@ from django.contrib.auth.models import User
 from django.utils.text import slugify
 from django.urls import reverse
 from mptt.models import MPTTModel, TreeForeignKey
-from mdeditor.fields import MDTextField
 from django.utils import timezone
 from django.core.exceptions import ValidationError
+from .version_storage import (
+    STORAGE_CHOICES, STORAGE_FULL, VersionContentField, content_cache, prepare_new_version
+)
 import uuid
 
 
@@ -33,7 +35,30 @@ class Tag(models.Model):
         return reverse('docs:tag_articles', kwargs={'slug': self.slug})
 
     def article_count(self):
-        return self.articles.filter(status='published').count()
+        """Количество опубликованных статей (из таблицы TagUsage)"""
+        try:
+            return self.usage.article_count
+        except TagUsage.DoesNotExist:
+            return 0
+
+
+class TagUsage(models.Model):
+    """Количество опубликованных статей с тегом, поддерживается сигналами (см. docs/tag_usage.py)"""
+    tag = models.OneToOneField(
+        Tag,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='usage',
+        verbose_name='Тег'
+    )
+    article_count = models.PositiveIntegerField(default=0, db_index=True, verbose_name='Опубликованных статей')
+
+    class Meta:
+        verbose_name = 'Использование тега'
+        verbose_name_plural = 'Использование тегов'
+
+    def __str__(self):
+        return f'{self.tag}: {self.article_count}'
 
 
 class Category(MPTTModel):
@@ -45,6 +70,11 @@ class Category(MPTTModel):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Опубликованные статьи: в самой категории и вместе с подкатегориями
+    # (поддерживаются сигналами, см. docs/category_counts.py)
+    article_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="Статей в категории")
+    total_article_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="Статей с подкатегориями")
+
     class MPTTMeta:
         order_insertion_by = ['name']
 
@@ -120,6 +150,16 @@ class Article(models.Model):
     # )
 
     view_count = models.PositiveIntegerField(default=0, verbose_name="Просмотры")
+
+    # Денормализованные счетчики, поддерживаются сигналами (docs/counters.py)
+    likes_count = models.PositiveIntegerField(default=0, verbose_name="Лайки")
+    dislikes_count = models.PositiveIntegerField(default=0, verbose_name="Дизлайки")
+    comments_count = models.PositiveIntegerField(default=0, verbose_name="Комментарии")
+    favorites_count = models.PositiveIntegerField(default=0, verbose_name="В избранном")
+
+    # Поля, которые save() существующей статьи не записывает
+    SAVED_SEPARATELY = ('view_count', 'likes_count', 'dislikes_count', 'comments_count', 'favorites_count')
+
     is_pinned = models.BooleanField(default=False, verbose_name="Закреплено")
 
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создано")
@@ -139,6 +179,25 @@ class Article(models.Model):
         verbose_name = "Статья"
         verbose_name_plural = "Статьи"
         ordering = ['-created_at']
+        indexes = [
+            # Курсорная пагинация списков по (created_at, id)
+            models.Index(fields=['status', '-created_at', '-id'], name='article_status_created_idx'),
+            models.Index(fields=['category', 'status', '-created_at', '-id'], name='article_category_created_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Запоминаем загруженные значения, чтобы обработчики сигналов видели изменения
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def has_changed(self, field_name):
+        """Изменилось ли поле с момента загрузки из базы (для новых объектов - всегда)"""
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None or field_name not in loaded:
+            return True
+        return loaded[field_name] != getattr(self, field_name)
 
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -152,8 +211,22 @@ class Article(models.Model):
         elif self.status != 'published':
             self.published_at = None
 
+        # Счетчики меняются только атомарными UPDATE (F()): обычное сохранение
+        # существующей статьи их не записывает, иначе объект, загруженный раньше
+        # (форма редактирования, админка), затер бы новые оценки и просмотры
+        if not self._state.adding and not args and not kwargs.get('force_insert') and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.SAVED_SEPARATELY
+            ]
+
         super().save(*args, **kwargs)
 
+        # Сохраненное состояние становится исходным для следующих изменений
+        self._loaded_values = {
+            field.attname: getattr(self, field.attname) for field in self._meta.concrete_fields
+        }
+
     def __str__(self):
         return self.title
 
@@ -161,35 +234,30 @@ class Article(models.Model):
         return reverse('docs:article_detail', kwargs={'slug': self.slug})
 
     def increment_view_count(self):
-        self.view_count += 1
-        self.save(update_fields=['view_count'])
+        """Учитывает просмотр в буфере, в базу счетчик переносится пакетно"""
+        from .view_counter import record_view
+        record_view(self.pk)
+
+    def get_view_count(self):
+        """Просмотры с учетом еще не перенесенных в базу"""
+        from .view_counter import get_pending_views
+        return self.view_count + get_pending_views(self.pk)
 
     def get_comment_count(self):
-        """Количество комментариев к статье"""
-        try:
-            return self.comments_article.filter(
-                is_approved=True,
-                is_deleted=False
-            ).count()
-        except Exception as e:
-            print(f"Error getting comment count: {e}")
-            return 0
+        """Количество одобренных комментариев к статье"""
+        return self.comments_count
 
     def get_like_count(self):
         """Количество лайков статьи"""
-        try:
-            return self.ratings.filter(rating_type='like').count()
-        except Exception as e:
-            print(f"Error getting like count: {e}")
-            return 0
+        return self.likes_count
 
     def get_dislike_count(self):
         """Количество дизлайков статьи"""
-        try:
-            return self.ratings.filter(rating_type='dislike').count()
-        except Exception as e:
-            print(f"Error getting dislike count: {e}")
-            return 0
+        return self.dislikes_count
+
+    def get_favorite_count(self):
+        """Сколько пользователей добавили статью в избранное"""
+        return self.favorites_count
 
     def get_user_rating(self, user):
         """Рейтинг пользователя для этой статьи"""
@@ -286,9 +354,23 @@ class ArticleVersion(models.Model):
     )
 
     title = models.CharField(max_length=200, verbose_name="Заголовок")
-    content = MDTextField(verbose_name="Содержание")
+    content = VersionContentField(verbose_name="Содержание")
     excerpt = models.TextField(blank=True, verbose_name="Краткое описание")
 
+    # Формат хранения содержимого (см. docs/version_storage.py)
+    storage = models.CharField(
+        max_length=5,
+        choices=STORAGE_CHOICES,
+        default=STORAGE_FULL,
+        editable=False,
+        verbose_name="Формат хранения"
+    )
+    delta = models.BinaryField(null=True, blank=True, editable=False, verbose_name="Изменения")
+
+    # Метаданные содержимого, чтобы списки версий не загружали текст
+    content_size = models.PositiveIntegerField(default=0, editable=False, verbose_name="Размер (символов)")
+    word_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="Количество слов")
+
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -320,9 +402,20 @@ class ArticleVersion(models.Model):
             ).order_by('-version_number').first()
             self.version_number = last_version.version_number + 1 if last_version else 1
 
+            text = self.__dict__.get('content') or ''
+            self.content_size = len(text)
+            self.word_count = len(text.split())
+
+            # Полный снимок или дельта относительно предыдущей версии
+            prepare_new_version(self, last_version)
+
         # Сохраняем версию
         super().save(*args, **kwargs)
 
+        full_content = getattr(self, '_full_content', None)
+        if full_content is not None:
+            content_cache.set(self.pk, full_content)
+
         # Устанавливаем как текущую версию только если это первая версия
         # и статья еще не имеет текущей версии
         if (self.version_number == 1 and
@@ -336,10 +429,31 @@ class ArticleVersion(models.Model):
     def get_absolute_url(self):
         return reverse('docs:version_detail', kwargs={
             'slug': self.article.slug,
-            'version_id': self.id
+            'pk': self.id
         })
 
 
+class RenderedVersion(models.Model):
+    """Готовый HTML версии статьи для конкретной конфигурации рендерера"""
+    version = models.ForeignKey(
+        ArticleVersion,
+        on_delete=models.CASCADE,
+        related_name='rendered',
+        verbose_name='Версия'
+    )
+    renderer_key = models.CharField(max_length=40, verbose_name='Ключ рендерера')
+    html = models.TextField(verbose_name='HTML')
+    rendered_at = models.DateTimeField(auto_now=True, verbose_name='Дата рендеринга')
+
+    class Meta:
+        verbose_name = 'HTML версии'
+        verbose_name_plural = 'HTML версий'
+        unique_together = ['version', 'renderer_key']
+
+    def __str__(self):
+        return f'{self.version} [{self.renderer_key[:8]}]'
+
+
 class Comment(MPTTModel):
     article = models.ForeignKey(
         Article,
@@ -385,10 +499,25 @@ class Comment(MPTTModel):
     def __str__(self):
         return f'Комментарий от {self.author.username} к "{self.article.title}"'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Запоминаем, учитывался ли комментарий в счетчике статьи
+        loaded = dict(zip(field_names, values))
+        if 'is_approved' in loaded and 'is_deleted' in loaded:
+            instance._was_counted = loaded['is_approved'] and not loaded['is_deleted']
+        return instance
+
+    @property
+    def is_counted(self):
+        """Учитывается ли комментарий в счетчике комментариев статьи"""
+        return self.is_approved and not self.is_deleted
+
     def save(self, *args, **kwargs):
         if self.pk:
             self.is_edited = True
         super().save(*args, **kwargs)
+        self._was_counted = self.is_counted
 
     def get_absolute_url(self):
         return f"{self.article.get_absolute_url()}#comment-{self.pk}"
@@ -525,3 +654,117 @@ class ArticleExport(models.Model):
 
     def __str__(self):
         return f'{self.article.title} - {self.get_export_format_display()}'
+
+
+class ArticleTerm(models.Model):
+    """Вес термина TF-IDF в тексте статьи (для поиска похожих статей, см. docs/related.py)"""
+    article = models.ForeignKey(
+        Article,
+        on_delete=models.CASCADE,
+        related_name='terms',
+        verbose_name='Статья'
+    )
+    term = models.CharField(max_length=64, verbose_name='Термин')
+    weight = models.FloatField(verbose_name='Вес')
+
+    class Meta:
+        verbose_name = 'Термин статьи'
+        verbose_name_plural = 'Термины статей'
+        unique_together = ['article', 'term']
+        indexes = [
+            models.Index(fields=['term']),
+        ]
+
+    def __str__(self):
+        return f'{self.article_id}: {self.term}'
+
+
+class ArticleTermSet(models.Model):
+    """Все термины текста опубликованной статьи (для документных частот TermFrequency)"""
+    article = models.OneToOneField(
+        Article,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='term_set',
+        verbose_name='Статья'
+    )
+    terms = models.TextField(verbose_name='Термины')  # через пробел
+
+    class Meta:
+        verbose_name = 'Термины статьи'
+        verbose_name_plural = 'Термины статей'
+
+    def __str__(self):
+        return str(self.article_id)
+
+
+class TermFrequency(models.Model):
+    """Документная частота термина: количество опубликованных статей, где он встречается"""
+    term = models.CharField(max_length=64, primary_key=True, verbose_name='Термин')
+    document_count = models.PositiveIntegerField(default=0, verbose_name='Статей')
+
+    class Meta:
+        verbose_name = 'Частота термина'
+        verbose_name_plural = 'Частоты терминов'
+
+    def __str__(self):
+        return f'{self.term}: {self.document_count}'
+
+
+class RelatedArticle(models.Model):
+    """Заранее посчитанные похожие статьи"""
+    article = models.ForeignKey(
+        Article,
+        on_delete=models.CASCADE,
+        related_name='related_links',
+        verbose_name='Статья'
+    )
+    related = models.ForeignKey(
+        Article,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Похожая статья'
+    )
+    score = models.FloatField(verbose_name='Сходство')
+
+    class Meta:
+        verbose_name = 'Похожая статья'
+        verbose_name_plural = 'Похожие статьи'
+        ordering = ['-score']
+        unique_together = ['article', 'related']
+        indexes = [
+            models.Index(fields=['article', '-score']),
+        ]
+
+    def __str__(self):
+        return f'{self.article_id} → {self.related_id} ({self.score:.3f})'
+
+
+class AuthorStats(models.Model):
+    """Сводная статистика автора для личного кабинета, поддерживается сигналами (см. docs/author_stats.py)"""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='article_stats',
+        verbose_name='Автор'
+    )
+    published_count = models.PositiveIntegerField(default=0, verbose_name='Опубликовано')
+    private_count = models.PositiveIntegerField(default=0, verbose_name='Приватных')
+    draft_count = models.PositiveIntegerField(default=0, verbose_name='Черновиков')
+    archived_count = models.PositiveIntegerField(default=0, verbose_name='В архиве')
+    total_views = models.PositiveBigIntegerField(default=0, verbose_name='Просмотров')
+    total_comments = models.PositiveIntegerField(default=0, verbose_name='Комментариев')
+    total_likes = models.PositiveIntegerField(default=0, verbose_name='Лайков')
+    total_favorites = models.PositiveIntegerField(default=0, verbose_name='В избранном')
+
+    class Meta:
+        verbose_name = 'Статистика автора'
+        verbose_name_plural = 'Статистика авторов'
+
+    def __str__(self):
+        return f'{self.user}: {self.total_articles}'
+
+    @property
+    def total_articles(self):
+        return self.published_count + self.private_count + self.draft_count + self.archived_count
@@ -0,0 +1,231 @@
+import base64
+import binascii
+import datetime
+import decimal
+import hashlib
+import json
+import math
+
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet, FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from django.http import Http404, JsonResponse
+from django.template.loader import render_to_string
+
+
+# Общее количество для надписи "Страница N из ~M" пересчитывается не чаще,
+# чем раз в PAGINATION_COUNT_TIMEOUT секунд для каждого запроса
+PAGINATION_COUNT_TIMEOUT = 300
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def _encode_value(value):
+    # Полная точность: DjangoJSONEncoder округляет время до миллисекунд
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    return value
+
+
+def encode_cursor(values, direction, number):
+    payload = json.dumps([[_encode_value(value) for value in values], direction, number])
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Возвращает (значения ключа, направление, номер страницы)"""
+    try:
+        values, direction, number = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, TypeError, binascii.Error):
+        raise InvalidCursor(cursor)
+    if direction not in (NEXT, PREVIOUS) or not isinstance(values, list) or not isinstance(number, int):
+        raise InvalidCursor(cursor)
+    return values, direction, max(number, 1)
+
+
+class CursorPage:
+    """Страница выборки с курсорами соседних страниц (интерфейс близок к django Page)"""
+
+    def __init__(self, object_list, number, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.number = number
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f'<CursorPage {self.number}>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.number > 1
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """
+    Постраничная выборка по ключу сортировки (keyset) вместо OFFSET:
+    каждая страница - запрос "строки после последней показанной", поэтому
+    глубокие страницы стоят столько же, сколько первая.
+
+    ordering - поля сортировки, последним должно идти уникальное поле (id).
+    Вместо QuerySet можно передать объект с методом keyset(values, reverse, limit),
+    например SearchResults.
+    """
+
+    def __init__(self, queryset, per_page, ordering=('-created_at', '-id')):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = tuple(ordering)
+
+    def _fields(self):
+        return [name.lstrip('-') for name in self.ordering]
+
+    def _key(self, obj):
+        return [getattr(obj, name) for name in self._fields()]
+
+    def _parse_values(self, values):
+        if len(values) != len(self.ordering):
+            raise InvalidCursor(values)
+        model = getattr(self.queryset, 'model', None)
+        parsed = []
+        for name, value in zip(self._fields(), values):
+            try:
+                field = model._meta.get_field(name) if model is not None else None
+            except FieldDoesNotExist:
+                field = None
+            try:
+                parsed.append(field.to_python(value) if field is not None else value)
+            except ValidationError:
+                raise InvalidCursor(values)
+        return parsed
+
+    def _keyset_filter(self, values, reverse):
+        """Условие "строго после values" для сортировки self.ordering"""
+        condition = Q()
+        equal = {}
+        for name, value in zip(self.ordering, values):
+            field = name.lstrip('-')
+            descending = name.startswith('-') != reverse
+            condition |= Q(**equal, **{f'{field}__{"lt" if descending else "gt"}': value})
+            equal[field] = value
+        return condition
+
+    def _fetch(self, values, reverse, limit):
+        if hasattr(self.queryset, 'keyset'):
+            return list(self.queryset.keyset(values, reverse, limit))
+
+        ordering = [
+            (name[1:] if name.startswith('-') else f'-{name}') if reverse else name
+            for name in self.ordering
+        ]
+        queryset = self.queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self._keyset_filter(values, reverse))
+        return list(queryset[:limit])
+
+    def page(self, cursor=None):
+        """Страница по курсору; без курсора - первая"""
+        values, direction, number = None, NEXT, 1
+        if cursor:
+            values, direction, number = decode_cursor(cursor)
+            values = self._parse_values(values)
+
+        rows = self._fetch(values, direction == PREVIOUS, self.per_page + 1)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if direction == PREVIOUS:
+            rows.reverse()
+            # Данные могли сдвинуться: если до начала ничего не осталось - это первая страница
+            if not has_more:
+                number = 1
+            has_next = True
+        else:
+            has_next = has_more
+
+        next_cursor = previous_cursor = None
+        if rows and has_next:
+            next_cursor = encode_cursor(self._key(rows[-1]), NEXT, number + 1)
+        if rows and number > 1:
+            previous_cursor = encode_cursor(self._key(rows[0]), PREVIOUS, number - 1)
+        return CursorPage(rows, number, self, next_cursor, previous_cursor)
+
+    def _count_cache_key(self):
+        key = getattr(self.queryset, 'count_cache_key', None)
+        if key is None:
+            try:
+                key = str(self.queryset.query)
+            except EmptyResultSet:
+                return None
+        return 'pagination:count:' + hashlib.md5(key.encode('utf-8')).hexdigest()
+
+    @property
+    def count(self):
+        """Приблизительное общее количество (кэшируется на PAGINATION_COUNT_TIMEOUT)"""
+        if not hasattr(self, '_count'):
+            key = self._count_cache_key()
+            count = cache.get(key) if key else None
+            if count is None:
+                count = self.queryset.count()
+                if key:
+                    cache.set(key, count, PAGINATION_COUNT_TIMEOUT)
+            self._count = count
+        return self._count
+
+    @property
+    def num_pages(self):
+        return max(math.ceil(self.count / self.per_page), 1)
+
+
+class CursorPaginationMixin:
+    """
+    Курсорная пагинация для ListView.
+    ?cursor= - токен страницы; ?format=json - ответ для бесконечной прокрутки:
+    HTML карточек из page_template_name и курсор следующей страницы.
+    """
+    paginate_by = 12
+    cursor_ordering = ('-created_at', '-id')
+    page_template_name = 'docs/includes/article_cards.html'
+
+    def get_cursor_ordering(self):
+        return self.cursor_ordering
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = CursorPaginator(queryset, page_size, self.get_cursor_ordering())
+        try:
+            page = paginator.page(self.request.GET.get('cursor'))
+        except InvalidCursor:
+            raise Http404('Некорректный курсор страницы')
+        return paginator, page, page.object_list, page.has_other_pages()
+
+    def render_to_response(self, context, **response_kwargs):
+        if self.request.GET.get('format') == 'json':
+            page = context['page_obj']
+            return JsonResponse({
+                'success': True,
+                'html': render_to_string(self.page_template_name, context, request=self.request),
+                'next_cursor': page.next_cursor,
+                'page': page.number,
+            })
+        return super().render_to_response(context, **response_kwargs)
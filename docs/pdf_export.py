@@ -0,0 +1,177 @@
+import importlib.util
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.template.loader import render_to_string
+
+from .export_cache import ExportFile, export_key, get_cache_dir, prune_export_cache, touch_file
+from .pdf_worker import render_pdf
+from .rendering import get_version_html
+
+
+# PDF рендерится несколько секунд, поэтому никогда не выполняется в запросе:
+# запрос ставит задание в пул процессов и перенаправляет на страницу ожидания.
+# Готовый PDF хранится в файловом кэше экспорта (ключ - как у других форматов:
+# версия, шаблон и показываемые метаданные статьи, см. export_cache.export_key),
+# состояние задания - файлами-метками в подкаталоге pdf-jobs, чтобы его видели
+# все процессы веб-сервера.
+PDF_TEMPLATE = 'docs/export/article_pdf.html'
+
+PDF_READY = 'ready'
+PDF_PENDING = 'pending'
+PDF_FAILED = 'failed'
+PDF_MISSING = 'missing'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def pdf_export_available():
+    """Установлен ли WeasyPrint (необязательная зависимость)"""
+    return importlib.util.find_spec('weasyprint') is not None
+
+
+def get_timeout():
+    return getattr(settings, 'PDF_EXPORT_TIMEOUT', 300)
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=getattr(settings, 'PDF_EXPORT_WORKERS', 2),
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return _executor
+
+
+def _reset_executor():
+    global _executor
+    with _executor_lock:
+        _executor = None
+
+
+def _paths(article, request=None):
+    """(файл PDF, метка выполнения, файл ошибки) для текущей версии статьи"""
+    key = export_key(article, 'pdf', request, template_name=PDF_TEMPLATE)
+    jobs = os.path.join(get_cache_dir(), 'pdf-jobs')
+    return (
+        os.path.join(get_cache_dir(), f'{key}.pdf'),
+        os.path.join(jobs, f'{key}.pending'),
+        os.path.join(jobs, f'{key}.error'),
+    )
+
+
+def _is_fresh(path):
+    """Метка задания моложе PDF_EXPORT_TIMEOUT (иначе процесс, вероятно, погиб)"""
+    try:
+        return time.time() - os.stat(path).st_mtime < get_timeout()
+    except FileNotFoundError:
+        return False
+
+
+def get_pdf_status(article, request=None):
+    return _status(*_paths(article, request))
+
+
+def _status(pdf, pending, error):
+    if os.path.exists(pdf):
+        return PDF_READY
+    if _is_fresh(pending):
+        return PDF_PENDING
+    if os.path.exists(error):
+        return PDF_FAILED
+    return PDF_MISSING
+
+
+def get_pdf_error(article, request=None):
+    try:
+        with open(_paths(article, request)[2], encoding='utf-8') as stream:
+            return stream.read()
+    except FileNotFoundError:
+        return ''
+
+
+def get_pdf_file(article, request=None):
+    """Готовый PDF текущей версии статьи или None"""
+    pdf = _paths(article, request)[0]
+    if not os.path.exists(pdf):
+        return None
+    touch_file(pdf)
+    return ExportFile(pdf, 'application/pdf')
+
+
+def _finished(future, pending, error):
+    """Вызывается в процессе веб-сервера по завершении задания"""
+    try:
+        exception = future.exception()
+    except Exception as e:
+        exception = e
+    if exception is not None:
+        if isinstance(exception, BrokenProcessPool):
+            _reset_executor()
+        with open(error, 'w', encoding='utf-8') as stream:
+            stream.write(str(exception) or exception.__class__.__name__)
+    else:
+        prune_export_cache()
+    try:
+        os.remove(pending)
+    except FileNotFoundError:
+        pass
+
+
+def request_pdf(article, request=None):
+    """
+    Ставит рендеринг PDF текущей версии в очередь, если он еще не готов
+    и не выполняется. Возвращает состояние задания.
+    """
+    version = article.current_version
+    pdf, pending, error = _paths(article, request)
+    status = _status(pdf, pending, error)
+    if status in (PDF_READY, PDF_PENDING):
+        return status
+
+    os.makedirs(os.path.dirname(pending), exist_ok=True)
+    if os.path.exists(pending) and not _is_fresh(pending):
+        try:
+            os.remove(pending)  # метка погибшего задания
+        except FileNotFoundError:
+            pass
+    try:
+        # O_EXCL: из нескольких одновременных запросов задание ставит один
+        os.close(os.open(pending, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except FileExistsError:
+        return PDF_PENDING
+    try:
+        os.remove(error)
+    except FileNotFoundError:
+        pass
+
+    try:
+        html = render_to_string(PDF_TEMPLATE, {
+            'article': article,
+            'version': version,
+            'html_content': get_version_html(version),
+        })
+        base_url = request.build_absolute_uri('/') if request is not None else None
+
+        try:
+            future = _get_executor().submit(render_pdf, html, pdf, base_url)
+        except BrokenProcessPool:
+            _reset_executor()
+            future = _get_executor().submit(render_pdf, html, pdf, base_url)
+    except Exception as e:
+        # Задание не поставлено: без метки страница ожидания сразу покажет ошибку,
+        # а не состояние «выполняется» до истечения PDF_EXPORT_TIMEOUT
+        with open(error, 'w', encoding='utf-8') as stream:
+            stream.write(str(e) or e.__class__.__name__)
+        os.remove(pending)
+        return PDF_FAILED
+    future.add_done_callback(lambda future: _finished(future, pending, error))
+    return PDF_PENDING
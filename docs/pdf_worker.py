@@ -0,0 +1,21 @@
+import os
+import tempfile
+
+
+# Код, выполняемый в процессах пула PDF-экспорта (см. docs/pdf_export.py).
+# Модуль не импортирует Django: процессы пула запускаются методом spawn
+# и не настраивают приложение.
+
+def render_pdf(html, path, base_url=None):
+    """Рендерит HTML в PDF-файл path, возвращает размер файла"""
+    import weasyprint
+
+    descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    os.close(descriptor)
+    try:
+        weasyprint.HTML(string=html, base_url=base_url).write_pdf(temporary)
+        os.replace(temporary, path)
+    finally:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+    return os.path.getsize(path)
@@ -0,0 +1,241 @@
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import re
+import tempfile
+import time
+import uuid
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils import timezone
+
+
+# Профилирование отдельных запросов (cProfile). Профиль снимается для
+# случайной доли запросов к PROFILING_VIEWS (PROFILING_SAMPLE_RATE) или по
+# запросу сотрудника: параметр ?_profile=1 или заголовок X-Profile: 1.
+# Профиль сохраняется в PROFILING_DIR файлом .prof (формат pstats, открывается
+# snakeviz, pstats и т.п.) с описанием .json рядом; хранятся последние
+# PROFILING_MAX_FILES профилей. Список и скачивание - /admin/profiles/.
+
+PROFILE_TRIGGER_PARAMETER = '_profile'
+PROFILE_TRIGGER_HEADER = 'X-Profile'
+
+_PROFILE_NAME_RE = re.compile(r'^\d+-[0-9a-f]{8}$')
+
+logger = logging.getLogger('docs.profiling')
+
+
+def profiling_enabled():
+    return getattr(settings, 'PROFILING_ENABLED', False)
+
+
+def get_profile_dir():
+    return getattr(settings, 'PROFILING_DIR', os.path.join(settings.BASE_DIR, 'profiles'))
+
+
+def get_max_files():
+    return getattr(settings, 'PROFILING_MAX_FILES', 50)
+
+
+def get_sample_rate():
+    return getattr(settings, 'PROFILING_SAMPLE_RATE', 0.0)
+
+
+def get_profiled_views():
+    return getattr(settings, 'PROFILING_VIEWS', ('docs:article_detail', 'docs:compare_versions', 'docs:search'))
+
+
+def is_profile_requested(request):
+    """Профиль по запросу: параметр или заголовок, только для сотрудников"""
+    requested = request.GET.get(PROFILE_TRIGGER_PARAMETER) or request.headers.get(PROFILE_TRIGGER_HEADER)
+    return bool(requested) and requested != '0' and request.user.is_staff
+
+
+def profile_path(name, extension):
+    if not _PROFILE_NAME_RE.match(name):
+        raise ValueError(f'Недопустимое имя профиля: {name}')
+    return os.path.join(get_profile_dir(), f'{name}.{extension}')
+
+
+def _write_file(directory, path, content):
+    # Через временный файл: список профилей не увидит недописанный файл
+    descriptor, temporary = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(descriptor, 'wb') as stream:
+        stream.write(content)
+    os.replace(temporary, path)
+
+
+def save_profile(profiler, info):
+    """Сохраняет профиль и описание (URL, представление, длительность). Возвращает имя профиля"""
+    directory = get_profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    name = f'{time.time_ns()}-{uuid.uuid4().hex[:8]}'
+
+    # Профиль пишется во временный файл: pstats сохраняет только по имени файла
+    descriptor, temporary = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    os.close(descriptor)
+    try:
+        profiler.dump_stats(temporary)
+        os.replace(temporary, profile_path(name, 'prof'))
+    except BaseException:
+        os.remove(temporary)
+        raise
+    _write_file(directory, profile_path(name, 'json'), json.dumps(info, ensure_ascii=False).encode('utf-8'))
+
+    prune_profiles()
+    return name
+
+
+def list_profiles():
+    """Описания сохраненных профилей, от новых к старым"""
+    profiles = []
+    try:
+        entries = list(os.scandir(get_profile_dir()))
+    except FileNotFoundError:
+        return profiles
+    for entry in entries:
+        name, extension = os.path.splitext(entry.name)
+        if extension != '.json' or not _PROFILE_NAME_RE.match(name):
+            continue
+        try:
+            with open(entry.path, encoding='utf-8') as stream:
+                info = json.load(stream)
+            size = os.path.getsize(profile_path(name, 'prof'))
+        except (OSError, ValueError):
+            continue
+        profiles.append({**info, 'name': name, 'size': size})
+    profiles.sort(key=lambda profile: profile['name'], reverse=True)
+    return profiles
+
+
+def prune_profiles(max_files=None):
+    """Удаляет старые профили сверх max_files. Возвращает число удаленных"""
+    max_files = get_max_files() if max_files is None else max_files
+    directory = get_profile_dir()
+    try:
+        names = sorted(
+            {os.path.splitext(entry.name)[0] for entry in os.scandir(directory)
+             if _PROFILE_NAME_RE.match(os.path.splitext(entry.name)[0])},
+            # Время создания в начале имени, сравнивается как число
+            key=lambda name: int(name.split('-')[0])
+        )
+    except FileNotFoundError:
+        return 0
+
+    removed = 0
+    for name in names[:max(len(names) - max_files, 0)]:
+        for extension in ('json', 'prof'):
+            try:
+                os.remove(profile_path(name, extension))
+            except FileNotFoundError:
+                pass
+        removed += 1
+    return removed
+
+
+def profile_summary(name, limit=40):
+    """Текстовая сводка профиля: функции с наибольшим суммарным временем"""
+    stream = io.StringIO()
+    stats = pstats.Stats(profile_path(name, 'prof'), stream=stream)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(limit)
+    return stream.getvalue()
+
+
+class ProfilingMiddleware:
+    """
+    Профилирование запросов (включается PROFILING_ENABLED). Ставится последним
+    в MIDDLEWARE: профиль включает представление и рендеринг шаблона ответа,
+    но не остальные промежуточные слои. Работает и в асинхронной цепочке (ASGI):
+    process_view Django вызывает в потоке, там же выполняется синхронное представление.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not profiling_enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        self.sample_rate = get_sample_rate()
+        self.views = set(get_profiled_views())
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        return await self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Асинхронные представления cProfile не замеряет корректно
+        if iscoroutinefunction(view_func):
+            return None
+        view_name = request.resolver_match.view_name
+        if is_profile_requested(request):
+            trigger = 'request'
+        elif view_name in self.views and self.sample_rate and random.random() < self.sample_rate:
+            trigger = 'sample'
+        else:
+            return None
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # С Python 3.12 профилировщик в процессе один: пока снимается
+            # профиль другого запроса, этот выполняется без профиля
+            return None
+
+        response = None
+        error = None
+        started = time.perf_counter()
+        try:
+            response = self._render(request, view_func, view_args, view_kwargs)
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            profiler.disable()
+            duration = time.perf_counter() - started
+            name = self._save(profiler, {
+                'time': timezone.now().isoformat(),
+                'method': request.method,
+                'path': request.get_full_path(),
+                'view': view_name,
+                'status': response.status_code if response is not None else None,
+                'error': error,
+                'duration_ms': round(duration * 1000, 2),
+                'trigger': trigger,
+                'user': request.user.username if request.user.is_authenticated else None,
+            })
+
+        if name and trigger == 'request':
+            response['X-Profile-Id'] = name
+        return response
+
+    @staticmethod
+    def _save(profiler, info):
+        # Ошибка записи профиля не должна ломать ответ
+        try:
+            return save_profile(profiler, info)
+        except OSError:
+            logger.exception('Не удалось сохранить профиль запроса %s', info['path'])
+            return None
+
+    @staticmethod
+    def _render(request, view_func, view_args, view_kwargs):
+        response = view_func(request, *view_args, **view_kwargs)
+        # TemplateResponse рендерится после промежуточных слоев - рендерим внутри профиля
+        if hasattr(response, 'render') and callable(response.render):
+            response = response.render()
+        return response
@@ -0,0 +1,180 @@
+import re
+import tempfile
+from collections import Counter
+
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.test.runner import DiscoverRunner
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from .benchmark import BENCHMARKS, CorpusGenerator
+from .version_storage import content_cache
+
+
+# Бюджет SQL-запросов страниц: максимальное количество запросов на один GET
+# (вместе с чтением сессии и пользователя). Проверяется тестами docs/tests.py
+# на двух размерах корпуса: количество не должно зависеть от объема данных.
+# Увеличивать бюджет - только осознанно, вместе с изменением страницы.
+QUERY_BUDGETS = {
+    'docs:article_list': 3,
+    'docs:article_detail': 7,
+    'docs:search': 2,
+    'docs:tag_cloud': 2,
+    'docs:tag_articles': 3,
+    'docs:category_articles': 3,
+    'docs:comment_tree': 3,
+    'docs:version_list': 6,
+    'docs:version_detail': 4,
+    'docs:compare_versions': 6,
+    'docs:user_dashboard': 6,
+    'docs:export_article': 5,
+    'admin:docs_article_changelist': 8,
+    'admin:docs_comment_changelist': 4,
+    'admin:docs_rating_changelist': 4,
+    'admin:docs_favorite_changelist': 4,
+    'admin:docs_tag_changelist': 5,
+    'admin:docs_category_changelist': 6,
+    'admin:auth_user_changelist': 5,
+}
+
+# Размеры корпуса для проверки: второй в несколько раз больше первого
+QUERY_BUDGET_SCALES = (
+    {'articles': 6, 'versions': 3, 'comments': 6, 'ratings': 5, 'users': 12, 'tags': 8,
+     'tags_per_article': 2, 'category_depth': 3, 'category_breadth': 2},
+    # Больше страницы списков (12 статей) и списка версий (10): замеряются и постраничные выборки
+    {'articles': 48, 'versions': 12, 'comments': 18, 'ratings': 10, 'users': 30, 'tags': 16,
+     'tags_per_article': 5, 'category_depth': 4, 'category_breadth': 2},
+)
+
+ANONYMOUS = 'anonymous'
+MEMBER = 'member'
+STAFF = 'staff'
+
+# URL страницы по описанию корпуса и пользователь, от имени которого она запрашивается
+QUERY_BUDGET_PAGES = {
+    f'docs:{name}': (build_url, MEMBER if login else ANONYMOUS)
+    for name, (build_url, login) in BENCHMARKS.items()
+}
+QUERY_BUDGET_PAGES.update({
+    url_name: (lambda corpus, url_name=url_name: reverse(url_name), STAFF)
+    for url_name in QUERY_BUDGETS if url_name.startswith('admin:')
+})
+
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r'\((?:\s*\?\s*,)+\s*\?\s*\)')
+
+
+def sql_template(sql):
+    """SQL без значений: строки и числа заменены на ?, списки IN (...) свернуты"""
+    return _IN_LIST_RE.sub('(?...)', _LITERAL_RE.sub('?', sql))
+
+
+def duplicated_templates(queries):
+    """Повторяющиеся шаблоны запросов - признак N+1: [(количество, шаблон)] по убыванию"""
+    counts = Counter(sql_template(query['sql']) for query in queries)
+    return sorted(((count, template) for template, count in counts.items() if count > 1), reverse=True)
+
+
+class PageQueries:
+    """Запросы одной страницы: количество и повторяющиеся шаблоны"""
+
+    def __init__(self, url_name, url, status, queries):
+        self.url_name = url_name
+        self.url = url
+        self.status = status
+        self.count = len(queries)
+        self.duplicates = duplicated_templates(queries)
+        self.budget = QUERY_BUDGETS.get(url_name)
+
+    def describe(self, limit=5):
+        lines = [f'{self.url_name} ({self.url}): {self.count} запросов, бюджет {self.budget}']
+        for count, template in self.duplicates[:limit]:
+            lines.append(f'    {count} x {template[:300]}')
+        return '\n'.join(lines)
+
+
+def reset_caches():
+    """Кэши между замерами: результат не должен зависеть от предыдущего корпуса"""
+    for cache in caches.all():
+        cache.clear()
+    content_cache.clear()
+
+
+def measure_page(client, url_name, url):
+    # Первый запрос заполняет кэши (боковая панель, HTML версий), замеряется второй
+    client.get(url)
+    connection.queries_log.clear()
+    with CaptureQueriesContext(connection) as captured:
+        response = client.get(url)
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+    return PageQueries(url_name, url, response.status_code, captured.captured_queries)
+
+
+def measure_pages(clients, scale, seed=1, url_names=None):
+    """
+    Создает корпус размера scale, замеряет страницы и откатывает изменения.
+    clients - {ANONYMOUS|MEMBER|STAFF: тестовый клиент}, MEMBER входит
+    как основной автор корпуса. Возвращает {имя URL: PageQueries}.
+    """
+    from django.contrib.auth.models import User
+
+    results = {}
+    reset_caches()
+    # Файлы экспорта - во временном каталоге, а не в кэше экспорта проекта
+    with tempfile.TemporaryDirectory() as export_dir, override_settings(EXPORT_CACHE_DIR=export_dir), \
+            transaction.atomic():
+        corpus = CorpusGenerator(seed=seed, **scale).generate()
+        clients[MEMBER].force_login(User.objects.get(username=corpus['author']))
+        for url_name, (build_url, who) in QUERY_BUDGET_PAGES.items():
+            if url_names and url_name not in url_names:
+                continue
+            results[url_name] = measure_page(clients[who], url_name, build_url(corpus))
+        transaction.set_rollback(True)
+    reset_caches()
+    return results
+
+
+# Результаты проверок для отчета QueryBudgetRunner: {имя URL: [PageQueries по размерам]}
+collected = {}
+
+
+class QueryBudgetRunner(DiscoverRunner):
+    """
+    Тестовый раннер проекта. С --query-budgets выполняет только проверки
+    бюджета запросов (тег query_budget) и печатает отчет: количество запросов
+    на каждом размере корпуса и повторяющиеся шаблоны SQL.
+    """
+
+    def __init__(self, query_budgets=False, **kwargs):
+        if query_budgets:
+            kwargs['tags'] = list(kwargs.get('tags') or []) + ['query_budget']
+        super().__init__(**kwargs)
+        self.query_budgets = query_budgets
+
+    @classmethod
+    def add_arguments(cls, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--query-budgets', action='store_true',
+                            help='Только проверки бюджета SQL-запросов страниц, с отчетом')
+
+    def run_suite(self, suite, **kwargs):
+        result = super().run_suite(suite, **kwargs)
+        if self.query_budgets:
+            self.print_report()
+        return result
+
+    def print_report(self):
+        print('\nБюджет запросов (размеры корпуса: ' + ' / '.join(
+            str(scale['articles']) for scale in QUERY_BUDGET_SCALES) + ' статей)')
+        for url_name in QUERY_BUDGETS:
+            pages = collected.get(url_name)
+            if not pages:
+                continue
+            counts = ' / '.join(str(page.count) for page in pages)
+            mark = 'OK' if all(page.count <= page.budget for page in pages) else 'ПРЕВЫШЕН'
+            print(f'{url_name:<34} {counts:>9}  бюджет {QUERY_BUDGETS[url_name]:<3} {mark}')
+            for count, template in pages[-1].duplicates[:3]:
+                print(f'    {count} x {template[:160]}')
@@ -0,0 +1,395 @@
+import logging
+import math
+import threading
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.db.models import Count, F, Q
+
+from .models import Article, ArticleTerm, ArticleTermSet, RelatedArticle, TermFrequency
+from .search import index_terms
+from .conditional import touch_articles
+
+
+# Похожие статьи: сходство текста (косинус векторов TF-IDF текущих версий)
+# и пересечение тегов (коэффициент Жаккара). Для каждой опубликованной статьи
+# в RelatedArticle хранится RELATED_STORED лучших соседей, страница статьи
+# читает их одним индексным запросом.
+RELATED_TEXT_WEIGHT = 0.6
+RELATED_TAG_WEIGHT = 0.4
+RELATED_STORED = 10
+RELATED_CANDIDATES = 50
+# Сколько самых весомых терминов статьи хранится в ArticleTerm
+RELATED_MAX_TERMS = 100
+# Термины, встречающиеся больше чем в этой доле статей, не различают статьи
+RELATED_MAX_DF_RATIO = 0.5
+
+logger = logging.getLogger('docs.related')
+
+_TAGS = Article.tags.through
+
+
+def _published():
+    return Article.objects.filter(status='published', current_version__isnull=False)
+
+
+def _document_terms(version):
+    # Заголовок учитывается дважды: он точнее всего описывает тему статьи
+    text = '\n'.join([version.title, version.title, version.excerpt, version.content])
+    return Counter(index_terms(text))
+
+
+def _idf(total, df):
+    return math.log((1 + total) / (1 + df)) + 1
+
+
+def _weigh(counts, document_frequency, total):
+    """Нормированный вектор TF-IDF из RELATED_MAX_TERMS самых весомых терминов"""
+    max_df = max(total * RELATED_MAX_DF_RATIO, 2)
+    weights = {
+        term: (1 + math.log(tf)) * _idf(total, document_frequency.get(term, 0))
+        for term, tf in counts.items()
+        if document_frequency.get(term, 0) <= max_df
+    }
+    top = sorted(weights.items(), key=lambda item: item[1], reverse=True)[:RELATED_MAX_TERMS]
+    norm = math.sqrt(sum(weight * weight for _, weight in top)) or 1.0
+    return {term: weight / norm for term, weight in top}
+
+
+def _rank(article_id, text_scores, tags, candidate_tags, eligible):
+    """Итоговый список [(id, сходство)] из сходства текста и тегов"""
+    scores = []
+    for candidate in set(text_scores) | set(candidate_tags):
+        if candidate == article_id or candidate not in eligible:
+            continue
+        other_tags = candidate_tags.get(candidate, set())
+        union = len(tags | other_tags)
+        jaccard = len(tags & other_tags) / union if union else 0.0
+        score = RELATED_TEXT_WEIGHT * text_scores.get(candidate, 0.0) + RELATED_TAG_WEIGHT * jaccard
+        if score > 0:
+            scores.append((candidate, score))
+    scores.sort(key=lambda item: (-item[1], item[0]))
+    return scores[:RELATED_STORED]
+
+
+def _save_related(results):
+    """results - {id статьи: [(id похожей, сходство)]}"""
+    RelatedArticle.objects.filter(article_id__in=list(results)).delete()
+    RelatedArticle.objects.bulk_create([
+        RelatedArticle(article_id=article_id, related_id=related_id, score=score)
+        for article_id, related in results.items()
+        for related_id, score in related
+    ], batch_size=500)
+
+
+# Документные частоты: TermFrequency - количество опубликованных статей
+# с термином, ArticleTermSet - полный набор терминов каждой статьи (по нему
+# частоты уменьшаются при изменении или снятии статьи с публикации).
+# Частоты считаются по тем же полным наборам, что и в rebuild_related,
+# поэтому пересчет неизмененной статьи дает тот же вектор.
+
+def _adjust_frequencies(terms, delta):
+    terms = sorted(terms)
+    for start in range(0, len(terms), 500):
+        batch = terms[start:start + 500]
+        if delta > 0:
+            TermFrequency.objects.bulk_create(
+                [TermFrequency(term=term) for term in batch], ignore_conflicts=True
+            )
+        TermFrequency.objects.filter(term__in=batch).update(document_count=F('document_count') + delta)
+    if delta < 0:
+        TermFrequency.objects.filter(document_count__lte=0).delete()
+
+
+def _store_term_set(article_id, terms):
+    """Заменяет набор терминов статьи (None - статья вне корпуса) и обновляет частоты"""
+    previous = ArticleTermSet.objects.filter(article_id=article_id).values_list('terms', flat=True).first()
+    previous = set(previous.split()) if previous else set()
+    terms = terms or set()
+
+    _adjust_frequencies(previous - terms, -1)
+    _adjust_frequencies(terms - previous, 1)
+    if terms:
+        ArticleTermSet.objects.update_or_create(article_id=article_id, defaults={'terms': ' '.join(sorted(terms))})
+    else:
+        ArticleTermSet.objects.filter(article_id=article_id).delete()
+
+
+def forget_article_terms(article_id):
+    """Убирает термины удаляемой статьи из документных частот"""
+    _store_term_set(article_id, None)
+
+
+# Инкрементальное обновление
+
+def index_article_terms(article):
+    """Пересчитывает вектор статьи; для неопубликованных удаляет его"""
+    ArticleTerm.objects.filter(article_id=article.id).delete()
+    if article.status != 'published' or article.current_version is None:
+        _store_term_set(article.id, None)
+        return
+
+    counts = _document_terms(article.current_version)
+    _store_term_set(article.id, set(counts))
+    document_frequency = dict(
+        TermFrequency.objects.filter(term__in=list(counts)).values_list('term', 'document_count')
+    )
+    vector = _weigh(counts, document_frequency, _published().count())
+    ArticleTerm.objects.bulk_create(
+        [ArticleTerm(article_id=article.id, term=term, weight=weight) for term, weight in vector.items()],
+        batch_size=500
+    )
+
+
+def _text_scores(article_id):
+    """Косинусное сходство с другими статьями через общие термины (SQL)"""
+    table = ArticleTerm._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT other.article_id, SUM(own.weight * other.weight) AS score '
+            f'FROM {table} own JOIN {table} other '
+            f'ON other.term = own.term AND other.article_id <> own.article_id '
+            f'WHERE own.article_id = %s '
+            f'GROUP BY other.article_id ORDER BY score DESC LIMIT %s',
+            [article_id, RELATED_CANDIDATES]
+        )
+        return dict(cursor.fetchall())
+
+
+def _tag_sets(article_ids):
+    """Теги статей: {id статьи: множество id тегов}. article_ids - список или подзапрос"""
+    tag_sets = defaultdict(set)
+    for article_id, tag_id in _TAGS.objects.filter(article_id__in=article_ids).values_list('article_id', 'tag_id'):
+        tag_sets[article_id].add(tag_id)
+    return tag_sets
+
+
+def compute_related(article_id):
+    """Лучшие соседи одной статьи по данным ArticleTerm и тегам"""
+    text_scores = _text_scores(article_id)
+    tags = _tag_sets([article_id]).get(article_id, set())
+
+    tag_candidates = []
+    if tags:
+        tag_candidates = list(
+            _TAGS.objects.filter(tag_id__in=tags).exclude(article_id=article_id).values(
+                'article_id'
+            ).annotate(shared=Count('id')).order_by('-shared').values_list(
+                'article_id', flat=True
+            )[:RELATED_CANDIDATES]
+        )
+
+    candidates = set(text_scores) | set(tag_candidates)
+    eligible = set(_published().filter(id__in=candidates).values_list('id', flat=True))
+    return _rank(article_id, text_scores, tags, _tag_sets(candidates), eligible)
+
+
+def update_related(article_ids, neighbours=True):
+    """
+    Обновляет похожие статьи после изменения текста, тегов или статуса статей.
+    Пересчитываются сами статьи, а при neighbours=True - и их соседи
+    (см. update_neighbours).
+    """
+    article_ids = set(article_ids)
+    if not article_ids:
+        return
+
+    for article in Article.objects.filter(id__in=article_ids).select_related('current_version'):
+        index_article_terms(article)
+
+    published = set(_published().filter(id__in=article_ids).values_list('id', flat=True))
+    results = {article_id: compute_related(article_id) for article_id in published}
+    RelatedArticle.objects.filter(article_id__in=article_ids - published).delete()
+    _save_related(results)
+    touch_articles(article_ids)
+
+    if neighbours:
+        update_neighbours(article_ids)
+
+
+def update_neighbours(article_ids):
+    """
+    Пересчитывает статьи, в чьих списках были изменённые статьи,
+    и их новых соседей (чтобы изменённая статья могла попасть в их списки).
+    """
+    article_ids = set(article_ids)
+    affected = set()
+    for article_id, related_id in RelatedArticle.objects.filter(
+        Q(related_id__in=article_ids) | Q(article_id__in=article_ids)
+    ).values_list('article_id', 'related_id'):
+        affected.update((article_id, related_id))
+    affected -= article_ids
+
+    results = {article_id: compute_related(article_id) for article_id in affected}
+    # Транзакция только на запись: фоновый поток не держит блокировку во время расчета
+    with transaction.atomic():
+        _save_related(results)
+    # Блок похожих статей на их страницах изменился
+    touch_articles(set(results))
+
+
+# Соседи пересчитываются в фоновом потоке, чтобы не задерживать ответ
+# на сохранение статьи. Задания выполняются по одному в порядке поступления.
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _in_background():
+    return getattr(settings, 'RELATED_UPDATE_IN_BACKGROUND', True)
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='related')
+        return _executor
+
+
+def _update_neighbours_task(article_ids):
+    try:
+        update_neighbours(article_ids)
+    except Exception:
+        logger.exception('Не удалось обновить соседей статей %s', sorted(article_ids))
+    finally:
+        # Соединения потока с базой закрываются после каждого задания
+        connections.close_all()
+
+
+def wait_for_related_updates():
+    """Дожидается выполнения отложенных пересчетов (для команд и тестов)"""
+    if _executor is not None:
+        _get_executor().submit(lambda: None).result()
+
+
+_pending = threading.local()
+
+
+def _run_pending():
+    ids = getattr(_pending, 'ids', None)
+    _pending.ids = set()
+    if not ids:
+        return
+    if _in_background():
+        update_related(ids, neighbours=False)
+        _get_executor().submit(_update_neighbours_task, ids)
+    else:
+        update_related(ids)
+
+
+def schedule_related_update(article_ids):
+    """
+    Откладывает update_related до фиксации транзакции. Все изменения
+    транзакции обрабатываются одним обработчиком. Если обработчика нет в
+    очереди on_commit соединения (транзакция откатилась или уже завершена),
+    накопленные id устарели и отбрасываются.
+    """
+    connection = transaction.get_connection()
+    if any(func is _run_pending for _, func, _ in connection.run_on_commit):
+        _pending.ids.update(article_ids)
+    else:
+        _pending.ids = set(article_ids)
+        transaction.on_commit(_run_pending)
+
+
+def get_related_articles(article, limit=4):
+    """
+    Похожие опубликованные статьи из RelatedArticle - один индексный запрос.
+    Пока индекс для статьи не построен - статьи той же категории.
+    """
+    links = RelatedArticle.objects.filter(
+        article=article,
+        related__status='published',
+        related__current_version__isnull=False
+    ).select_related('related__author', 'related__category').order_by('-score')[:limit]
+    related = [link.related for link in links]
+    if related:
+        return related
+    return list(
+        _published().filter(category_id=article.category_id).exclude(
+            id=article.id
+        ).select_related('author', 'category').order_by('-created_at')[:limit]
+    )
+
+
+# Полная перестройка
+
+def rebuild_related(batch_size=500):
+    """
+    Перестраивает векторы и списки похожих статей для всех опубликованных статей.
+    Частоты терминов считаются по всему корпусу, сходство - пакетами
+    по инвертированному индексу в памяти. Возвращает количество статей.
+    """
+    ids = list(_published().order_by('id').values_list('id', flat=True))
+    total = len(ids)
+
+    # Проход 1: частоты терминов в статьях и документные частоты корпуса
+    counts = {}
+    document_frequency = Counter()
+    for start in range(0, total, batch_size):
+        batch = _published().filter(id__in=ids[start:start + batch_size]).select_related('current_version')
+        for article in batch:
+            counts[article.id] = _document_terms(article.current_version)
+            document_frequency.update(counts[article.id].keys())
+
+    # Проход 2: векторы TF-IDF и инвертированный индекс
+    vectors = {}
+    term_sets = {}
+    postings = defaultdict(list)
+    for article_id in ids:
+        article_counts = counts.pop(article_id)
+        term_sets[article_id] = ' '.join(sorted(article_counts))
+        vectors[article_id] = _weigh(article_counts, document_frequency, total)
+        for term, weight in vectors[article_id].items():
+            postings[term].append((article_id, weight))
+
+    with transaction.atomic():
+        ArticleTerm.objects.all().delete()
+        ArticleTerm.objects.bulk_create((
+            ArticleTerm(article_id=article_id, term=term, weight=weight)
+            for article_id, vector in vectors.items()
+            for term, weight in vector.items()
+        ), batch_size=batch_size)
+        ArticleTermSet.objects.all().delete()
+        ArticleTermSet.objects.bulk_create((
+            ArticleTermSet(article_id=article_id, terms=terms) for article_id, terms in term_sets.items() if terms
+        ), batch_size=batch_size)
+        TermFrequency.objects.all().delete()
+        TermFrequency.objects.bulk_create((
+            TermFrequency(term=term, document_count=df) for term, df in document_frequency.items()
+        ), batch_size=batch_size)
+
+    # Теги всех статей и обратный индекс тег -> статьи. Подзапрос вместо
+    # списка id: число параметров запроса в SQLite ограничено
+    tag_sets = _tag_sets(_published().values('id'))
+    tag_postings = defaultdict(set)
+    for article_id, tags in tag_sets.items():
+        for tag_id in tags:
+            tag_postings[tag_id].add(article_id)
+
+    eligible = set(ids)
+    for start in range(0, total, batch_size):
+        results = {}
+        for article_id in ids[start:start + batch_size]:
+            text_scores = defaultdict(float)
+            for term, weight in vectors[article_id].items():
+                for other_id, other_weight in postings[term]:
+                    if other_id != article_id:
+                        text_scores[other_id] += weight * other_weight
+
+            tags = tag_sets.get(article_id, set())
+            candidates = set(text_scores)
+            for tag_id in tags:
+                candidates |= tag_postings[tag_id]
+            results[article_id] = _rank(
+                article_id, text_scores, tags,
+                {candidate: tag_sets.get(candidate, set()) for candidate in candidates},
+                eligible
+            )
+        with transaction.atomic():
+            _save_related(results)
+
+    RelatedArticle.objects.exclude(article_id__in=_published().values('id')).delete()
+    return total
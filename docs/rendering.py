@@ -0,0 +1,85 @@
+import hashlib
+import threading
+
+import markdown
+import pygments
+from markdown.extensions.fenced_code import FencedCodeExtension
+from markdown.extensions.codehilite import CodeHiliteExtension
+
+from .instrumentation import timed
+
+
+# Набор расширений Markdown: (имя, класс, параметры).
+# Любое изменение этого списка меняет ключ рендерера, поэтому
+# сохраненный HTML всех версий автоматически перестраивается при чтении.
+MARKDOWN_EXTENSIONS = [
+    ('fenced_code', FencedCodeExtension, {}),
+    ('codehilite', CodeHiliteExtension, {'css_class': 'codehilite', 'linenums': False}),
+]
+MARKDOWN_OUTPUT_FORMAT = 'html5'
+
+_local = threading.local()
+_renderer_key = None
+
+
+def get_renderer_key():
+    """Ключ конфигурации рендерера (расширения, их параметры и версии библиотек)"""
+    global _renderer_key
+    if _renderer_key is None:
+        config = repr([
+            (name, extension.__module__, extension.__name__, sorted(params.items()))
+            for name, extension, params in MARKDOWN_EXTENSIONS
+        ])
+        signature = f'{config}|{MARKDOWN_OUTPUT_FORMAT}|{markdown.__version__}|{pygments.__version__}'
+        _renderer_key = hashlib.sha1(signature.encode('utf-8')).hexdigest()
+    return _renderer_key
+
+
+def _get_markdown():
+    """Экземпляр Markdown для текущего потока (создается один раз)"""
+    md = getattr(_local, 'markdown', None)
+    if md is None:
+        md = markdown.Markdown(
+            extensions=[extension(**params) for name, extension, params in MARKDOWN_EXTENSIONS],
+            output_format=MARKDOWN_OUTPUT_FORMAT
+        )
+        _local.markdown = md
+    return md
+
+
+def render_markdown(text):
+    """Конвертирует Markdown в HTML"""
+    with timed('markdown'):
+        return _get_markdown().reset().convert(text)
+
+
+def store_version_html(version):
+    """Рендерит версию и сохраняет HTML в хранилище"""
+    from .models import RenderedVersion
+
+    key = get_renderer_key()
+    html = render_markdown(version.content)
+
+    RenderedVersion.objects.update_or_create(
+        version_id=version.pk,
+        renderer_key=key,
+        defaults={'html': html}
+    )
+    # HTML, построенный прежней конфигурацией расширений, больше не нужен
+    RenderedVersion.objects.filter(version_id=version.pk).exclude(renderer_key=key).delete()
+
+    return html
+
+
+def get_version_html(version):
+    """Возвращает HTML версии из хранилища, при необходимости рендерит заново"""
+    from .models import RenderedVersion
+
+    html = RenderedVersion.objects.filter(
+        version_id=version.pk,
+        renderer_key=get_renderer_key()
+    ).values_list('html', flat=True).first()
+
+    if html is None:
+        html = store_version_html(version)
+    return html
@@ -0,0 +1,345 @@
+import re
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+
+SEARCH_TABLE = 'docs_article_fts'
+
+# Вес колонок для ранжирования BM25: заголовок, описание, содержание
+SEARCH_WEIGHTS = (10.0, 5.0, 1.0)
+
+# Маркеры подсветки в сниппете (заменяются на <mark> после экранирования)
+_MARK_START = '\x02'
+_MARK_END = '\x03'
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+_CYRILLIC_RE = re.compile('[а-яё]')
+
+
+# Стеммер Snowball для русского языка
+
+_VOWELS = 'аеиоуыэюя'
+
+_PERFECTIVE_GERUND = (('в', 'вши', 'вшись'),
+                      ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'))
+_ADJECTIVE = ((), ('ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем', 'им',
+                   'ым', 'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю', 'ая', 'яя',
+                   'ою', 'ею'))
+_PARTICIPLE = (('ем', 'нн', 'вш', 'ющ', 'щ'),
+               ('ивш', 'ывш', 'ующ'))
+_REFLEXIVE = ((), ('ся', 'сь'))
+_VERB = (('ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но', 'ет', 'ют', 'ны',
+          'ть', 'ешь', 'нно'),
+         ('ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй', 'ил', 'ыл', 'им',
+          'ым', 'ен', 'ило', 'ыло', 'ено', 'ят', 'ует', 'уют', 'ит', 'ыт', 'ены', 'ить', 'ыть',
+          'ишь', 'ую', 'ю'))
+_NOUN = ((), ('а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии', 'и', 'ией',
+              'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам', 'ом', 'о', 'у', 'ах', 'иях',
+              'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия', 'ья', 'я'))
+_SUPERLATIVE = ((), ('ейше', 'ейш'))
+_DERIVATIONAL = ('ость', 'ост')
+
+
+def _regions(word):
+    """Позиции начала областей RV и R2"""
+    rv = r1 = r2 = len(word)
+    for i, char in enumerate(word):
+        if char in _VOWELS:
+            rv = i + 1
+            break
+    for i in range(1, len(word)):
+        if word[i] not in _VOWELS and word[i - 1] in _VOWELS:
+            r1 = i + 1
+            break
+    for i in range(r1 + 1, len(word)):
+        if word[i] not in _VOWELS and word[i - 1] in _VOWELS:
+            r2 = i + 1
+            break
+    return rv, r2
+
+
+def _strip(part, endings):
+    """Удаляет самое длинное окончание из группы, None если окончания нет"""
+    preceded, plain = endings
+    best = None
+    for suffix in preceded + plain:
+        if part.endswith(suffix) and (best is None or len(suffix) > len(best)):
+            best = suffix
+    if best is None:
+        return None
+    rest = part[:-len(best)]
+    # Окончания первой группы удаляются только после «а» или «я»
+    if best in preceded and not rest.endswith(('а', 'я')):
+        return None
+    return rest
+
+
+def _strip_adjectival(part):
+    rest = _strip(part, _ADJECTIVE)
+    if rest is None:
+        return None
+    without_participle = _strip(rest, _PARTICIPLE)
+    return rest if without_participle is None else without_participle
+
+
+def stem(word):
+    """Возвращает основу русского слова (алгоритм Snowball)"""
+    word = word.lower().replace('ё', 'е')
+    rv, r2 = _regions(word)
+    prefix, part = word[:rv], word[rv:]
+
+    # Шаг 1: деепричастия, возвратные, прилагательные, глаголы, существительные
+    rest = _strip(part, _PERFECTIVE_GERUND)
+    if rest is None:
+        part = _strip(part, _REFLEXIVE) or part
+        for strip in (_strip_adjectival,
+                      lambda p: _strip(p, _VERB),
+                      lambda p: _strip(p, _NOUN)):
+            rest = strip(part)
+            if rest is not None:
+                part = rest
+                break
+    else:
+        part = rest
+
+    # Шаг 2
+    if part.endswith('и'):
+        part = part[:-1]
+
+    # Шаг 3: словообразовательные суффиксы в области R2
+    for suffix in _DERIVATIONAL:
+        if part.endswith(suffix) and len(prefix) + len(part) - len(suffix) >= r2:
+            part = part[:-len(suffix)]
+            break
+
+    # Шаг 4
+    if part.endswith('нн'):
+        part = part[:-1]
+    else:
+        rest = _strip(part, _SUPERLATIVE)
+        if rest is not None:
+            part = rest[:-1] if rest.endswith('нн') else rest
+        elif part.endswith('ь'):
+            part = part[:-1]
+
+    return prefix + part
+
+
+def index_terms(text):
+    """Нормализованные термины текста: основы русских слов и прочие слова длиннее двух символов"""
+    terms = []
+    for word in _WORD_RE.findall(text.lower()):
+        if len(word) < 3 or word.isdigit():
+            continue
+        if _CYRILLIC_RE.search(word) and len(word) > 3:
+            word = stem(word)
+        terms.append(word[:64])
+    return terms
+
+
+def build_match_query(query):
+    """Строит выражение MATCH для FTS5: основы слов ищутся как префиксы"""
+    terms = []
+    for word in _WORD_RE.findall(query.lower()):
+        if _CYRILLIC_RE.search(word) and len(word) > 3:
+            word = stem(word)
+        terms.append(f'"{word}"*')
+    return ' '.join(terms)
+
+
+# Поисковый индекс
+
+_index_available = {}
+
+
+def search_index_available():
+    """Поддерживает ли текущая база полнотекстовый индекс"""
+    alias = connection.alias
+    if alias not in _index_available:
+        available = False
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s",
+                    [SEARCH_TABLE]
+                )
+                available = cursor.fetchone() is not None
+        _index_available[alias] = available
+    return _index_available[alias]
+
+
+def index_articles(article_ids):
+    """Обновляет строки индекса для статей (заголовок, описание и текст текущей версии)"""
+    from .models import Article
+
+    if not search_index_available():
+        return
+
+    articles = Article.objects.filter(id__in=article_ids).select_related('current_version')
+    indexed = set()
+    with connection.cursor() as cursor:
+        for article in articles:
+            version = article.current_version
+            if version is None:
+                continue
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [article.id])
+            cursor.execute(
+                f'INSERT INTO {SEARCH_TABLE} (rowid, title, excerpt, content) VALUES (%s, %s, %s, %s)',
+                [article.id, version.title, version.excerpt, version.content]
+            )
+            indexed.add(article.id)
+
+        # Статьи без текущей версии и удаленные статьи убираем из индекса
+        for article_id in set(article_ids) - indexed:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [article_id])
+
+
+def remove_articles(article_ids):
+    """Удаляет статьи из индекса"""
+    if not search_index_available():
+        return
+    with connection.cursor() as cursor:
+        for article_id in article_ids:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [article_id])
+
+
+def rebuild_index(batch_size=500):
+    """Полностью перестраивает индекс, возвращает количество статей"""
+    from .models import Article
+
+    if not search_index_available():
+        return 0
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+
+    ids = []
+    total = 0
+    for article_id in Article.objects.filter(
+            current_version__isnull=False
+    ).values_list('id', flat=True).order_by('id').iterator(chunk_size=batch_size):
+        ids.append(article_id)
+        if len(ids) >= batch_size:
+            index_articles(ids)
+            total += len(ids)
+            ids = []
+    if ids:
+        index_articles(ids)
+        total += len(ids)
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')")
+    return total
+
+
+def matching_articles_sql(query):
+    """
+    Подзапрос id статей (любого статуса), совпадающих с запросом, для filter(pk__in=...).
+    None, если индекса нет или в запросе нет слов.
+    """
+    match = build_match_query(query)
+    if not match or not search_index_available():
+        return None
+    return RawSQL(f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s', [match])
+
+
+def _highlight(snippet):
+    """Экранирует сниппет и превращает маркеры в <mark>"""
+    return mark_safe(
+        escape(snippet).replace(_MARK_START, '<mark>').replace(_MARK_END, '</mark>')
+    )
+
+
+class SearchResults:
+    """
+    Ленивый результат полнотекстового поиска, упорядоченный по BM25.
+    Поддерживает count() и срезы (стандартный Paginator) и keyset() (CursorPaginator).
+    """
+
+    def __init__(self, query):
+        self.query = query
+        self.match = build_match_query(query)
+        self._count = None
+
+    def _where(self):
+        return (
+            f'FROM {SEARCH_TABLE} '
+            f'JOIN docs_article a ON a.id = {SEARCH_TABLE}.rowid '
+            f'WHERE {SEARCH_TABLE} MATCH %s '
+            f"AND a.status = 'published' AND a.current_version_id IS NOT NULL"
+        )
+
+    def count(self):
+        if self._count is None:
+            if not self.match:
+                self._count = 0
+            else:
+                with connection.cursor() as cursor:
+                    cursor.execute(f'SELECT COUNT(*) {self._where()}', [self.match])
+                    self._count = cursor.fetchone()[0]
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start = key.start or 0
+            limit = -1 if key.stop is None else max(key.stop - start, 0)
+            return self._fetch(limit, start)
+        results = self._fetch(1, key)
+        if not results:
+            raise IndexError(key)
+        return results[0]
+
+    @property
+    def count_cache_key(self):
+        return f'search:{self.match}'
+
+    def keyset(self, values, reverse, limit):
+        """
+        Страница по ключу (search_rank, id) для CursorPaginator:
+        строки строго после values в порядке ранжирования (reverse - в обратном).
+        """
+        condition, params = '', []
+        if values is not None:
+            rank, article_id = values
+            op = '<' if reverse else '>'
+            condition = f'AND (search_rank {op} %s OR (search_rank = %s AND a.id {op} %s)) '
+            params = [rank, rank, article_id]
+        return self._fetch(limit, 0, condition, params, descending=reverse)
+
+    def _fetch(self, limit, offset, condition='', params=(), descending=False):
+        from .models import Article
+
+        if not self.match or limit == 0:
+            return []
+
+        weights = ', '.join(str(weight) for weight in SEARCH_WEIGHTS)
+        direction = 'DESC' if descending else 'ASC'
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT a.id, bm25({SEARCH_TABLE}, {weights}) AS search_rank, '
+                f"snippet({SEARCH_TABLE}, -1, %s, %s, '…', 24) "
+                f'{self._where()} {condition}'
+                f'ORDER BY search_rank {direction}, a.id {direction} LIMIT %s OFFSET %s',
+                [_MARK_START, _MARK_END, self.match, *params, limit, offset]
+            )
+            rows = cursor.fetchall()
+
+        articles = Article.objects.select_related(
+            'author', 'category', 'current_version'
+        ).prefetch_related('tags').in_bulk([row[0] for row in rows])
+
+        results = []
+        for article_id, rank, snippet in rows:
+            article = articles.get(article_id)
+            if article is None:
+                continue
+            article.search_rank = rank
+            article.search_snippet = _highlight(snippet)
+            results.append(article)
+        return results
@@ -0,0 +1,59 @@
+import time
+
+from django.core.cache import cache
+from django.db.models import F
+
+
+# Данные боковой панели (категории и популярные теги) считаются один раз
+# и хранятся в кэше под текущим номером поколения. Сигналы изменения статей,
+# тегов и категорий меняют номер - старые записи просто перестают читаться.
+# Номер поколения - время изменения (нс), он же служит валидатором страниц
+# (см. conditional.py). Если кэш не общий для процессов (LocMemCache), номер
+# меняется только в процессе, где произошло изменение: остальные процессы
+# держат данные не дольше SIDEBAR_LOCAL_CACHE_TIMEOUT.
+SIDEBAR_CACHE_TIMEOUT = 60 * 60
+SIDEBAR_LOCAL_CACHE_TIMEOUT = 60
+SIDEBAR_POPULAR_TAGS = 20
+
+_GENERATION_KEY = 'sidebar:generation'
+
+
+def get_generation():
+    generation = cache.get(_GENERATION_KEY)
+    if generation is None:
+        cache.add(_GENERATION_KEY, time.time_ns(), timeout=None)
+        generation = cache.get(_GENERATION_KEY, 0)
+    return generation
+
+
+def invalidate_sidebar():
+    """Помечает закэшированные данные боковой панели устаревшими"""
+    cache.set(_GENERATION_KEY, time.time_ns(), timeout=None)
+
+
+def compute_sidebar_data():
+    from .models import Category, Tag
+
+    # Дерево категорий одним запросом: дочерние узлы кэшируются в get_children()
+    categories = list(Category.objects.all().get_cached_trees())
+    popular_tags = list(
+        Tag.objects.filter(usage__article_count__gt=0).annotate(
+            num_articles=F('usage__article_count')
+        ).order_by('-num_articles', 'name')[:SIDEBAR_POPULAR_TAGS]
+    )
+    return {
+        'categories': categories,
+        'popular_tags': popular_tags,
+    }
+
+
+def get_sidebar_data():
+    """Категории и популярные теги из кэша текущего поколения"""
+    key = f'sidebar:data:{get_generation()}'
+    data = cache.get(key)
+    if data is None:
+        from .conditional import stamps_shared
+
+        data = compute_sidebar_data()
+        cache.set(key, data, SIDEBAR_CACHE_TIMEOUT if stamps_shared() else SIDEBAR_LOCAL_CACHE_TIMEOUT)
+    return data
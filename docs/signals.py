@@ -0,0 +1,312 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
+from django.dispatch import receiver
+from django.contrib.auth.models import User
+
+from .models import Article, ArticleVersion, Category, Comment, Rating, Favorite, Tag
+from .rendering import store_version_html
+from .counters import RATING_COUNTER_FIELDS, adjust_counter, recount_counters, deleted_with_article
+from .version_storage import STORAGE_DELTA, STORAGE_FULL
+from .sidebar import invalidate_sidebar
+from .tag_usage import adjust_usage, article_tag_ids, recount_usage
+from .category_counts import adjust_category_count, recount_categories
+from .related import forget_article_terms, schedule_related_update
+from .conditional import touch_articles
+from .author_stats import (
+    COUNTER_FIELDS as AUTHOR_COUNTER_FIELDS, STATUS_FIELDS, adjust_author_stats, article_deltas, recount_author_stats
+)
+from . import search
+
+
+@receiver(post_save, sender=ArticleVersion)
+def render_new_version(sender, instance, created, raw=False, **kwargs):
+    """Версии неизменяемы, поэтому HTML рендерится один раз при создании"""
+    if created and not raw:
+        transaction.on_commit(lambda: store_version_html(instance))
+
+
+@receiver(pre_delete, sender=ArticleVersion)
+def materialize_next_version(sender, instance, origin=None, **kwargs):
+    """Следующая версия-дельта ссылается на удаляемую, поэтому сохраняем ее полным текстом"""
+    if deleted_with_article(origin):
+        return
+    following = ArticleVersion.objects.filter(
+        article_id=instance.article_id,
+        version_number__gt=instance.version_number
+    ).order_by('version_number').first()
+    if following is not None and following.storage == STORAGE_DELTA:
+        ArticleVersion.objects.filter(pk=following.pk).update(
+            storage=STORAGE_FULL, content=following.content, delta=None
+        )
+
+
+@receiver(post_save, sender=Article)
+def update_search_index(sender, instance, created, raw=False, **kwargs):
+    """Переиндексируем статью при смене текущей версии"""
+    if raw:
+        return
+    if created or instance.has_changed('current_version_id'):
+        article_id = instance.id
+        transaction.on_commit(lambda: search.index_articles([article_id]))
+
+
+@receiver(post_delete, sender=Article)
+def remove_from_search_index(sender, instance, **kwargs):
+    article_id = instance.id
+    transaction.on_commit(lambda: search.remove_articles([article_id]))
+
+
+# Денормализованные счетчики статьи. Обновления выполняются в той же
+# транзакции, что и изменение оценки/комментария/избранного.
+
+@receiver(post_save, sender=Rating)
+def count_rating(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        adjust_counter(instance.article_id, RATING_COUNTER_FIELDS[instance.rating_type], 1)
+    else:
+        # Тип оценки могли изменить в админке - пересчитываем статью целиком
+        recount_counters([instance.article_id])
+
+
+@receiver(post_delete, sender=Rating)
+def uncount_rating(sender, instance, origin=None, **kwargs):
+    if not deleted_with_article(origin):
+        adjust_counter(instance.article_id, RATING_COUNTER_FIELDS[instance.rating_type], -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    was_counted = False if created else getattr(instance, '_was_counted', None)
+    if was_counted is None:
+        recount_counters([instance.article_id])
+    elif was_counted != instance.is_counted:
+        adjust_counter(instance.article_id, 'comments_count', 1 if instance.is_counted else -1)
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_comment(sender, instance, origin=None, **kwargs):
+    if instance.is_counted and not deleted_with_article(origin):
+        adjust_counter(instance.article_id, 'comments_count', -1)
+
+
+@receiver(post_save, sender=Favorite)
+def count_favorite(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        adjust_counter(instance.article_id, 'favorites_count', 1)
+
+
+@receiver(post_delete, sender=Favorite)
+def uncount_favorite(sender, instance, origin=None, **kwargs):
+    if not deleted_with_article(origin):
+        adjust_counter(instance.article_id, 'favorites_count', -1)
+
+
+# Боковая панель (категории и популярные теги) кэшируется до изменения
+# статей, тегов или категорий. Сброс - после фиксации транзакции, чтобы
+# параллельный запрос не закэшировал данные до изменения под новым поколением.
+
+@receiver(post_save, sender=Article)
+@receiver(post_delete, sender=Article)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def reset_sidebar(sender, raw=False, **kwargs):
+    if not raw:
+        transaction.on_commit(invalidate_sidebar)
+
+
+@receiver(m2m_changed, sender=Article.tags.through)
+def reset_sidebar_on_tags(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        transaction.on_commit(invalidate_sidebar)
+
+
+# Счетчики использования тегов (TagUsage): учитываются только опубликованные статьи
+
+@receiver(m2m_changed, sender=Article.tags.through)
+def count_tag_usage(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse:
+        # Изменены статьи тега (tag.articles.add/remove/clear) - пересчитываем тег
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            recount_usage([instance.pk])
+        return
+
+    if instance.status != 'published':
+        return
+    if action == 'pre_remove':
+        # remove() передает все указанные id, учитываем только реально связанные
+        linked = set(article_tag_ids(instance.pk))
+        instance._removed_tag_ids = [tag_id for tag_id in pk_set if tag_id in linked]
+    elif action == 'pre_clear':
+        instance._removed_tag_ids = article_tag_ids(instance.pk)
+    elif action == 'post_add':
+        adjust_usage(pk_set, 1)
+    elif action in ('post_remove', 'post_clear'):
+        adjust_usage(getattr(instance, '_removed_tag_ids', []), -1)
+
+
+@receiver(post_save, sender=Article)
+def count_tag_usage_on_status(sender, instance, created, raw=False, **kwargs):
+    """Публикация статьи или снятие с публикации меняет счетчики всех ее тегов"""
+    if raw or created or not instance.has_changed('status'):
+        return
+    loaded = getattr(instance, '_loaded_values', None)
+    if loaded is None or 'status' not in loaded:
+        # Прежний статус неизвестен - пересчитываем теги статьи
+        recount_usage(article_tag_ids(instance.pk))
+        return
+    was_published = loaded['status'] == 'published'
+    is_published = instance.status == 'published'
+    if was_published != is_published:
+        adjust_usage(article_tag_ids(instance.pk), 1 if is_published else -1)
+
+
+@receiver(pre_delete, sender=Article)
+def uncount_tag_usage(sender, instance, **kwargs):
+    # Связи с тегами удаляются каскадно без m2m_changed
+    if instance.status == 'published':
+        adjust_usage(article_tag_ids(instance.pk), -1)
+
+
+# Счетчики опубликованных статей категорий (с учетом подкатегорий)
+
+@receiver(post_save, sender=Article)
+def count_category_articles(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    is_counted = instance.status == 'published'
+    if created:
+        if is_counted:
+            adjust_category_count(instance.category_id, 1)
+        return
+
+    loaded = getattr(instance, '_loaded_values', None)
+    if loaded is None or 'status' not in loaded or 'category_id' not in loaded:
+        recount_categories()
+        return
+    was_counted = loaded['status'] == 'published'
+    if (loaded['category_id'], was_counted) != (instance.category_id, is_counted):
+        if was_counted:
+            adjust_category_count(loaded['category_id'], -1)
+        if is_counted:
+            adjust_category_count(instance.category_id, 1)
+
+
+@receiver(post_delete, sender=Article)
+def uncount_category_articles(sender, instance, origin=None, **kwargs):
+    # При удалении категории статьи удаляются каскадно - пересчет выполнит сигнал категории
+    if isinstance(origin, Category) or getattr(origin, 'model', None) is Category:
+        return
+    if instance.status == 'published':
+        adjust_category_count(instance.category_id, -1)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def recount_category_tree(sender, created=False, raw=False, **kwargs):
+    """Перемещение или удаление узла меняет суммы предков - дерево небольшое, пересчитываем целиком"""
+    if not raw and not created:
+        transaction.on_commit(recount_categories)
+
+
+# Похожие статьи: пересчет после фиксации транзакции, см. docs/related.py
+
+@receiver(post_save, sender=Article)
+def update_related_articles(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created or instance.has_changed('current_version_id') or instance.has_changed('status'):
+        schedule_related_update([instance.pk])
+
+
+@receiver(pre_delete, sender=Article)
+def forget_related_terms(sender, instance, **kwargs):
+    """Термины удаляемой статьи больше не входят в документные частоты"""
+    forget_article_terms(instance.pk)
+
+
+@receiver(m2m_changed, sender=Article.tags.through)
+def update_related_on_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == 'pre_clear':
+        # tag.articles.clear() не передает id статей - запоминаем их до удаления связей
+        schedule_related_update(
+            sender.objects.filter(tag_id=instance.pk).values_list('article_id', flat=True)
+        )
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        schedule_related_update((pk_set or []) if reverse else [instance.pk])
+
+
+# Статистика авторов для личного кабинета, см. docs/author_stats.py
+
+@receiver(post_save, sender=Article)
+def count_author_article(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        adjust_author_stats(instance.author_id, article_deltas(instance, 1))
+        return
+
+    loaded = getattr(instance, '_loaded_values', None)
+    if loaded is None or 'status' not in loaded or 'author_id' not in loaded:
+        recount_author_stats([instance.author_id])
+    elif loaded['author_id'] != instance.author_id:
+        # Статья передана другому автору - переносится вся ее статистика
+        recount_author_stats([loaded['author_id'], instance.author_id])
+    elif loaded['status'] != instance.status:
+        adjust_author_stats(instance.author_id, {
+            STATUS_FIELDS.get(loaded['status']): -1,
+            STATUS_FIELDS.get(instance.status): 1,
+        })
+
+
+@receiver(pre_delete, sender=Article)
+def uncount_author_article(sender, instance, origin=None, **kwargs):
+    # При удалении пользователя его статистика удаляется каскадно
+    if isinstance(origin, User) or getattr(origin, 'model', None) is User:
+        return
+    # Счетчики объекта могли устареть (они меняются UPDATE с F()) - читаем из базы
+    instance.refresh_from_db(fields=list(AUTHOR_COUNTER_FIELDS))
+    adjust_author_stats(instance.author_id, article_deltas(instance, -1))
+
+
+# Отметки изменений для условных GET (docs/conditional.py)
+
+def _touch_after_commit(article_ids):
+    article_ids = list(article_ids)
+    if article_ids:
+        transaction.on_commit(lambda: touch_articles(article_ids))
+
+
+@receiver(post_save, sender=Article)
+@receiver(post_delete, sender=Article)
+def touch_article(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _touch_after_commit([instance.pk])
+
+
+@receiver(post_save, sender=ArticleVersion)
+@receiver(post_delete, sender=ArticleVersion)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+@receiver(post_save, sender=Rating)
+@receiver(post_delete, sender=Rating)
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+def touch_article_of(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _touch_after_commit([instance.article_id])
+
+
+@receiver(m2m_changed, sender=Article.tags.through)
+def touch_article_on_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == 'pre_clear':
+        _touch_after_commit(sender.objects.filter(tag_id=instance.pk).values_list('article_id', flat=True))
+    elif reverse and action in ('post_add', 'post_remove'):
+        _touch_after_commit(pk_set)
+    elif not reverse and action in ('post_add', 'post_remove', 'post_clear'):
+        _touch_after_commit([instance.pk])
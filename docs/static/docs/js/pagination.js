@@ -0,0 +1,37 @@
+// pagination.js - подгрузка следующей страницы списка статей ("Показать еще")
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('.load-more-btn').forEach(btn => {
+        btn.addEventListener('click', handleLoadMore);
+    });
+});
+
+function handleLoadMore(event) {
+    const btn = event.currentTarget;
+    const container = document.querySelector(btn.dataset.target);
+    if (!container || btn.disabled) {
+        return;
+    }
+
+    btn.disabled = true;
+    fetch(btn.dataset.url, {headers: {'X-Requested-With': 'XMLHttpRequest'}})
+        .then(response => response.json())
+        .then(data => {
+            if (!data.success) {
+                throw new Error('Ошибка загрузки страницы');
+            }
+            container.insertAdjacentHTML('beforeend', data.html);
+
+            if (data.next_cursor) {
+                const url = new URL(btn.dataset.url, window.location.href);
+                url.searchParams.set('cursor', data.next_cursor);
+                btn.dataset.url = url.pathname + url.search;
+                btn.disabled = false;
+            } else {
+                btn.remove();
+            }
+        })
+        .catch(error => {
+            console.error('Error:', error);
+            btn.disabled = false;
+        });
+}
@@ -0,0 +1,45 @@
+from django.db.models import Count, F, Q
+
+from .models import Article, Tag, TagUsage
+
+
+# Количество опубликованных статей по тегам хранится в TagUsage и меняется
+# инкрементально: при изменении тегов статьи и при смене ее статуса.
+
+def adjust_usage(tag_ids, delta):
+    """Изменяет счетчики тегов на delta (в рамках текущей транзакции)"""
+    tag_ids = list(tag_ids)
+    if not tag_ids or not delta:
+        return
+    TagUsage.objects.bulk_create(
+        [TagUsage(tag_id=tag_id) for tag_id in tag_ids],
+        ignore_conflicts=True
+    )
+    TagUsage.objects.filter(tag_id__in=tag_ids).update(article_count=F('article_count') + delta)
+
+
+def article_tag_ids(article_id):
+    return list(Article.tags.through.objects.filter(article_id=article_id).values_list('tag_id', flat=True))
+
+
+def recount_usage(tag_ids=None):
+    """
+    Пересчитывает счетчики тегов по фактическим данным (без списка - всех тегов).
+    Возвращает количество исправленных записей.
+    """
+    tags = Tag.objects.all() if tag_ids is None else Tag.objects.filter(pk__in=list(tag_ids))
+    actual = dict(
+        tags.annotate(
+            published=Count('articles', filter=Q(articles__status='published'))
+        ).values_list('id', 'published')
+    )
+    current = dict(TagUsage.objects.filter(tag_id__in=actual).values_list('tag_id', 'article_count'))
+
+    new_rows = [TagUsage(tag_id=tag_id, article_count=count)
+                for tag_id, count in actual.items() if tag_id not in current and count]
+    changed = [TagUsage(tag_id=tag_id, article_count=count)
+               for tag_id, count in actual.items() if tag_id in current and current[tag_id] != count]
+
+    TagUsage.objects.bulk_create(new_rows, batch_size=500, ignore_conflicts=True)
+    TagUsage.objects.bulk_update(changed, ['article_count'], batch_size=500)
+    return len(new_rows) + len(changed)
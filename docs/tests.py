@@ -1,3 +1,449 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.test import Client, SimpleTestCase, TestCase, override_settings, tag
+from django.urls import reverse
+
+from .author_stats import get_author_stats
+from .benchmark import CorpusGenerator
+from .markdown_import import MarkdownImporter
+from .models import (
+    Article, ArticleTerm, ArticleVersion, AuthorStats, Category, Comment, Favorite, Rating, RelatedArticle, Tag,
+    TagUsage
+)
+from .query_budget import (
+    ANONYMOUS, MEMBER, QUERY_BUDGET_PAGES, QUERY_BUDGET_SCALES, QUERY_BUDGETS, STAFF,
+    collected, duplicated_templates, measure_pages, sql_template
+)
+from .related import rebuild_related, schedule_related_update, update_related
+from .version_storage import STORAGE_DELTA, STORAGE_FULL, content_cache, convert_article_versions
+from .views import UserDashboardView
+
+
+class SqlTemplateTests(SimpleTestCase):
+
+    def test_literals_replaced(self):
+        self.assertEqual(
+            sql_template("SELECT * FROM t WHERE id = 15 AND name = 'it''s' AND x > 1.5"),
+            'SELECT * FROM t WHERE id = ? AND name = ? AND x > ?'
+        )
+
+    def test_in_lists_collapsed(self):
+        self.assertEqual(
+            sql_template('SELECT * FROM t WHERE id IN (1, 2, 3)'),
+            sql_template('SELECT * FROM t WHERE id IN (7)').replace('(?)', '(?...)')
+        )
+
+    def test_duplicates(self):
+        queries = [{'sql': f'SELECT * FROM tag WHERE article_id = {n}'} for n in range(3)]
+        queries.append({'sql': 'SELECT 1'})
+        self.assertEqual(duplicated_templates(queries), [(3, 'SELECT * FROM tag WHERE article_id = ?')])
+
+
+@tag('query_budget')
+class QueryBudgetTests(TestCase):
+    """
+    Количество SQL-запросов страниц не превышает бюджет (docs/query_budget.py)
+    и не растет с объемом данных: страницы замеряются на двух размерах корпуса.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        staff = User.objects.create_superuser('budget-admin', 'admin@example.com', 'budget')
+        clients = {ANONYMOUS: Client(), MEMBER: Client(), STAFF: Client()}
+        clients[STAFF].force_login(staff)
+
+        cls.measured = [measure_pages(clients, scale) for scale in QUERY_BUDGET_SCALES]
+        for pages in cls.measured:
+            for url_name, page in pages.items():
+                collected.setdefault(url_name, []).append(page)
+
+    def test_every_budget_has_page(self):
+        self.assertEqual(set(QUERY_BUDGETS), set(QUERY_BUDGET_PAGES))
+
+    def test_pages_within_budget(self):
+        for url_name in QUERY_BUDGETS:
+            for pages in self.measured:
+                page = pages[url_name]
+                with self.subTest(url_name, url=page.url):
+                    self.assertEqual(page.status, 200, page.url)
+                    self.assertLessEqual(page.count, page.budget, '\n' + page.describe())
+
+    def test_query_count_independent_of_data_size(self):
+        small, large = self.measured[0], self.measured[-1]
+        for url_name in QUERY_BUDGETS:
+            with self.subTest(url_name):
+                self.assertLessEqual(
+                    large[url_name].count, small[url_name].count,
+                    f'\n{small[url_name].describe()}\n{large[url_name].describe()}'
+                )
+
+
+class RelatedArticlesTests(TestCase):
+    """Инкрементальный пересчет похожих статей согласован с полной перестройкой"""
+
+    @classmethod
+    def setUpTestData(cls):
+        CorpusGenerator(seed=3, articles=30, versions=2, comments=0, ratings=0, users=5, tags=10).generate()
+        rebuild_related()
+
+    def _vectors(self):
+        vectors = {}
+        for article_id, term, weight in ArticleTerm.objects.values_list('article_id', 'term', 'weight'):
+            vectors.setdefault(article_id, {})[term] = weight
+        return vectors
+
+    def _related(self):
+        related = {}
+        for article_id, related_id, score in RelatedArticle.objects.values_list('article_id', 'related_id', 'score'):
+            related.setdefault(article_id, {})[related_id] = score
+        return related
+
+    def test_update_of_unchanged_articles_matches_rebuild(self):
+        vectors, related = self._vectors(), self._related()
+        update_related(sorted(vectors)[:10])
+
+        updated_vectors, updated_related = self._vectors(), self._related()
+        self.assertEqual(set(updated_vectors), set(vectors))
+        for article_id, vector in vectors.items():
+            with self.subTest(article_id=article_id):
+                self.assertEqual(set(updated_vectors[article_id]), set(vector))
+                for term, weight in vector.items():
+                    self.assertAlmostEqual(updated_vectors[article_id][term], weight)
+                self.assertEqual(set(updated_related.get(article_id, {})), set(related.get(article_id, {})))
+
+
+class RelatedUpdateScheduleTests(TestCase):
+
+    @override_settings(RELATED_UPDATE_IN_BACKGROUND=False)
+    def test_rolled_back_ids_discarded(self):
+        with transaction.atomic():
+            schedule_related_update([-1])
+            transaction.set_rollback(True)
+
+        with mock.patch('docs.related.update_related') as update, \
+                self.captureOnCommitCallbacks(execute=True):
+            schedule_related_update([-2])
+            schedule_related_update([-3])
+        update.assert_called_once_with({-2, -3})
+
+
+@override_settings(ARTICLE_VERSION_STORAGE=STORAGE_DELTA, ARTICLE_VERSION_SNAPSHOT_INTERVAL=3)
+class VersionStorageTests(TestCase):
+    """Хранение версий дельтами: текст каждой версии восстанавливается без изменений"""
+
+    def setUp(self):
+        self.author = User.objects.create_user('versions-author')
+        category = Category.objects.create(name='Раздел', slug='versions')
+        self.article = Article.objects.create(title='Статья', author=self.author, category=category)
+        lines = [f'Строка {number} исходного текста статьи.\n' for number in range(40)]
+        self.texts = []
+        for number in range(8):
+            lines[number * 3] = f'Строка {number * 3} изменена в версии {number + 1}.\n'
+            if number % 2:
+                lines.append(f'Добавлено в версии {number + 1}.\n')
+            self.texts.append(''.join(lines))
+            ArticleVersion.objects.create(
+                article=self.article, title='Статья', content=self.texts[-1], author=self.author
+            )
+        content_cache.clear()
+
+    def _versions(self):
+        return list(ArticleVersion.objects.filter(article=self.article).order_by('version_number'))
+
+    def test_round_trip(self):
+        versions = self._versions()
+        self.assertEqual(
+            [version.storage for version in versions],
+            [STORAGE_FULL, STORAGE_DELTA, STORAGE_DELTA] * 2 + [STORAGE_FULL, STORAGE_DELTA]
+        )
+        self.assertEqual([version.content for version in versions], self.texts)
+        self.assertEqual([version.content_size for version in versions], [len(text) for text in self.texts])
+
+    def test_delete_middle_version(self):
+        versions = self._versions()
+        versions[4].delete()
+        content_cache.clear()
+        self.assertEqual(
+            [version.content for version in self._versions()],
+            self.texts[:4] + self.texts[5:]
+        )
+
+    def test_convert_to_full_and_back(self):
+        convert_article_versions(ArticleVersion, self.article.pk, STORAGE_FULL, 3)
+        content_cache.clear()
+        versions = self._versions()
+        self.assertEqual({version.storage for version in versions}, {STORAGE_FULL})
+        self.assertEqual([version.content for version in versions], self.texts)
+
+        convert_article_versions(ArticleVersion, self.article.pk, STORAGE_DELTA, 3)
+        content_cache.clear()
+        versions = self._versions()
+        self.assertIn(STORAGE_DELTA, {version.storage for version in versions})
+        self.assertEqual([version.content for version in versions], self.texts)
+
+    def test_saved_content_is_immutable(self):
+        version = self._versions()[1]
+        self.assertEqual(version.storage, STORAGE_DELTA)
+        with self.assertRaises(ValueError):
+            version.content = 'Другой текст'
+        # Тот же текст (например, при refresh_from_db) записывать можно
+        version.content = self.texts[1]
+        version.refresh_from_db()
+        version.save()
+        content_cache.clear()
+        self.assertEqual(ArticleVersion.objects.get(pk=version.pk).content, self.texts[1])
+
+
+class MarkdownImportResumeTests(TestCase):
+    """Возобновление импорта с контрольной точки"""
+
+    def setUp(self):
+        self.author = User.objects.create_user('importer')
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        for number, tags in enumerate(['python, django', 'python', 'sql']):
+            with open(os.path.join(self.directory, f'{number}.md'), 'w', encoding='utf-8') as stream:
+                stream.write(f'---\ntitle: Статья {number}\nstatus: published\ntags: {tags}\n---\n'
+                             f'Текст статьи {number} о python и базах данных\n')
+
+    def test_resume_recounts_tags_of_earlier_batches(self):
+        checkpoint = os.path.join(self.directory, 'import.checkpoint')
+
+        def interrupt(position):
+            if position == 2:
+                raise KeyboardInterrupt
+
+        with self.assertRaises(KeyboardInterrupt):
+            MarkdownImporter(self.author, batch_size=1).run(self.directory, checkpoint, progress=interrupt)
+        self.assertEqual(Article.objects.count(), 2)
+
+        stats = MarkdownImporter(self.author, batch_size=1).run(self.directory, checkpoint)
+        self.assertEqual(stats['articles'], 1)
+        self.assertEqual(
+            dict(TagUsage.objects.values_list('tag__name', 'article_count')),
+            {'python': 2, 'django': 1, 'sql': 1}
+        )
+        self.assertTrue(RelatedArticle.objects.exists())
+        self.assertFalse(os.path.exists(checkpoint))
+
+
+class ConditionalArticlePageTests(TestCase):
+    """Условные GET страницы статьи"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author')
+        category = Category.objects.create(name='Раздел', slug='conditional')
+        cls.article = Article.objects.create(title='Статья', author=cls.author, category=category, status='published')
+        version = ArticleVersion(article=cls.article, title='Статья', content='Текст', author=cls.author)
+        version.save()
+        cls.article.current_version = version
+        cls.article.save()
+        cls.comment = Comment.objects.create(article=cls.article, author=cls.author, content='Комментарий')
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('docs:article_detail', args=[self.article.slug])
+
+    @override_settings(CONDITIONAL_LIST_PAGES=True)
+    def test_not_modified_until_article_changes(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(settings.CSRF_COOKIE_NAME, response.cookies)
+        etag = response['ETag']
+
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # Правка комментария не меняет счетчики статьи - меняется только отметка
+        with self.captureOnCommitCallbacks(execute=True):
+            self.comment.content = 'Исправленный комментарий'
+            self.comment.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_no_validators_with_process_local_cache(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('ETag'))
+
+
+class ArticleCounterTests(TestCase):
+    """Денормализованные счетчики статьи"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author')
+        cls.reader = User.objects.create_user('reader')
+        category = Category.objects.create(name='Раздел', slug='counters')
+        cls.article = Article.objects.create(title='Статья', author=cls.author, category=category, status='published')
+
+    def _counters(self):
+        return Article.objects.values('likes_count', 'dislikes_count', 'comments_count', 'favorites_count').get(
+            pk=self.article.pk
+        )
+
+    def test_signals_update_counters(self):
+        rating = Rating.objects.create(article=self.article, user=self.reader, rating_type='like')
+        Rating.objects.create(article=self.article, user=self.author, rating_type='dislike')
+        Favorite.objects.create(article=self.article, user=self.reader)
+        comment = Comment.objects.create(article=self.article, author=self.reader, content='Комментарий')
+        Comment.objects.create(article=self.article, author=self.reader, content='Скрытый', is_approved=False)
+        self.assertEqual(
+            self._counters(),
+            {'likes_count': 1, 'dislikes_count': 1, 'comments_count': 1, 'favorites_count': 1}
+        )
+
+        rating.rating_type = 'dislike'
+        rating.save()
+        comment.is_approved = False
+        comment.save()
+        self.assertEqual(
+            self._counters(),
+            {'likes_count': 0, 'dislikes_count': 2, 'comments_count': 0, 'favorites_count': 1}
+        )
+
+    def test_stale_instance_save_keeps_counters(self):
+        stale = Article.objects.get(pk=self.article.pk)
+        Rating.objects.create(article=self.article, user=self.reader, rating_type='like')
+        Favorite.objects.create(article=self.article, user=self.reader)
+
+        stale.title = 'Новый заголовок'
+        stale.save()
+        article = Article.objects.get(pk=self.article.pk)
+        self.assertEqual(article.title, 'Новый заголовок')
+        self.assertEqual((article.likes_count, article.favorites_count), (1, 1))
+
+
+class AuthorStatsTests(TestCase):
+    """Статистика автора и личный кабинет"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', password='password')
+        cls.reader = User.objects.create_user('reader')
+        cls.category = Category.objects.create(name='Раздел', slug='dashboard')
+
+    def _stats(self):
+        return AuthorStats.objects.values(
+            'published_count', 'draft_count', 'total_comments', 'total_likes', 'total_favorites'
+        ).get(user=self.author)
+
+    def test_signals_update_stats(self):
+        get_author_stats(self.author)
+        draft = Article.objects.create(title='Черновик', author=self.author, category=self.category)
+        article = Article.objects.create(title='Статья', author=self.author, category=self.category, status='published')
+        Rating.objects.create(article=article, user=self.reader, rating_type='like')
+        Favorite.objects.create(article=article, user=self.reader)
+        Comment.objects.create(article=article, author=self.reader, content='Комментарий')
+        self.assertEqual(self._stats(), {
+            'published_count': 1, 'draft_count': 1, 'total_comments': 1, 'total_likes': 1, 'total_favorites': 1,
+        })
+
+        draft.status = 'published'
+        draft.save()
+        article.delete()
+        self.assertEqual(self._stats(), {
+            'published_count': 1, 'draft_count': 0, 'total_comments': 0, 'total_likes': 0, 'total_favorites': 0,
+        })
+
+    def test_dashboard_sections_limited(self):
+        size = UserDashboardView.DASHBOARD_SECTION_SIZE
+        for number in range(size + 2):
+            Article.objects.create(title=f'Draft {number}', author=self.author, category=self.category)
+        Article.objects.create(title='Published', author=self.author, category=self.category, status='published')
+
+        self.client.force_login(self.author)
+        response = self.client.get(reverse('docs:user_dashboard'))
+        self.assertEqual(len(response.context['draft_articles']), size)
+        self.assertEqual(len(response.context['published_articles']), 1)
+        self.assertEqual(response.context['recent_articles'][0].title, 'Published')
+        self.assertContains(response, f'Показаны последние {size} из {size + 2}')
+
+
+class CategoryCountTests(TestCase):
+    """Счетчики опубликованных статей категорий с учетом подкатегорий"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author')
+        cls.root = Category.objects.create(name='Раздел', slug='root')
+        cls.child = Category.objects.create(name='Подраздел', slug='child', parent=cls.root)
+        cls.other = Category.objects.create(name='Другой раздел', slug='other')
+
+    def _counts(self):
+        return {
+            category.slug: (category.article_count, category.total_article_count)
+            for category in Category.objects.all()
+        }
+
+    def test_signals_update_counts(self):
+        article = Article.objects.create(title='Article', author=self.author, category=self.child, status='published')
+        Article.objects.create(title='Draft', author=self.author, category=self.child)
+        self.assertEqual(self._counts(), {'root': (0, 1), 'child': (1, 1), 'other': (0, 0)})
+
+        article.category = self.root
+        article.save()
+        self.assertEqual(self._counts(), {'root': (1, 1), 'child': (0, 0), 'other': (0, 0)})
+
+        article.status = 'archived'
+        article.save()
+        self.assertEqual(self._counts(), {'root': (0, 0), 'child': (0, 0), 'other': (0, 0)})
+
+    def test_moved_subtree_recounted(self):
+        Article.objects.create(title='Article', author=self.author, category=self.child, status='published')
+        with self.captureOnCommitCallbacks(execute=True):
+            child = Category.objects.get(pk=self.child.pk)
+            child.parent = self.other
+            child.save()
+        self.assertEqual(self._counts(), {'root': (0, 0), 'child': (1, 1), 'other': (0, 1)})
+
+
+class TagUsageTests(TestCase):
+    """Количество опубликованных статей по тегам (TagUsage)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author')
+        cls.category = Category.objects.create(name='Раздел', slug='tags')
+        cls.python = Tag.objects.create(name='python', slug='python')
+        cls.django = Tag.objects.create(name='django', slug='django')
+        Tag.objects.create(name='unused', slug='unused')
+
+    def _usage(self):
+        return dict(TagUsage.objects.values_list('tag__name', 'article_count'))
+
+    def test_signals_update_usage(self):
+        article = Article.objects.create(title='Article', author=self.author, category=self.category, status='published')
+        draft = Article.objects.create(title='Draft', author=self.author, category=self.category)
+        article.tags.add(self.python, self.django)
+        draft.tags.add(self.python)
+        self.assertEqual(self._usage(), {'python': 1, 'django': 1})
+
+        draft.status = 'published'
+        draft.save()
+        article.tags.remove(self.django)
+        self.assertEqual(self._usage(), {'python': 2, 'django': 0})
+
+        self.python.articles.clear()
+        self.assertEqual(self._usage(), {'python': 0, 'django': 0})
+
+    def test_deleted_article_uncounted(self):
+        article = Article.objects.create(title='Article', author=self.author, category=self.category, status='published')
+        article.tags.add(self.python)
+        article.delete()
+        self.assertEqual(self._usage(), {'python': 0})
+
+    def test_tag_cloud_shows_used_tags(self):
+        article = Article.objects.create(title='Article', author=self.author, category=self.category, status='published')
+        article.tags.add(self.python)
+        response = self.client.get(reverse('docs:tag_cloud'))
+        self.assertEqual([tag.name for tag in response.context['tags']], ['python'])
+        self.assertEqual(response.context['total_tags'], 1)
@@ -24,6 +24,7 @@ urlpatterns = [
 
     # НОВЫЕ МАРШРУТЫ ДЛЯ ВЕРСИОННОСТИ - ИСПРАВЛЕННЫЕ
     path('articles/<slug:slug>/versions/', version_views.ArticleVersionListView.as_view(), name='version_list'),
+    path('articles/<slug:slug>/versions/timeline/', version_views.version_timeline, name='version_timeline'),
     path('articles/<slug:slug>/versions/<int:pk>/', version_views.VersionDetailView.as_view(), name='version_detail'),
     path('articles/<slug:slug>/versions/<int:version_id>/restore/', version_views.restore_version,
          name='restore_version'),
@@ -38,7 +39,10 @@ urlpatterns = [
 
     # НОВЫЕ МАРШРУТЫ ДЛЯ ЭКСПОРТА
     path('articles/<slug:slug>/export/', export_views.export_article_options, name='export_options'),
+    path('articles/<slug:slug>/export/pdf/<int:version_id>/', export_views.export_pdf_status,
+         name='export_pdf_status'),
     path('articles/<slug:slug>/export/<str:format_type>/', export_views.export_article, name='export_article'),
+    path('export/archive/', export_views.export_archive, name='export_archive'),
 
     # Маршруты для комментариев и оценок
     path('articles/<slug:slug>/comment/', comments_views.add_comment, name='add_comment'),
@@ -0,0 +1,230 @@
+import json
+import threading
+import zlib
+from collections import OrderedDict
+from difflib import SequenceMatcher
+
+from django.conf import settings
+from django.db.models import Max
+from django.db.models.query_utils import DeferredAttribute
+from mdeditor.fields import MDTextField
+
+
+# Хранение содержимого версий: 'full' - полный текст в каждой версии,
+# 'delta' - полный снимок каждые ARTICLE_VERSION_SNAPSHOT_INTERVAL версий
+# и сжатые построчные изменения относительно предыдущей версии между ними.
+STORAGE_FULL = 'full'
+STORAGE_DELTA = 'delta'
+
+STORAGE_CHOICES = [
+    (STORAGE_FULL, 'Полный текст'),
+    (STORAGE_DELTA, 'Изменения'),
+]
+
+# Дельта сохраняется, только если она заметно меньше полного текста
+DELTA_MAX_RATIO = 0.8
+
+
+def get_storage_mode():
+    return getattr(settings, 'ARTICLE_VERSION_STORAGE', STORAGE_FULL)
+
+
+def get_snapshot_interval():
+    return max(getattr(settings, 'ARTICLE_VERSION_SNAPSHOT_INTERVAL', 10), 1)
+
+
+class ContentCache:
+    """Ограниченный LRU-кэш восстановленного содержимого версий (по id версии)"""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+content_cache = ContentCache(getattr(settings, 'ARTICLE_VERSION_CACHE_SIZE', 256))
+
+
+def encode_delta(base, text):
+    """
+    Сжатое описание text относительно base: список операций,
+    [начало, конец] - скопировать строки base, строка - вставить текст.
+    """
+    base_lines = base.splitlines(keepends=True)
+    lines = text.splitlines(keepends=True)
+
+    ops = []
+    matcher = SequenceMatcher(None, base_lines, lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            ops.append([i1, i2])
+        elif j2 > j1:
+            ops.append(''.join(lines[j1:j2]))
+
+    return zlib.compress(json.dumps(ops, ensure_ascii=False).encode('utf-8'), 9)
+
+
+def apply_delta(base, delta):
+    """Восстанавливает текст по базовому тексту и дельте"""
+    base_lines = base.splitlines(keepends=True)
+    parts = []
+    for op in json.loads(zlib.decompress(bytes(delta)).decode('utf-8')):
+        if isinstance(op, str):
+            parts.append(op)
+        else:
+            parts.extend(base_lines[op[0]:op[1]])
+    return ''.join(parts)
+
+
+def _rebuild_chain(rows):
+    """Применяет цепочку (id, storage, content, delta), начинающуюся со снимка"""
+    text = ''
+    for pk, storage, content, delta in rows:
+        cached = content_cache.get(pk)
+        if cached is not None:
+            text = cached
+        elif storage == STORAGE_FULL:
+            text = content
+        else:
+            text = apply_delta(text, delta)
+    return text
+
+
+def reconstruct_content(version):
+    """Восстанавливает содержимое версии, хранящейся в виде дельты"""
+    cached = content_cache.get(version.pk)
+    if cached is not None:
+        return cached
+
+    manager = type(version)._default_manager
+    versions = manager.filter(article_id=version.article_id)
+    snapshot_number = versions.filter(
+        storage=STORAGE_FULL,
+        version_number__lt=version.version_number
+    ).aggregate(number=Max('version_number'))['number'] or 0
+
+    # Снимок и все дельты после него - одним запросом
+    rows = versions.filter(
+        version_number__gte=snapshot_number,
+        version_number__lte=version.version_number
+    ).order_by('version_number').values_list('pk', 'storage', 'content', 'delta')
+
+    text = _rebuild_chain(rows)
+    content_cache.set(version.pk, text)
+    return text
+
+
+def prepare_new_version(version, previous):
+    """
+    Выбирает формат хранения новой версии перед первым сохранением.
+    previous - предыдущая версия статьи (база для дельты) или None.
+    """
+    text = version.__dict__.get('content') or ''
+    version.storage = STORAGE_FULL
+    version.delta = None
+
+    if get_storage_mode() != STORAGE_DELTA or previous is None:
+        return
+    if (version.version_number - 1) % get_snapshot_interval() == 0:
+        return
+
+    delta = encode_delta(previous.content, text)
+    if len(delta) < len(text.encode('utf-8')) * DELTA_MAX_RATIO:
+        version.storage = STORAGE_DELTA
+        version.delta = delta
+        version.__dict__['content'] = ''
+        version._full_content = text
+
+
+def convert_article_versions(model, article_id, mode, interval):
+    """
+    Перекодирует все версии статьи в указанный формат хранения.
+    model - класс ArticleVersion (подходит и исторический класс из миграции).
+    Возвращает количество измененных версий.
+    """
+    rows = list(
+        model._default_manager.filter(article_id=article_id).order_by(
+            'version_number'
+        ).values_list('pk', 'version_number', 'storage', 'content', 'delta')
+    )
+
+    changed = 0
+    previous_text = None
+    text = ''
+    for pk, number, storage, content, delta in rows:
+        text = content if storage == STORAGE_FULL else apply_delta(text, delta)
+
+        new_storage, new_content, new_delta = STORAGE_FULL, text, None
+        if mode == STORAGE_DELTA and previous_text is not None and (number - 1) % interval != 0:
+            encoded = encode_delta(previous_text, text)
+            if len(encoded) < len(text.encode('utf-8')) * DELTA_MAX_RATIO:
+                new_storage, new_content, new_delta = STORAGE_DELTA, '', encoded
+
+        if new_storage != storage or (new_storage == STORAGE_DELTA and bytes(new_delta) != bytes(delta)):
+            model._default_manager.filter(pk=pk).update(
+                storage=new_storage, content=new_content, delta=new_delta
+            )
+            changed += 1
+        previous_text = text
+
+    return changed
+
+
+class VersionContentDescriptor(DeferredAttribute):
+    """
+    Для версий в виде дельты возвращает восстановленный текст.
+    Дескриптор данных (с __set__), чтобы чтение всегда проходило через __get__.
+    Текст сохраненной версии не меняется: от него зависят дельты следующих
+    версий, поэтому изменение сохраненной версии - ошибка (создайте новую версию).
+    """
+
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        value = super().__get__(instance, cls)
+        if instance.storage == STORAGE_DELTA:
+            full = getattr(instance, '_full_content', None)
+            return full if full is not None else reconstruct_content(instance)
+        return value
+
+    def __set__(self, instance, value):
+        attname = self.field.attname
+        if not instance._state.adding and attname in instance.__dict__:
+            # Повторная запись того же текста (например, refresh_from_db) допустима,
+            # в атрибуте остается хранимое значение (для дельты - пустая строка)
+            if value != self.__get__(instance):
+                raise ValueError(
+                    f'Содержимое сохраненной версии {instance.pk} не изменяется: создайте новую версию'
+                )
+            return
+        instance.__dict__[attname] = value
+
+
+class VersionContentField(MDTextField):
+    """Поле содержимого версии с прозрачным восстановлением из дельты"""
+    descriptor_class = VersionContentDescriptor
+
+    def pre_save(self, model_instance, add):
+        # В базу пишется хранимое значение, а не восстановленный текст
+        # (после отложенной загрузки в атрибуте может оказаться текст дельты)
+        if model_instance.storage == STORAGE_DELTA:
+            return ''
+        return model_instance.__dict__.get(self.attname)
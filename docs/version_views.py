@@ -2,15 +2,15 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.views.generic import ListView, DetailView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.decorators import login_required
+from django.http import Http404, JsonResponse
 from django.contrib import messages
 from django.urls import reverse
 from django.db.models import Q
 from .models import Article, ArticleVersion
 from .forms import ArticleVersionForm
-import markdown
-from markdown.extensions.fenced_code import FencedCodeExtension
-from markdown.extensions.codehilite import CodeHiliteExtension
-from difflib import HtmlDiff
+from .rendering import get_version_html
+from .diff import get_versions_diff
+from .conditional import conditional_response, get_article_stamp, page_validators, set_validators, stamps_shared
 
 
 class ArticleVersionListView(LoginRequiredMixin, ListView):
@@ -23,7 +23,7 @@ class ArticleVersionListView(LoginRequiredMixin, ListView):
         self.article = get_object_or_404(Article, slug=self.kwargs['slug'])
         return ArticleVersion.objects.filter(
             article=self.article
-        ).select_related('author').order_by('-version_number')
+        ).select_related('author').defer('content', 'delta').order_by('-version_number')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -40,9 +40,10 @@ class VersionDetailView(DetailView):
 
     def get_queryset(self):
         article_slug = self.kwargs.get('slug')
+        # Текст версии не нужен: HTML берется из хранилища, размер - из метаданных
         return ArticleVersion.objects.filter(
             article__slug=article_slug
-        ).select_related('article', 'author').order_by('-version_number')
+        ).select_related('article', 'author').defer('content', 'delta').order_by('-version_number')
 
     def get_object(self, queryset=None):
         if queryset is None:
@@ -59,55 +60,48 @@ class VersionDetailView(DetailView):
 
         return version
 
+    def get(self, request, *args, **kwargs):
+        # Версия неизменна: страница зависит от статьи (текущая версия, соседние версии)
+        self.object = version = self.get_object()
+        article = version.article
+        if not stamps_shared():
+            return self.render_to_response(self.get_context_data(object=version))
+        etag, last_modified = page_validators(
+            request,
+            [version.pk, article.current_version_id, article.title],
+            modified=[article.updated_at],
+            stamps=[get_article_stamp(article.pk)]
+        )
+        response = conditional_response(request, etag, last_modified)
+        if response is not None:
+            return response
+        context = self.get_context_data(object=version)
+        return set_validators(request, self.render_to_response(context), etag, last_modified)
+
     def get_adjacent_versions(self, version):
-        """Получаем предыдущую и следующую версии"""
-        article_versions = ArticleVersion.objects.filter(
-            article=version.article
-        ).order_by('-version_number')
-
-        versions_list = list(article_versions)
-        current_index = None
-
-        # Находим индекс текущей версии в списке
-        for i, v in enumerate(versions_list):
-            if v.id == version.id:
-                current_index = i
-                break
-
-        prev_version = None
-        next_version = None
-
-        if current_index is not None:
-            # Предыдущая версия (более новая)
-            if current_index > 0:
-                prev_version = versions_list[current_index - 1]
-            # Следующая версия (более старая)
-            if current_index < len(versions_list) - 1:
-                next_version = versions_list[current_index + 1]
+        """Предыдущая (более новая) и следующая (более старая) версии - по индексу (article, version_number)"""
+        neighbours = ArticleVersion.objects.filter(
+            article_id=version.article_id
+        ).only('id', 'version_number', 'created_at')
 
         return {
-            'prev': prev_version,
-            'next': next_version
+            'prev': neighbours.filter(
+                version_number__gt=version.version_number
+            ).order_by('version_number').first(),
+            'next': neighbours.filter(
+                version_number__lt=version.version_number
+            ).order_by('-version_number').first()
         }
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         version = self.object
 
-        # Конвертируем Markdown в HTML
-        extensions = [
-            FencedCodeExtension(),
-            CodeHiliteExtension(css_class='codehilite', linenums=False)
-        ]
-
-        context['html_content'] = markdown.markdown(
-            version.content,
-            extensions=extensions,
-            output_format='html5'
-        )
+        # Готовый HTML версии из хранилища
+        context['html_content'] = get_version_html(version)
 
         # Проверяем, является ли эта версия текущей
-        context['is_current'] = version.article.current_version == version
+        context['is_current'] = version.article.current_version_id == version.id
 
         # Добавляем статью в контекст для удобства
         context['article'] = version.article
@@ -160,7 +154,9 @@ def restore_version(request, slug, version_id):
 def compare_versions(request, slug):
     """Сравнение двух версий"""
     article = get_object_or_404(Article, slug=slug)
-    versions = ArticleVersion.objects.filter(article=article).order_by('-version_number')
+    versions = ArticleVersion.objects.filter(article=article).select_related('author').only(
+        'id', 'version_number', 'created_at', 'author__username'
+    ).order_by('-version_number')
 
     version1_id = request.GET.get('v1')
     version2_id = request.GET.get('v2')
@@ -170,18 +166,20 @@ def compare_versions(request, slug):
     diff_html = None
 
     if version1_id and version2_id:
-        version1 = get_object_or_404(ArticleVersion, id=version1_id, article=article)
-        version2 = get_object_or_404(ArticleVersion, id=version2_id, article=article)
-
-        # Создаем diff
-        differ = HtmlDiff()
-        diff_html = differ.make_table(
-            version1.content.splitlines(),
-            version2.content.splitlines(),
-            fromdesc=f'Версия v{version1.version_number}',
-            todesc=f'Версия v{version2.version_number}',
-            context=True
-        )
+        # Обе версии с авторами одним запросом
+        selected = {
+            str(version.id): version
+            for version in ArticleVersion.objects.filter(
+                article=article, id__in=[version1_id, version2_id]
+            ).select_related('author')
+        }
+        if version1_id not in selected or version2_id not in selected:
+            raise Http404('Версия не найдена')
+        version1 = selected[version1_id]
+        version2 = selected[version2_id]
+
+        # Сравнение версий неизменно, поэтому берется из кэша
+        diff_html = get_versions_diff(version1, version2)
 
     return render(request, 'docs/versions/compare_versions.html', {
         'article': article,
@@ -189,4 +187,53 @@ def compare_versions(request, slug):
         'version1': version1,
         'version2': version2,
         'diff_html': diff_html
-    })
\ No newline at end of file
+    })
+
+
+@login_required
+def version_timeline(request, slug):
+    """
+    Метаданные версий статьи в JSON, от новых к старым.
+    Страницы по ключу version_number: ?before=<номер> и ?limit=.
+    """
+    article = get_object_or_404(Article, slug=slug)
+
+    try:
+        limit = min(max(int(request.GET.get('limit', 50)), 1), 100)
+        before = int(request.GET['before']) if request.GET.get('before') else None
+    except ValueError:
+        return JsonResponse({
+            'success': False,
+            'error': 'Некорректные параметры limit или before'
+        }, status=400)
+
+    versions = ArticleVersion.objects.filter(article=article).select_related('author').only(
+        'id', 'version_number', 'title', 'change_reason', 'created_at', 'is_draft',
+        'content_size', 'word_count', 'author__username'
+    ).order_by('-version_number')
+    if before is not None:
+        versions = versions.filter(version_number__lt=before)
+    versions = list(versions[:limit + 1])
+
+    next_before = None
+    if len(versions) > limit:
+        versions = versions[:limit]
+        next_before = versions[-1].version_number
+
+    return JsonResponse({
+        'success': True,
+        'versions': [{
+            'id': version.id,
+            'version_number': version.version_number,
+            'title': version.title,
+            'author': version.author.username,
+            'change_reason': version.change_reason,
+            'created_at': version.created_at.isoformat(),
+            'is_draft': version.is_draft,
+            'is_current': version.id == article.current_version_id,
+            'content_size': version.content_size,
+            'word_count': version.word_count,
+            'url': reverse('docs:version_detail', kwargs={'slug': article.slug, 'pk': version.id}),
+        } for version in versions],
+        'next_before': next_before,
+    })
@@ -0,0 +1,154 @@
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F
+
+
+# Просмотры накапливаются в кэше и переносятся в базу пакетными UPDATE,
+# поэтому чтение статьи больше не требует записи в базу. Процесс переносит
+# свой буфер раз в VIEW_COUNT_FLUSH_INTERVAL секунд, а также досрочно, когда
+# в буфере VIEW_COUNT_MAX_PENDING статей: кэш с ограничением MAX_ENTRIES
+# вытесняет давно не использованные ключи, поэтому лимит должен быть
+# заметно больше (вытесняется треть записей) - тогда вытесняются только
+# уже перенесенные ключи.
+VIEW_COUNT_CACHE = getattr(settings, 'VIEW_COUNT_CACHE', 'default')
+VIEW_COUNT_FLUSH_INTERVAL = getattr(settings, 'VIEW_COUNT_FLUSH_INTERVAL', 60)
+VIEW_COUNT_MAX_PENDING = getattr(settings, 'VIEW_COUNT_MAX_PENDING', 10000)
+VIEW_COUNT_BATCH_SIZE = 500
+
+_KEY_PREFIX = 'views:pending:'
+
+# Кэши в памяти процесса: буфер виден только процессу, который его заполнил
+_PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+logger = logging.getLogger('docs.view_counter')
+
+_lock = threading.Lock()
+_touched = set()
+_last_flush = time.monotonic()
+
+
+def _cache():
+    return caches[VIEW_COUNT_CACHE]
+
+
+def _key(article_id):
+    return f'{_KEY_PREFIX}{article_id}'
+
+
+def buffer_is_process_local():
+    """Хранится ли буфер в памяти процесса (другие процессы его не видят)"""
+    return settings.CACHES[VIEW_COUNT_CACHE]['BACKEND'] in _PROCESS_LOCAL_CACHES
+
+
+def record_view(article_id):
+    """Учитывает просмотр статьи в буфере"""
+    global _last_flush
+
+    cache = _cache()
+    key = _key(article_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Ключа еще нет: add атомарен, при гонке просто увеличиваем
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+    with _lock:
+        _touched.add(article_id)
+        now = time.monotonic()
+        due = now - _last_flush >= VIEW_COUNT_FLUSH_INTERVAL or len(_touched) >= VIEW_COUNT_MAX_PENDING
+        if due:
+            _last_flush = now
+            article_ids = list(_touched)
+            _touched.clear()
+
+    if due:
+        flush_view_counts(article_ids)
+
+
+def get_pending_views(article_id):
+    """Количество просмотров, еще не перенесенных в базу"""
+    return _cache().get(_key(article_id)) or 0
+
+
+def get_pending_views_many(article_ids):
+    """Еще не перенесенные просмотры нескольких статей: {id: количество}"""
+    values = _cache().get_many([_key(article_id) for article_id in article_ids])
+    return {
+        int(key[len(_KEY_PREFIX):]): value
+        for key, value in values.items() if value
+    }
+
+
+def _flush_batch(article_ids):
+    from .author_stats import adjust_author_views
+    from .models import Article
+
+    pending = get_pending_views_many(article_ids)
+    if not pending:
+        return 0
+
+    # Один UPDATE на каждое встречающееся значение прироста
+    by_delta = defaultdict(list)
+    for article_id, delta in pending.items():
+        by_delta[delta].append(article_id)
+
+    with transaction.atomic():
+        for delta, ids in by_delta.items():
+            Article.objects.filter(pk__in=ids).update(view_count=F('view_count') + delta)
+        adjust_author_views(pending)
+
+    # Вычитаем ровно перенесенное: просмотры, пришедшие во время переноса, остаются в буфере
+    cache = _cache()
+    for article_id, delta in pending.items():
+        try:
+            cache.decr(_key(article_id), delta)
+        except ValueError:
+            pass
+
+    return sum(pending.values())
+
+
+def flush_view_counts(article_ids=None):
+    """
+    Переносит накопленные просмотры в базу.
+    Без списка статей проверяет все статьи (используется командой flush_view_counts).
+    """
+    from .models import Article
+
+    if article_ids is None:
+        article_ids = list(Article.objects.values_list('id', flat=True).order_by('id'))
+
+    total = 0
+    batch = []
+    for article_id in article_ids:
+        batch.append(article_id)
+        if len(batch) >= VIEW_COUNT_BATCH_SIZE:
+            total += _flush_batch(batch)
+            batch = []
+    if batch:
+        total += _flush_batch(batch)
+    return total
+
+
+@atexit.register
+def _flush_on_exit():
+    """При остановке процесса переносим то, что он успел накопить"""
+    with _lock:
+        article_ids = list(_touched)
+        _touched.clear()
+    if article_ids:
+        try:
+            flush_view_counts(article_ids)
+        except Exception:
+            logger.exception('Не удалось перенести просмотры %s статей при остановке процесса', len(article_ids))
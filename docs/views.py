@@ -6,21 +6,28 @@ from django.contrib.auth import views as auth_views
 
 from django.views.generic import ListView, TemplateView
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db.models import Count, Q
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
 from django.contrib.auth import login
 from django.contrib import messages
 from django.contrib.auth import logout
 
-from .models import Article, Category, Tag, Comment, Favorite, ArticleVersion
+from .models import Article, Category, Tag, TagUsage, Comment, Favorite, ArticleVersion
 from .forms import ArticleForm, ArticleCreateForm, ArticleUpdateForm, ArticleVersionForm
 from .comments_forms import CommentForm
-import markdown
-from markdown.extensions.fenced_code import FencedCodeExtension
-from markdown.extensions.codehilite import CodeHiliteExtension
+from .comments_tree import load_comment_tree
+from .rendering import get_version_html
+from .search import SearchResults, search_index_available
+from .pagination import CursorPaginationMixin
+from .related import get_related_articles
+from .author_stats import get_author_stats
+from .conditional import (
+    ConditionalPageMixin, conditional_response, get_article_stamp, page_validators, set_validators, stamps_shared
+)
 from .forms import UserRegisterForm
 
 
-class ArticleListView(ListView):
+class ArticleListView(ConditionalPageMixin, CursorPaginationMixin, ListView):
     model = Article
     template_name = 'docs/articles/article_list.html'
     context_object_name = 'articles'
@@ -48,24 +55,18 @@ class ArticleListView(ListView):
                 current_version__isnull=False
             )
 
-        return queryset.select_related('author', 'category', 'current_version')
+        return queryset.select_related('author', 'category', 'current_version').prefetch_related('tags')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         user = self.request.user
 
-        context['categories'] = Category.objects.all()
         context['pinned_articles'] = Article.objects.filter(
             status='published',
             is_pinned=True,
             current_version__isnull=False
         )[:5]
 
-        # Популярные теги (только для опубликованных статей)
-        context['popular_tags'] = Tag.objects.annotate(
-            num_articles=Count('articles')
-        ).filter(num_articles__gt=0).order_by('-num_articles')[:20]
-
         # Добавляем информацию о пользователе для шаблона
         context['current_user'] = user
 
@@ -79,14 +80,14 @@ class ArticleDetailView(DetailView):
 
     def get_queryset(self):
         """Возвращаем queryset с учетом прав доступа"""
-        # Базовый queryset - все статьи
-        queryset = Article.objects.all()
+        # Базовый queryset - все статьи; автор, категория и автор текущей версии выводятся на странице
+        queryset = Article.objects.select_related('author', 'category', 'current_version__author')
         return queryset
 
     def dispatch(self, request, *args, **kwargs):
         """Проверяем доступ к статье перед отображением"""
         try:
-            article = self.get_object()
+            article = self.object = self.get_object()
 
             # Проверяем доступ к статье
             if not article.is_accessible_by(request.user):
@@ -119,29 +120,15 @@ class ArticleDetailView(DetailView):
         if article.status == 'published':
             article.increment_view_count()
 
-        # Конвертируем Markdown в HTML
-        extensions = [
-            FencedCodeExtension(),
-            CodeHiliteExtension(css_class='codehilite', linenums=False)
-        ]
-
-        context['html_content'] = markdown.markdown(
-            article.current_version.content,
-            extensions=extensions,
-            output_format='html5'
-        )
+        # Готовый HTML текущей версии из хранилища
+        context['html_content'] = get_version_html(article.current_version)
 
         # Форма для комментариев (только для опубликованных статей)
         if article.status == 'published':
             context['comment_form'] = CommentForm()
 
-        # Комментарии статьи
-        context['comments'] = Comment.objects.filter(
-            article=article,
-            is_approved=True,
-            is_deleted=False,
-            parent__isnull=True
-        ).select_related('author').prefetch_related('children').order_by('-created_at')
+        # Комментарии статьи - все дерево одним запросом
+        context['comments'] = load_comment_tree(article)
 
         if self.request.user.is_authenticated:
             try:
@@ -157,15 +144,11 @@ class ArticleDetailView(DetailView):
             context['user_rating'] = None
             context['is_favorite'] = False
 
-            # Статистика (только для опубликованных)
-        try:
+        # Статистика (только для опубликованных) - денормализованные счетчики статьи
+        if article.status == 'published':
             context['like_count'] = article.get_like_count()
             context['dislike_count'] = article.get_dislike_count()
             context['comment_count'] = article.get_comment_count()
-        except Exception as e:
-            context['like_count'] = 0
-            context['dislike_count'] = 0
-            context['comment_count'] = 0
         else:
             # Для неопубликованных статей отключаем комментарии и оценки
             context['comment_form'] = None
@@ -176,37 +159,30 @@ class ArticleDetailView(DetailView):
             context['dislike_count'] = 0
             context['comment_count'] = 0
 
-            # Похожие статьи (только для опубликованных с текущей версией)
+        # Похожие статьи (только для опубликованных) - из заранее посчитанного индекса
         if article.status == 'published':
-            try:
-                related_articles = Article.objects.filter(
-                    status='published',
-                    current_version__isnull=False,
-                    category=article.category
-                ).exclude(id=article.id)[:4]
-
-                context['related_articles'] = related_articles
-            except Exception as e:
-                context['related_articles'] = Article.objects.none()
+            context['related_articles'] = get_related_articles(article)
         else:
-            context['related_articles'] = Article.objects.none()
-
-        # Популярные теги для сайдбара
-        try:
-            context['popular_tags'] = Tag.objects.annotate(
-                num_articles=Count('articles')
-            ).filter(num_articles__gt=0).order_by('-num_articles')[:15]
-        except Exception as e:
-            context['popular_tags'] = Tag.objects.none()
-            print(f"Error getting popular tags: {e}")
+            context['related_articles'] = []
 
         return context
 
+    def get_page_validators(self):
+        """ETag и Last-Modified из уже загруженной статьи и отметки ее изменений"""
+        article = self.object
+        return page_validators(
+            self.request,
+            [
+                article.pk, article.current_version_id, article.status,
+                article.likes_count, article.dislikes_count, article.comments_count, article.favorites_count,
+            ],
+            modified=[article.updated_at],
+            stamps=[get_article_stamp(article.pk)]
+        )
+
     def get(self, request, *args, **kwargs):
         """Переопределяем get для проверки наличия текущей версии"""
         try:
-            self.object = self.get_object()
-
             # Если нет текущей версии и пользователь - автор, предлагаем создать
             if not self.object.current_version and self.object.author == request.user:
                 messages.warning(
@@ -218,8 +194,20 @@ class ArticleDetailView(DetailView):
                 messages.error(request, 'Эта статья временно недоступна.')
                 return redirect('docs:article_list')
 
+            # Отметки изменений статьи видны всем процессам только в общем кэше
+            if not stamps_shared():
+                return self.render_to_response(self.get_context_data(object=self.object))
+
+            # Актуальная копия у клиента - 304 без построения контекста (просмотр учитывается)
+            etag, last_modified = self.get_page_validators()
+            response = conditional_response(request, etag, last_modified)
+            if response is not None:
+                if self.object.status == 'published':
+                    self.object.increment_view_count()
+                return response
+
             context = self.get_context_data(object=self.object)
-            return self.render_to_response(context)
+            return set_validators(request, self.render_to_response(context), etag, last_modified)
 
         except Exception as e:
             messages.error(request, 'Произошла ошибка при загрузке статьи.')
@@ -335,9 +323,10 @@ class ArticleUpdateView(LoginRequiredMixin, UpdateView):
         return redirect('docs:article_detail', slug=article.slug)
 
 
-class TagArticlesView(ListView):
+class TagArticlesView(ConditionalPageMixin, CursorPaginationMixin, ListView):
     model = Article
     template_name = 'docs/articles/tag_articles.html'
+    page_template_name = 'docs/includes/tag_article_cards.html'
     context_object_name = 'articles'
     paginate_by = 12
 
@@ -352,14 +341,10 @@ class TagArticlesView(ListView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['tag'] = self.tag
-        context['categories'] = Category.objects.all()
-        context['popular_tags'] = Tag.objects.annotate(
-            num_articles=Count('articles')
-        ).filter(num_articles__gt=0).order_by('-num_articles')[:15]
         return context
 
 
-class CategoryArticlesView(ListView):
+class CategoryArticlesView(ConditionalPageMixin, CursorPaginationMixin, ListView):
     model = Article
     template_name = 'docs/articles/article_list.html'
     context_object_name = 'articles'
@@ -367,8 +352,11 @@ class CategoryArticlesView(ListView):
 
     def get_queryset(self):
         self.category = get_object_or_404(Category, slug=self.kwargs['slug'])
+        # Статьи категории и всех подкатегорий - по интервалу lft/rght дерева
         return Article.objects.filter(
-            category=self.category,
+            category__tree_id=self.category.tree_id,
+            category__lft__gte=self.category.lft,
+            category__rght__lte=self.category.rght,
             status='published',
             current_version__isnull=False
         ).select_related('author', 'category', 'current_version').prefetch_related('tags')
@@ -376,34 +364,38 @@ class CategoryArticlesView(ListView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['category'] = self.category
-        context['categories'] = Category.objects.all()
-        context['popular_tags'] = Tag.objects.annotate(
-            num_articles=Count('articles')
-        ).filter(num_articles__gt=0).order_by('-num_articles')[:15]
         return context
 
 
 def tag_cloud(request):
     """Облако тегов"""
-    tags = Tag.objects.annotate(
-        num_articles=Count('articles')
-    ).filter(num_articles__gt=0).order_by('-num_articles')
+    tags = Tag.objects.filter(
+        usage__article_count__gt=0
+    ).select_related('usage').order_by('-usage__article_count', 'name')
 
     return render(request, 'docs/tags/tag_cloud.html', {
         'tags': tags,
-        'categories': Category.objects.all(),
-        'popular_tags': tags[:15]
+        # Теги, показанные в облаке: с опубликованными статьями
+        'total_tags': TagUsage.objects.filter(article_count__gt=0).count()
     })
 
 
-class SearchView(ListView):
+class SearchView(ConditionalPageMixin, CursorPaginationMixin, ListView):
     model = Article
     template_name = 'docs/articles/article_list.html'
     context_object_name = 'articles'
     paginate_by = 12
 
+    def get_cursor_ordering(self):
+        if isinstance(self.object_list, SearchResults):
+            return ('search_rank', 'id')
+        return super().get_cursor_ordering()
+
     def get_queryset(self):
         query = self.request.GET.get('q', '')
+        if query and search_index_available():
+            # Ранжированный полнотекстовый поиск по индексу FTS5
+            return SearchResults(query)
         if query:
             return Article.objects.filter(
                 Q(title__icontains=query) |
@@ -417,7 +409,6 @@ class SearchView(ListView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['query'] = self.request.GET.get('q', '')
-        context['categories'] = Category.objects.all()
         return context
 
 
@@ -458,47 +449,42 @@ def formatting_help(request):
 class UserDashboardView(LoginRequiredMixin, TemplateView):
     """Личный кабинет пользователя"""
     template_name = 'docs/user/dashboard.html'
+    # Статей каждого статуса на странице (последние измененные)
+    DASHBOARD_SECTION_SIZE = 20
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         user = self.request.user
 
-        user_articles = Article.objects.filter(author=user).exclude(slug='')
-
-        # Опубликованные статьи (публичные)
-        published_articles = user_articles.filter(
-            status='published'
-        ).select_related('category', 'current_version').prefetch_related('tags')
-
-        # Приватные статьи
-        private_articles = user_articles.filter(
-            status='private'
-        ).select_related('category', 'current_version').prefetch_related('tags')
-
-        # Черновики
-        draft_articles = user_articles.filter(
-            status='draft'
-        ).select_related('category', 'current_version').prefetch_related('tags')
-
-        # Статьи в архиве
-        archived_articles = user_articles.filter(
-            status='archived'
-        ).select_related('category', 'current_version').prefetch_related('tags')
-
-        # Статистика
-        total_user_articles = Article.objects.filter(author=user)
-        stats = {
-            'total_articles': total_user_articles.count(),
-            'published_count': published_articles.count(),
-            'private_count': private_articles.count(),
-            'draft_count': draft_articles.count(),
-            'archived_count': archived_articles.count(),
-            'total_views': total_user_articles.aggregate(total_views=Count('view_count'))['total_views'] or 0,
-            'total_comments': Comment.objects.filter(article__author=user).count(),
-        }
-
-        recent_articles = user_articles.order_by('-updated_at')[:5]
-        popular_articles = user_articles.filter(status='published').order_by('-view_count')[:5]
+        # Последние DASHBOARD_SECTION_SIZE статей каждого статуса одним запросом:
+        # номер строки внутри статуса (оконная функция), по статусам раскладываем в памяти
+        user_articles = list(
+            Article.objects.filter(author=user).exclude(slug='').annotate(
+                position=Window(
+                    RowNumber(), partition_by=F('status'), order_by=[F('updated_at').desc(), F('id').desc()]
+                )
+            ).filter(position__lte=self.DASHBOARD_SECTION_SIZE)
+            .select_related('category', 'current_version').prefetch_related('tags')
+            .order_by('-updated_at', '-id')
+        )
+        by_status = {status: [] for status, _ in Article.STATUS_CHOICES}
+        for article in user_articles:
+            by_status[article.status].append(article)
+
+        published_articles = by_status['published']
+        private_articles = by_status['private']
+        draft_articles = by_status['draft']
+        archived_articles = by_status['archived']
+
+        # Статистика - одна строка, поддерживаемая сигналами
+        stats = get_author_stats(user)
+
+        # Пять последних статей всех статусов входят в выбранные по статусам
+        recent_articles = user_articles[:5]
+        popular_articles = list(
+            Article.objects.filter(author=user, status='published').exclude(slug='')
+            .select_related('category').order_by('-view_count', '-id')[:5]
+        )
 
         context.update({
             'published_articles': published_articles,
@@ -508,6 +494,7 @@ class UserDashboardView(LoginRequiredMixin, TemplateView):
             'stats': stats,
             'recent_articles': recent_articles,
             'popular_articles': popular_articles,
+            'section_size': self.DASHBOARD_SECTION_SIZE,
         })
 
         return context
@@ -22,6 +22,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'docs.instrumentation.InstrumentationMiddleware',  # замеры запросов, см. INSTRUMENTATION_ENABLED
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -29,6 +30,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'docs.profiling.ProfilingMiddleware',  # профилирование запросов, см. PROFILING_ENABLED
 ]
 
 ROOT_URLCONF = 'knowledge_base.urls'
@@ -44,6 +46,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'docs.context_processors.sidebar',
             ],
         },
     },
@@ -56,6 +59,80 @@ DATABASES = {
     }
 }
 
+# Раннер тестов с режимом проверки бюджета SQL-запросов (manage.py test --query-budgets)
+TEST_RUNNER = 'docs.query_budget.QueryBudgetRunner'
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Буфер просмотров статей. При нескольких процессах используйте общий кэш
+    # (Redis/Memcached): с LocMemCache команда flush_view_counts буфер не видит.
+    # MAX_ENTRIES должен быть больше VIEW_COUNT_MAX_PENDING хотя бы в полтора раза
+    'view_counts': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'view-counts',
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+    # Посчитанные сравнения версий (версии неизменяемы, записи бессрочные)
+    'diffs': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'version-diffs',
+        'OPTIONS': {'MAX_ENTRIES': 1000},
+    },
+}
+
+# Отложенная запись счетчика просмотров
+VIEW_COUNT_CACHE = 'view_counts'
+VIEW_COUNT_FLUSH_INTERVAL = 60  # секунд между переносами просмотров в базу
+VIEW_COUNT_MAX_PENDING = 10000  # статей в буфере процесса, при которых перенос выполняется досрочно
+
+DIFF_CACHE = 'diffs'
+
+# Условные GET (304) для списков статей, поиска, тегов, категорий, страниц статей
+# и версий: их ETag строится из отметок изменений в кэше 'default'. None - включены,
+# только если кэш общий для процессов (не LocMemCache); True - принудительно
+# (один процесс), False - выключены.
+CONDITIONAL_LIST_PAGES = None
+
+# Хранение содержимого версий статей: 'full' - полный текст каждой версии,
+# 'delta' - полный снимок раз в ARTICLE_VERSION_SNAPSHOT_INTERVAL версий и сжатые изменения между ними.
+# После смены режима выполните: python manage.py convert_version_storage
+ARTICLE_VERSION_STORAGE = 'full'
+ARTICLE_VERSION_SNAPSHOT_INTERVAL = 10
+ARTICLE_VERSION_CACHE_SIZE = 256  # восстановленных версий в памяти процесса
+
+# Файлы экспорта статей (HTML/TXT) хранятся на диске и отдаются повторно без рендеринга.
+# Каталог не должен раздаваться веб-сервером: в нем есть экспорты неопубликованных статей.
+EXPORT_CACHE_DIR = os.path.join(BASE_DIR, 'export_cache')
+EXPORT_CACHE_MAX_SIZE = 256 * 1024 * 1024  # байт, давно не скачивавшиеся файлы удаляются
+
+# PDF-экспорт выполняется в пуле процессов вне запроса. Пакет weasyprint необязателен
+# и в requirements.txt не входит: pip install weasyprint==66.0 (нужны системные
+# библиотеки Pango). Без него вариант PDF на странице экспорта не показывается.
+PDF_EXPORT_WORKERS = 2
+PDF_EXPORT_TIMEOUT = 300  # секунд, после которых незавершенное задание считается потерянным
+
+# Похожие статьи: после сохранения статьи ее список пересчитывается сразу,
+# списки соседей - в фоновом потоке (False - в том же запросе)
+RELATED_UPDATE_IN_BACKGROUND = True
+
+# Замеры запросов: SQL, Markdown, подсветка кода, шаблоны и общее время.
+# Результат - заголовок Server-Timing, строки лога docs.instrumentation и
+# последние запросы в админке (/admin/instrumentation/). Выключено - без накладных расходов.
+INSTRUMENTATION_ENABLED = False
+INSTRUMENTATION_SERVER_TIMING = True
+INSTRUMENTATION_BUFFER_SIZE = 200  # последних запросов в памяти процесса, 0 - не хранить
+
+# Профилирование запросов (cProfile): доля PROFILING_SAMPLE_RATE запросов к PROFILING_VIEWS
+# или по запросу сотрудника (?_profile=1 или заголовок X-Profile: 1).
+# Профили - в PROFILING_DIR, список и скачивание - /admin/profiles/.
+PROFILING_ENABLED = False
+PROFILING_SAMPLE_RATE = 0.0  # 0.01 - каждый сотый запрос
+PROFILING_VIEWS = ('docs:article_detail', 'docs:compare_versions', 'docs:search')
+PROFILING_DIR = os.path.join(BASE_DIR, 'profiles')
+PROFILING_MAX_FILES = 50  # старые профили удаляются
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
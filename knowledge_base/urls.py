@@ -4,7 +4,12 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from docs.admin import instrumentation_view, profile_download_view, profile_list_view
+
 urlpatterns = [
+    path('admin/instrumentation/', admin.site.admin_view(instrumentation_view), name='admin_instrumentation'),
+    path('admin/profiles/', admin.site.admin_view(profile_list_view), name='admin_profiles'),
+    path('admin/profiles/<str:name>/', admin.site.admin_view(profile_download_view), name='admin_profile_download'),
     path('admin/', admin.site.urls),
     path('mdeditor/', include('mdeditor.urls')),
     path('', include('docs.urls')),